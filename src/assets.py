@@ -0,0 +1,154 @@
+import functools
+import threading
+
+import pygame
+
+from profiler import profiler
+
+GLOBAL_SCOPE = "global" # Escopo dos assets que vivem durante todo o jogo (tiles, sprites do jogador, ...)
+
+
+def surface_bytes(surface):
+    # Subsurfaces compartilham os pixels da superfície pai, então não contam memória própria
+    if surface.get_parent() is not None:
+        return 0
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+def _locked(method):
+    # Os assets também são carregados pela thread do MapPreloader, então o cache é protegido por um lock
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class AssetManager:
+    # Gerenciador central de imagens. Cada arquivo é lido do disco uma única vez e as variantes
+    # derivadas (subsurfaces, cópias escaladas, tiras de animação) também ficam em cache.
+    # Cada asset é referenciado por escopos (GLOBAL_SCOPE ou a chave de um mapa); quando o último
+    # escopo que o usa é liberado (ex: mapa descarregado), o asset sai do cache.
+    def __init__(self):
+        self.entries = {} # chave -> Surface ou lista de Surfaces
+        self.entry_bytes = {} # chave -> bytes ocupados
+        self.ref_counts = {} # chave -> número de escopos que usam o asset
+        self.scopes = {} # escopo -> conjunto de chaves
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = 0
+        self.release_listeners = [] # Chamados com o escopo liberado (caches derivados, ex: sprite_cache)
+        self.lock = threading.RLock()
+
+    def _acquire(self, key, scope):
+        keys_in_scope = self.scopes.setdefault(scope, set())
+        if key not in keys_in_scope:
+            keys_in_scope.add(key)
+            self.ref_counts[key] = self.ref_counts.get(key, 0) + 1
+
+    def _lookup(self, key, scope):
+        asset = self.entries.get(key)
+        if asset is not None:
+            self.hits += 1
+            self._acquire(key, scope)
+        return asset
+
+    def _store(self, key, asset, scope):
+        self.misses += 1
+        surfaces = asset if isinstance(asset, list) else [asset]
+        size = sum(surface_bytes(surface) for surface in surfaces)
+        self.entries[key] = asset
+        self.entry_bytes[key] = size
+        self.total_bytes += size
+        self._acquire(key, scope)
+        return asset
+
+    def _load_file(self, path, alpha):
+        image = pygame.image.load(path)
+        return image.convert_alpha() if alpha else image.convert()
+
+    def _source(self, path, alpha):
+        # Imagem original para gerar variantes escaladas: usa a do cache se existir,
+        # senão carrega sem guardar (a variante escalada não precisa manter o original vivo)
+        cached = self.entries.get(("image", path, alpha))
+        return cached if cached is not None else self._load_file(path, alpha)
+
+    @_locked
+    def image(self, path, alpha=True, scope=GLOBAL_SCOPE):
+        key = ("image", path, alpha)
+        asset = self._lookup(key, scope)
+        if asset is None:
+            asset = self._store(key, self._load_file(path, alpha), scope)
+        return asset
+
+    @_locked
+    def subsurface(self, path, rect, alpha=True, scope=GLOBAL_SCOPE):
+        rect = pygame.Rect(rect)
+        key = ("subsurface", path, alpha, tuple(rect))
+        asset = self._lookup(key, scope)
+        if asset is None:
+            # A subsurface depende da imagem pai, que fica referenciada no mesmo escopo
+            asset = self._store(key, self.image(path, alpha, scope).subsurface(rect), scope)
+        return asset
+
+    @_locked
+    def scaled(self, path, size, alpha=True, scope=GLOBAL_SCOPE):
+        size = tuple(size)
+        key = ("scaled", path, alpha, size)
+        asset = self._lookup(key, scope)
+        if asset is None:
+            asset = self._store(key, pygame.transform.scale(self._source(path, alpha), size), scope)
+            profiler.count("scale")
+        return asset
+
+    @_locked
+    def strip(self, path, frame_count, size=None, alpha=True, scope=GLOBAL_SCOPE):
+        # Tira de animação: a imagem é dividida em frame_count frames horizontais.
+        # Com size, cada frame é escalado (e a imagem original não precisa ficar no cache).
+        key = ("strip", path, alpha, frame_count, tuple(size) if size else None)
+        asset = self._lookup(key, scope)
+        if asset is not None:
+            return asset
+
+        if size:
+            sheet = self._source(path, alpha)
+        else:
+            sheet = self.image(path, alpha, scope)
+        frame_width = sheet.get_width() // frame_count
+        frame_height = sheet.get_height()
+        frames = []
+        for i in range(frame_count):
+            frame = sheet.subsurface(pygame.Rect(i * frame_width, 0, frame_width, frame_height))
+            frames.append(pygame.transform.scale(frame, size) if size else frame)
+        if size:
+            profiler.count("scale", frame_count)
+        return self._store(key, frames, scope)
+
+    def add_release_listener(self, listener):
+        self.release_listeners.append(listener)
+
+    @_locked
+    def release_scope(self, scope):
+        # Libera todas as referências do escopo; assets sem nenhuma referência são descartados
+        for key in self.scopes.pop(scope, set()):
+            self.ref_counts[key] -= 1
+            if self.ref_counts[key] <= 0:
+                del self.ref_counts[key]
+                self.entries.pop(key, None)
+                self.total_bytes -= self.entry_bytes.pop(key, 0)
+        for listener in self.release_listeners:
+            listener(scope)
+
+    @_locked
+    def stats(self):
+        scope_bytes = {scope: sum(self.entry_bytes.get(key, 0) for key in keys) for scope, keys in self.scopes.items()}
+        return {
+            "entries": len(self.entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "scope_bytes": scope_bytes,
+        }
+
+
+asset_manager = AssetManager()
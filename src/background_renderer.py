@@ -0,0 +1,46 @@
+import pygame
+
+from config import BLACK
+from profiler import profiler
+
+
+class BackgroundRenderer:
+    # Desenha o padrão de fundo (repetido repeat_x vezes na horizontal) recortado pela câmera.
+    # Só as cópias do padrão que cruzam a área visível são desenhadas, e de cada uma
+    # apenas a sub-área visível é copiada (blit com area=), em vez da imagem inteira.
+    def visible_copies(self, pattern_size, camera_rect, view_size, pattern_spacing, repeat_x):
+        # Retorna uma lista de (índice da cópia, posição na tela, área de origem no padrão)
+        pattern_width, pattern_height = pattern_size
+        view_width, view_height = view_size
+        view_x = -camera_rect.x # Coordenadas do canto superior esquerdo da câmera no mundo
+        view_y = -camera_rect.y
+
+        top = max(0, view_y)
+        bottom = min(pattern_height, view_y + view_height)
+        if top >= bottom or pattern_spacing <= 0:
+            return []
+
+        first_copy = max(0, view_x // pattern_spacing)
+        last_copy = min(repeat_x - 1, (view_x + view_width - 1) // pattern_spacing)
+
+        copies = []
+        for copy_index in range(first_copy, last_copy + 1):
+            copy_x = copy_index * pattern_spacing
+            left = max(0, view_x - copy_x)
+            right = min(pattern_width, view_x + view_width - copy_x)
+            if left >= right:
+                continue
+            area = pygame.Rect(left, top, right - left, bottom - top)
+            screen_position = (copy_x + left + camera_rect.x, top + camera_rect.y)
+            copies.append((copy_index, screen_position, area))
+        return copies
+
+    def draw(self, screen, pattern, camera_rect, pattern_spacing, repeat_x):
+        for copy_index, screen_position, area in self.visible_copies(pattern.get_size(), camera_rect, screen.get_size(), pattern_spacing, repeat_x):
+            try:
+                screen.blit(pattern, screen_position, area)
+                profiler.count("blit")
+            except pygame.error as e:
+                print(f"Error blitting background copy {copy_index}: {e}")
+                # Desenhar um placeholder preto para a parte do fundo que falhou
+                pygame.draw.rect(screen, BLACK, pygame.Rect(screen_position, area.size))
@@ -0,0 +1,441 @@
+import argparse
+import atexit
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Roda sem janela e sem som: precisa estar definido antes de importar o pygame
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import numpy as np
+import pygame
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+from character import Character
+from config import WIDTH, HEIGHT, BLACK, STREAM_CHUNK_TILES
+from game import Game
+from map_format import write_chunked_map, CHUNKED_MAP_EXTENSION
+from npc_movement import build_agent
+from profiler import profiler
+from tile_grid import TileGrid
+
+# Benchmark do loop do jogo em modo headless (driver de vídeo "dummy"), com entrada roteirizada,
+# número fixo de frames e FPS sem limite. Cada cenário roda em um processo próprio, para que o pico
+# de memória e os caches globais (assets, sprites) não vazem de um cenário para o outro.
+# Uso, a partir da raiz do projeto:
+#   python src/benchmark.py                                 # roda todos os cenários
+#   python src/benchmark.py walk_mundo dialogue --frames 300
+#   python src/benchmark.py --save-baseline bench_baseline.json
+#   python src/benchmark.py --baseline bench_baseline.json  # compara e falha se houver regressão
+
+DEFAULT_FRAMES = 600
+DEFAULT_WARMUP = 30
+DEFAULT_TOLERANCE = 0.05 # Queda de FPS (fração) acima da qual o cenário conta como regressão
+
+STRESS_MAP_KEY = "stress_map"
+STRESS_MAP_SIZE = (200, 200) # colunas, linhas
+STRESS_NPC_COUNT = 500
+STRESS_NPC_COUNT_LARGE = 1000
+STRESS_WANDER_COUNT = 400 # NPCs andando a esmo no cenário de pathfinding
+STRESS_SEEK_COUNT = 100 # NPCs seguindo o jogador (campo de fluxo compartilhado) no mesmo cenário
+STRESS_PATROL_COUNT = 20 # NPCs fazendo a ronda STRESS_PATROL_WAYPOINTS no mesmo cenário
+STRESS_PATROL_WAYPOINTS = [[10, 10], [90, 10], [90, 90], [10, 90]] # Tiles livres (fora dos pilares)
+STREAM_MAP_KEY = "stream_world"
+STREAM_WORLD_SIZE = (2000, 2000) # colunas, linhas: 10000x a área do mundo_principal
+PORTAL_STAY_FRAMES = 30 # Frames na caverna antes de voltar, no cenário de portal
+
+
+class ScriptedInput:
+    # Substitui pygame.key.get_pressed (via game.key_state). 'steps' é uma lista de
+    # (frames, teclas seguradas, teclas apertadas no primeiro frame do passo), repetida em ciclo.
+    def __init__(self, steps):
+        self.steps = steps
+        self.cycle_length = sum(frames for frames, _, _ in steps)
+        self.frame = 0
+        self.held = frozenset()
+
+    def advance(self):
+        # Chamado antes de cada frame: atualiza as teclas seguradas e posta os KEYDOWN do passo
+        position = self.frame % self.cycle_length
+        for frames, held, presses in self.steps:
+            if position < frames:
+                self.held = frozenset(held)
+                if position == 0:
+                    for key in presses:
+                        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode="", scancode=0))
+                break
+            position -= frames
+        self.frame += 1
+
+    def __call__(self):
+        return self
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+def place_feet_on_tile(character, col, row, tile_size):
+    # Posiciona o personagem com o centro da caixa de colisão (os pés) no centro do tile
+    character.map_x = col * tile_size + tile_size // 2 - character.collision_box_offset_x - character.collision_box_width // 2
+    character.map_y = row * tile_size + tile_size // 2 - character.collision_box_offset_y - character.collision_box_height // 2
+
+
+def synthetic_rows(cols, rows):
+    # Mapa de areia com pilares de grama (bloqueadores) a cada 4 tiles; as linhas e colunas
+    # entre os pilares ficam livres, então o jogador consegue atravessar o mapa inteiro
+    grass_keys = ("g0", "g90", "g180", "g270")
+    return [
+        [grass_keys[(col // 4 + row // 4) % 4] if col % 4 == 0 and row % 4 == 0 else "s" for col in range(cols)]
+        for row in range(rows)
+    ]
+
+
+SYNTHETIC_PALETTE = ("g0", "g90", "g180", "g270", "s")
+
+
+def synthetic_chunk_ids(first_col, first_row, width, height):
+    # Mesmo desenho de synthetic_rows, como ids da paleta SYNTHETIC_PALETTE, só para um pedaço do mapa
+    cols = np.arange(first_col, first_col + width)
+    rows = np.arange(first_row, first_row + height)[:, None]
+    pillars = (cols % 4 == 0) & (rows % 4 == 0)
+    return np.where(pillars, (cols // 4 + rows // 4) % 4, 4).astype(np.uint8)
+
+
+def install_stream_world(game, cols, rows, player_tile=(30, 30)):
+    # Grava um mundo sintético em chunks (.vchunks) num diretório temporário e entra nele. O arquivo é
+    # gerado chunk a chunk, então nem a geração nem o jogo têm o mapa inteiro na memória.
+    temp_dir = tempfile.mkdtemp(prefix="stream_world_")
+    atexit.register(shutil.rmtree, temp_dir, True)
+    chunk_file = os.path.join(temp_dir, STREAM_MAP_KEY + CHUNKED_MAP_EXTENSION)
+    tile_size = game.tile_size
+    write_chunked_map(chunk_file, cols, rows, tile_size, SYNTHETIC_PALETTE, game.blocking_tile_keys,
+                      synthetic_chunk_ids, STREAM_CHUNK_TILES)
+    game.map_definitions[STREAM_MAP_KEY] = {"chunk_file": chunk_file, "pixel_width": cols * tile_size,
+                                            "pixel_height": rows * tile_size, "portals": {}}
+    game.switch_map(STREAM_MAP_KEY, (player_tile[0] * tile_size, player_tile[1] * tile_size))
+    place_feet_on_tile(game.player, player_tile[0], player_tile[1], tile_size)
+    game.camera.update(game.player)
+
+
+def install_stress_map(game, cols, rows, player_tile=(30, 30)):
+    # Registra e carrega um mapa sintético grande. O bundle é montado aqui (sem .map em disco e sem
+    # imagem de fundo do tamanho do mapa): todos os tiles são opacos, então o fundo fica coberto.
+    tile_size = game.tile_size
+    map_info = {"layout_file": None, "background_image": None, "pixel_width": cols * tile_size,
+                "pixel_height": rows * tile_size, "portals": {}}
+    game.map_definitions[STRESS_MAP_KEY] = map_info
+    background_pattern = pygame.Surface((WIDTH, HEIGHT))
+    background_pattern.fill(BLACK)
+    bundle = {
+        "map_key": STRESS_MAP_KEY,
+        "background_animation_frames": [],
+        "background_pattern": background_pattern,
+        "portal_open_background": None,
+        "tile_grid": TileGrid.from_rows(synthetic_rows(cols, rows), game.blocking_tile_keys, tile_size, map_info["pixel_width"]),
+        "tile_chunks": {},
+    }
+    game.switch_map(STRESS_MAP_KEY, (0, 0), bundle=bundle)
+    place_feet_on_tile(game.player, player_tile[0], player_tile[1], tile_size)
+    game.camera.update(game.player)
+
+
+def add_stress_npcs(game, count, behavior=None, key_prefix="stress_npc"):
+    # NPCs espalhados em posições fixas (sem história, então não abrem diálogo); todos dividem os mesmos sprites.
+    # Com 'behavior' (mesmo formato do manifesto) cada NPC ganha um agente e anda pelo mapa.
+    npc_sprite_paths = {"frente": os.path.join("src", "assets", "sprite_knight_frente.png")}
+    map_width = game.current_map_effective_pixel_width
+    map_height = game.current_map_pixel_height
+    columns = max(1, int(count ** 0.5))
+    for index in range(count):
+        npc = Character(f"NPC {index}", map_x=(index % columns) * map_width // columns + 30,
+                        map_y=(index // columns) * map_height // (count // columns + 1) + 30,
+                        sprite_paths=npc_sprite_paths, entity_store=game.entities)
+        key = f"{key_prefix}_{index}"
+        game.add_npc(key, npc, build_agent(key, npc, behavior) if behavior else None)
+
+
+def setup_walk_caverna(game):
+    # A faixa livre da caverna é a borda de baixo (abaixo das linhas do .map), que atravessa as 3 repetições
+    game.switch_map("caverna_secreta", (150, 0))
+    game.player.map_y = game.current_map_pixel_height - game.player.map_sprite_height
+    game.camera.update(game.player)
+
+
+def setup_dialogue(game):
+    blacksmith = game.npcs["blacksmith"]
+    game.player.map_x, game.player.map_y = blacksmith.map_x, blacksmith.map_y
+
+
+def setup_dialogue_dirty(game):
+    setup_dialogue(game)
+    game.dialogue_dirty_rects = True
+
+
+def keep_dialogue_open(game):
+    # Depois do último ESPAÇO o diálogo fecha; libera a trava para ele abrir de novo no próximo frame
+    if game.game_state == "map":
+        game.dialogue_exit_active = False
+
+
+class PortalHopper:
+    # Põe o jogador sobre o portal do mundo_principal: o portal abre, espera o atraso de ativação e
+    # troca para a caverna_secreta. O portal de volta da caverna, (5, 3), fica abaixo das linhas do
+    # .map e não dispara; a volta é feita direto com switch_map, depois de alguns frames na caverna.
+    def __init__(self, stay_frames):
+        self.stay_frames = stay_frames
+        self.frames_in_cave = 0
+
+    def __call__(self, game):
+        if game.portal_is_activating:
+            return
+        if game.current_map_key == "mundo_principal":
+            self.frames_in_cave = 0
+            place_feet_on_tile(game.player, 9, 11, game.tile_size)
+            return
+        self.frames_in_cave += 1
+        if self.frames_in_cave >= self.stay_frames:
+            return_portal = game.current_map_portals[(5, 3)]
+            game.switch_map(return_portal["target_map_key"], return_portal["target_player_pos"])
+
+
+def setup_stress_map(game):
+    install_stress_map(game, *STRESS_MAP_SIZE)
+
+
+def setup_stream_world(game):
+    install_stream_world(game, *STREAM_WORLD_SIZE)
+
+
+def setup_stress_npcs(game):
+    install_stress_map(game, *STRESS_MAP_SIZE)
+    add_stress_npcs(game, STRESS_NPC_COUNT)
+
+
+def setup_stress_npcs_large(game):
+    install_stress_map(game, *STRESS_MAP_SIZE)
+    add_stress_npcs(game, STRESS_NPC_COUNT_LARGE)
+
+
+def setup_stress_pathing(game):
+    install_stress_map(game, *STRESS_MAP_SIZE)
+    add_stress_npcs(game, STRESS_WANDER_COUNT, {"type": "wander", "radius": 5})
+    add_stress_npcs(game, STRESS_SEEK_COUNT, {"type": "seek", "goal": "player"}, key_prefix="stress_seeker")
+    add_stress_npcs(game, STRESS_PATROL_COUNT, {"type": "patrol", "waypoints": STRESS_PATROL_WAYPOINTS, "pause": [60, 90]},
+                    key_prefix="stress_patrol")
+
+
+SCENARIOS = {
+    "walk_mundo": {
+        # O caminho livre do mundo_principal é o corredor central; sobe sem chegar ao portal e
+        # esbarra nas paredes laterais
+        "description": "walk the corridor of mundo_principal",
+        "steps": [(150, (pygame.K_UP,), ()), (30, (pygame.K_LEFT,), ()), (60, (pygame.K_RIGHT,), ()),
+                  (30, (pygame.K_LEFT,), ()), (150, (pygame.K_DOWN,), ())],
+    },
+    "walk_caverna": {
+        "description": "walk across the 3x repeated caverna_secreta",
+        "setup": setup_walk_caverna,
+        "steps": [(600, (pygame.K_RIGHT,), ()), (600, (pygame.K_LEFT,), ())],
+    },
+    "portal": {
+        "description": "portal transitions between mundo_principal and caverna_secreta",
+        "each_frame": PortalHopper(PORTAL_STAY_FRAMES),
+        "steps": [(1, (), ())],
+    },
+    "dialogue": {
+        "description": "dialogue with the blacksmith, advancing with SPACE",
+        "setup": setup_dialogue,
+        "each_frame": keep_dialogue_open,
+        "steps": [(90, (), (pygame.K_SPACE,))],
+    },
+    "dialogue_dirty": {
+        "description": "the dialogue scenario with dirty-rect rendering",
+        "setup": setup_dialogue_dirty,
+        "each_frame": keep_dialogue_open,
+        "steps": [(90, (), (pygame.K_SPACE,))],
+    },
+    "stress_map": {
+        "description": f"synthetic {STRESS_MAP_SIZE[0]}x{STRESS_MAP_SIZE[1]} tile map",
+        "setup": setup_stress_map,
+        "steps": [(400, (pygame.K_RIGHT,), ()), (400, (pygame.K_DOWN,), ()), (400, (pygame.K_LEFT,), ()), (400, (pygame.K_UP,), ())],
+    },
+    "stream_world": {
+        # Atravessa chunks o tempo todo: mede o streaming e o pico de memória com um mundo enorme
+        "description": f"streamed {STREAM_WORLD_SIZE[0]}x{STREAM_WORLD_SIZE[1]} tile world (.vchunks)",
+        "setup": setup_stream_world,
+        "steps": [(1000, (pygame.K_RIGHT,), ()), (1000, (pygame.K_DOWN,), ())],
+    },
+    "stress_npcs": {
+        "description": f"synthetic map with {STRESS_NPC_COUNT} NPCs",
+        "setup": setup_stress_npcs,
+        "steps": [(400, (pygame.K_RIGHT,), ()), (400, (pygame.K_DOWN,), ()), (400, (pygame.K_LEFT,), ()), (400, (pygame.K_UP,), ())],
+    },
+    "stress_npcs_large": {
+        "description": f"synthetic map with {STRESS_NPC_COUNT_LARGE} NPCs",
+        "setup": setup_stress_npcs_large,
+        "steps": [(400, (pygame.K_RIGHT,), ()), (400, (pygame.K_DOWN,), ()), (400, (pygame.K_LEFT,), ()), (400, (pygame.K_UP,), ())],
+    },
+    "stress_pathing": {
+        "description": f"{STRESS_WANDER_COUNT} wandering, {STRESS_SEEK_COUNT} player-seeking and {STRESS_PATROL_COUNT} patrolling NPCs on the synthetic map",
+        "setup": setup_stress_pathing,
+        "steps": [(400, (pygame.K_RIGHT,), ()), (400, (pygame.K_DOWN,), ()), (400, (pygame.K_LEFT,), ()), (400, (pygame.K_UP,), ())],
+    },
+}
+
+
+def peak_memory_kb():
+    # Pico de memória residente do processo (None onde o módulo resource não existe)
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak # macOS informa em bytes, Linux em KB
+
+
+def run_scenario(name, frames=DEFAULT_FRAMES, warmup=DEFAULT_WARMUP):
+    scenario = SCENARIOS[name]
+    game = Game()
+    game.finish_loading()
+    game.fps_cap = 0
+    scripted_input = ScriptedInput(scenario["steps"])
+    game.key_state = scripted_input
+    if scenario.get("setup"):
+        scenario["setup"](game)
+    each_frame = scenario.get("each_frame")
+
+    def step():
+        scripted_input.advance()
+        if each_frame:
+            each_frame(game)
+        game.run_frame(game.timestep.step_seconds) # Exatamente um tick de simulação por frame
+
+    for _ in range(warmup):
+        step()
+    # Janela do profiler do tamanho do benchmark, para os percentis cobrirem todos os frames medidos
+    profiler.window = frames
+    profiler.reset()
+    start = time.perf_counter()
+    for _ in range(frames):
+        step()
+    elapsed = time.perf_counter() - start
+    game.shutdown()
+
+    summary = profiler.summary()
+    return {
+        "frames": frames,
+        "seconds": elapsed,
+        "fps": frames / elapsed if elapsed > 0 else 0.0,
+        "frame_ms": summary["frame_ms"],
+        "phases_ms": summary["phases_ms"],
+        "counters_per_frame": summary["counters_per_frame"],
+        "peak_memory_kb": peak_memory_kb(),
+        "final_map": game.current_map_key,
+    }
+
+
+def run_scenario_subprocess(name, frames, warmup):
+    # Roda o cenário em um processo novo e lê o resultado de um arquivo temporário
+    # (a saída padrão do jogo fica livre para os prints de troca de mapa)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        result_file = os.path.join(temp_dir, "result.json")
+        command = [sys.executable, os.path.abspath(__file__), name, "--frames", str(frames), "--warmup", str(warmup),
+                   "--in-process", "--result-file", result_file, "--quiet"]
+        completed = subprocess.run(command, stdout=subprocess.DEVNULL)
+        if completed.returncode != 0 or not os.path.exists(result_file):
+            raise RuntimeError(f"scenario {name} failed (exit code {completed.returncode})")
+        with open(result_file) as result_input:
+            return json.load(result_input)[name]
+
+
+def format_result(name, result):
+    frame_ms = result["frame_ms"]
+    phases = ", ".join(f"{phase} {times['mean']:.2f}" for phase, times in result["phases_ms"].items())
+    memory = f"{result['peak_memory_kb'] / 1024:.0f} MB" if result.get("peak_memory_kb") else "n/a"
+    return (f"{name:<14} {result['fps']:8.1f} fps | frame p50 {frame_ms['p50']:.2f} p95 {frame_ms['p95']:.2f} "
+            f"p99 {frame_ms['p99']:.2f} ms | peak {memory}\n{'':<14} phases (mean ms): {phases}")
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    # Imprime a variação de cada cenário em relação ao baseline; retorna os nomes com regressão de FPS
+    regressions = []
+    for name, result in results.items():
+        baseline_result = baseline.get("scenarios", {}).get(name)
+        if not baseline_result or not baseline_result.get("fps"):
+            print(f"{name:<14} no baseline")
+            continue
+        fps_change = result["fps"] / baseline_result["fps"] - 1
+        baseline_p95 = baseline_result["frame_ms"]["p95"]
+        p95_change = result["frame_ms"]["p95"] / baseline_p95 - 1 if baseline_p95 else 0.0
+        regressed = fps_change < -tolerance
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<14} fps {baseline_result['fps']:.1f} -> {result['fps']:.1f} ({fps_change:+.1%}), "
+              f"frame p95 {p95_change:+.1%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless benchmark of the game loop")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all): {', '.join(SCENARIOS)}")
+    parser.add_argument("--frames", type=int, default=DEFAULT_FRAMES, help="measured frames per scenario")
+    parser.add_argument("--warmup", type=int, default=DEFAULT_WARMUP, help="frames run before measuring")
+    parser.add_argument("--in-process", action="store_true", help="run all scenarios in this process (caches and peak memory are shared)")
+    parser.add_argument("--result-file", help="write the results as JSON to this file")
+    parser.add_argument("--save-baseline", help="save the results as a baseline JSON file")
+    parser.add_argument("--baseline", help="compare against a baseline JSON file; exit code 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed FPS drop against the baseline (fraction)")
+    parser.add_argument("--quiet", action="store_true", help="do not print the per-scenario report")
+    args = parser.parse_args(argv)
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(unknown)}")
+        return 2
+
+    results = {}
+    for name in names:
+        if args.in_process:
+            results[name] = run_scenario(name, args.frames, args.warmup)
+        else:
+            results[name] = run_scenario_subprocess(name, args.frames, args.warmup)
+        if not args.quiet:
+            print(format_result(name, results[name]))
+
+    if args.result_file:
+        with open(args.result_file, "w") as result_output:
+            json.dump(results, result_output, indent=2)
+
+    if args.save_baseline:
+        baseline = {
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "python": platform.python_version(),
+            "pygame": pygame.version.ver,
+            "frames": args.frames,
+            "scenarios": results,
+        }
+        with open(args.save_baseline, "w") as baseline_output:
+            json.dump(baseline, baseline_output, indent=2)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as baseline_input:
+            baseline = json.load(baseline_input)
+        if baseline.get("frames") != args.frames:
+            print(f"Warning: baseline was recorded with {baseline.get('frames')} frames, this run used {args.frames}")
+        if compare_with_baseline(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,36 @@
 import pygame
 
+from config import CAMERA_DEAD_ZONE, CAMERA_SMOOTHING
+
 class Camera:
-    def __init__(self, width, height, map_width, map_height):
+    def __init__(self, width, height, map_width, map_height, dead_zone=CAMERA_DEAD_ZONE, smoothing=CAMERA_SMOOTHING):
         self.camera_rect = pygame.Rect(0, 0, width, height)
         self.width = width
         self.height = height
         self.map_width = map_width
         self.map_height = map_height
+        # Zona morta (largura, altura) no centro da tela: o alvo anda dentro dela sem a câmera se mexer
+        self.dead_zone = dead_zone
+        # Fração da distância até o destino que fica para o próximo tick (0 = segue o alvo na hora)
+        self.smoothing = smoothing
+        # Posição exata (float) da câmera; camera_rect é ela arredondada para pixels inteiros
+        self.x = 0.0
+        self.y = 0.0
+        self.scrolled_by = (0, 0) # Quanto camera_rect andou no último update (dx, dy), em pixels
+        self.previous_topleft = self.camera_rect.topleft # Posição no tick anterior, para interpolar o desenho
+
+    @property
+    def moved(self):
+        return self.scrolled_by != (0, 0)
+
+    def snapshot(self):
+        self.previous_topleft = self.camera_rect.topleft
+
+    def render_offset(self, alpha):
+        # Deslocamento da câmera interpolado entre o tick anterior e o atual (alpha 1 = posição atual)
+        previous_x, previous_y = self.previous_topleft
+        return (previous_x + (self.camera_rect.x - previous_x) * alpha,
+                previous_y + (self.camera_rect.y - previous_y) * alpha)
 
     def apply_to_rect(self, rect): # rect is a pygame.Rect on the map
         return rect.move(self.camera_rect.left, self.camera_rect.top)
@@ -14,17 +38,47 @@ class Camera:
     def apply_to_surface(self, surface_rect): # surface_rect is a pygame.Rect for a surface to be blitted
         return surface_rect.move(self.camera_rect.left, self.camera_rect.top)
 
-    def update(self, target): # target is a Character object
+    def _centered_on(self, target):
         # Centraliza a câmera no alvo (target.map_x, target.map_y são o canto superior esquerdo do sprite do alvo)
         # Para centralizar o *centro* do alvo, ajustamos por metade do tamanho do alvo e metade do tamanho da câmera.
         # Assumes target has map_x, map_y, map_sprite_width, and map_sprite_height attributes
         x = -target.map_x + self.width // 2 - target.map_sprite_width // 2
         y = -target.map_y + self.height // 2 - target.map_sprite_height // 2
+        return x, y
 
+    def _clamp(self, x, y):
         # Limita o scroll aos limites do mapa
         x = min(0, x)  # Não deixa a câmera ir para a esquerda do início do mapa (0)
         y = min(0, y)  # Não deixa a câmera ir para cima do início do mapa (0)
         x = max(-(self.map_width - self.width), x)  # Não deixa a câmera ir para a direita do fim do mapa
         y = max(-(self.map_height - self.height), y) # Não deixa a câmera ir para baixo do fim do mapa
-        
-        self.camera_rect.topleft = (x, y)
+        return x, y
+
+    def _set_position(self, x, y):
+        self.x, self.y = self._clamp(x, y)
+        previous_topleft = self.camera_rect.topleft
+        self.camera_rect.topleft = (round(self.x), round(self.y))
+        self.scrolled_by = (self.camera_rect.x - previous_topleft[0], self.camera_rect.y - previous_topleft[1])
+
+    def update(self, target): # target is a Character object
+        goal_x, goal_y = self._centered_on(target)
+
+        # Zona morta: só persegue o alvo quando ele sai do retângulo central
+        dead_zone_width, dead_zone_height = self.dead_zone
+        goal_x = self._outside_dead_zone(self.x, goal_x, dead_zone_width / 2)
+        goal_y = self._outside_dead_zone(self.y, goal_y, dead_zone_height / 2)
+
+        # Suavização: anda só uma parte do caminho a cada tick
+        follow = 1.0 - self.smoothing
+        self._set_position(self.x + (goal_x - self.x) * follow, self.y + (goal_y - self.y) * follow)
+
+    def _outside_dead_zone(self, current, goal, half_size):
+        if goal - current > half_size:
+            return goal - half_size
+        if current - goal > half_size:
+            return goal + half_size
+        return current
+
+    def snap_to(self, target):
+        # Vai direto para o alvo, sem zona morta nem suavização (início do jogo, troca de mapa)
+        self._set_position(*self._centered_on(target))
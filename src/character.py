@@ -1,57 +1,42 @@
 import pygame
 
+from assets import GLOBAL_SCOPE
+from entities import EntityStore
+from profiler import profiler
+from sprite_cache import sprite_cache
+
 # Cores (se forem usadas apenas pela Character, podem ficar aqui ou em um config.py)
 BLUE = (100, 150, 255) 
 
 class Character:
-    def __init__(self, name, color=BLUE, map_x=0, map_y=0, sprite_paths=None): # Changed sprite_path to sprite_paths
+    # Personagem do jogo. O estado que muda a cada tick (posição, animação) fica no EntityStore, em arrays
+    # compartilhados com os outros personagens; os sprites ficam num SpriteSet compartilhado por referência.
+    # Assim 1000+ NPCs custam pouca memória e podem ser animados/testados em lote pelo Game.
+    __slots__ = ("name", "color", "story", "sprite_paths", "asset_scope", "sprite_set", "store", "index", "_current_direction",
+                 "player_speed", "collision_box_width_ratio", "collision_box_height_ratio",
+                 "collision_box_width", "collision_box_height", "collision_box_offset_x", "collision_box_offset_y")
+
+    # New dimensions based on 28x34 aspect ratio, aiming for height ~102
+    map_sprite_width = 58
+    map_sprite_height = 81
+    animation_speed = 15
+
+    def __init__(self, name, color=BLUE, map_x=0, map_y=0, sprite_paths=None, asset_scope=GLOBAL_SCOPE, entity_store=None): # Changed sprite_path to sprite_paths
         self.name = name
         self.color = color
-        # Default dialogue sprite size, can be overridden by 'frente' sprite
-        self.dialogue_sprite_original_width = 150 
-        self.dialogue_sprite_original_height = 200
-
-        self.directional_frames = {} # Stores lists of frames for each direction
-        self.current_frame_index = 0
-        self.animation_speed = 15 
-        self.animation_timer = 0
-        self.is_moving = False
-        self.current_direction = "frente" # Default direction
-
-        if sprite_paths:
-            for direction, path in sprite_paths.items():
-                try:
-                    full_sprite_image = pygame.image.load(path).convert_alpha()
-                    spritesheet_width = full_sprite_image.get_width()
-                    spritesheet_height = full_sprite_image.get_height()
-                    # Assuming 2 frames horizontally for animation if spritesheet is wide enough
-                    frame_width = spritesheet_width // 2 
-                    frame_height = spritesheet_height
-
-                    current_direction_frames = []
-                    if frame_width > 0 and spritesheet_width >= frame_width * 2: # Check if it's a 2-frame sheet
-                        current_direction_frames.append(full_sprite_image.subsurface(pygame.Rect(0, 0, frame_width, frame_height)))
-                        current_direction_frames.append(full_sprite_image.subsurface(pygame.Rect(frame_width, 0, frame_width, frame_height)))
-                    else: # Single frame sprite
-                        current_direction_frames.append(full_sprite_image)
-                    
-                    self.directional_frames[direction] = current_direction_frames
-                    
-                    # If this is the 'frente' sprite, set dialogue dimensions from its first frame
-                    if direction == "frente" and current_direction_frames:
-                        first_frame_frente = current_direction_frames[0]
-                        self.dialogue_sprite_original_width = first_frame_frente.get_width()
-                        self.dialogue_sprite_original_height = first_frame_frente.get_height()
-
-                except pygame.error as e:
-                    print(f"Cannot load sprite for {self.name} direction {direction} at {path}: {e}")
-                    self.directional_frames[direction] = [] # Store empty list if loading fails
-        self.map_x = map_x
-        self.map_y = map_y
-        # New dimensions based on 28x34 aspect ratio, aiming for height ~102
-        self.map_sprite_width = 58
-        self.map_sprite_height = 81
-        self.player_speed = 4
+        self.story = None
+
+        # O sprite_cache carrega e escala os frames uma vez só; todos os personagens com os mesmos sprites recebem o mesmo SpriteSet
+        self.sprite_paths = sprite_paths or {}
+        self.asset_scope = asset_scope
+        self.sprite_set = None
+        self.load_sprites()
+        self._current_direction = "frente" # Default direction
+
+        self.store = entity_store if entity_store is not None else EntityStore(capacity=1)
+        self.index = self.store.add(map_x, map_y, self.map_sprite_width, self.map_sprite_height,
+                                    self.animation_speed, self.sprite_set.frame_count(self._current_direction))
+        self.player_speed = 4 # Pixels por tick de simulação
 
         # Collision hitbox properties (feet area)
         self.collision_box_width_ratio = 0.7  # 70% of sprite width
@@ -64,24 +49,111 @@ class Character:
         self.collision_box_offset_x = (self.map_sprite_width - self.collision_box_width) // 2
         self.collision_box_offset_y = self.map_sprite_height - self.collision_box_height
 
+    # Estado guardado no EntityStore, exposto como atributos comuns
+    @property
+    def map_x(self):
+        return int(self.store.x[self.index])
+
+    @map_x.setter
+    def map_x(self, value):
+        self.store.x[self.index] = value
+        self.store.moved.add(self.index)
+
+    @property
+    def map_y(self):
+        return int(self.store.y[self.index])
+
+    @map_y.setter
+    def map_y(self, value):
+        self.store.y[self.index] = value
+        self.store.moved.add(self.index)
+
+    @property
+    def previous_map_x(self):
+        return int(self.store.previous_x[self.index])
+
+    @property
+    def previous_map_y(self):
+        return int(self.store.previous_y[self.index])
+
+    @property
+    def current_frame_index(self):
+        return int(self.store.frame_index[self.index])
+
+    @current_frame_index.setter
+    def current_frame_index(self, value):
+        self.store.frame_index[self.index] = value
+
+    @property
+    def animation_timer(self):
+        return int(self.store.animation_timer[self.index])
+
+    @property
+    def is_moving(self):
+        return bool(self.store.moving[self.index])
+
+    @is_moving.setter
+    def is_moving(self, value):
+        self.store.moving[self.index] = bool(value)
+
+    def load_sprites(self):
+        # (Re)obtém o SpriteSet; depois de release_sprites, o sprite_cache recarrega os frames no escopo
+        if self.sprite_set is None:
+            self.sprite_set = sprite_cache.get_sprite_set(self.sprite_paths, (self.map_sprite_width, self.map_sprite_height),
+                                                          self.asset_scope)
+
+    def release_sprites(self):
+        # Solta o SpriteSet (NPC de um mapa que foi descarregado), para os frames saírem da memória junto
+        # com o escopo do mapa. O personagem não pode ser desenhado até load_sprites.
+        self.sprite_set = None
+
+    @property
+    def current_direction(self):
+        return self._current_direction
+
+    @current_direction.setter
+    def current_direction(self, direction):
+        if direction != self._current_direction:
+            self._current_direction = direction
+            self.store.frame_count[self.index] = self.sprite_set.frame_count(direction)
+
+    # Sprites compartilhados
+    @property
+    def directional_frames(self):
+        return self.sprite_set.directional_frames
+
+    @property
+    def map_frames(self):
+        return self.sprite_set.map_frames
+
+    @property
+    def dialogue_sprite_original_width(self):
+        return self.sprite_set.dialogue_size[0]
+
+    @property
+    def dialogue_sprite_original_height(self):
+        return self.sprite_set.dialogue_size[1]
+
+    def snapshot_position(self):
+        self.store.previous_x[self.index] = self.store.x[self.index]
+        self.store.previous_y[self.index] = self.store.y[self.index]
+
+    def render_position(self, alpha):
+        # Posição no mapa interpolada entre o tick anterior e o atual (alpha 1 = posição atual)
+        previous_map_x = self.previous_map_x
+        previous_map_y = self.previous_map_y
+        return (previous_map_x + (self.map_x - previous_map_x) * alpha,
+                previous_map_y + (self.map_y - previous_map_y) * alpha)
 
     def update_animation(self):
-        active_frames = self.directional_frames.get(self.current_direction, self.directional_frames.get("frente", []))
+        # Not animated if no frames, just a single frame, or not moving (mesma regra de EntityStore.tick_animation)
+        self.store.tick_animation([self.index])
 
-        if not active_frames or len(active_frames) <= 1: # Not animated if no frames or just a single frame
-            self.current_frame_index = 0 # Reset to first frame if available (or stay at 0 if no frames)
-            self.animation_timer = 0
-            return
-
-        if not self.is_moving:
-            self.current_frame_index = 0
-            self.animation_timer = 0
-            return
-        
-        self.animation_timer += 1
-        if self.animation_timer >= self.animation_speed:
-            self.animation_timer = 0
-            self.current_frame_index = (self.current_frame_index + 1) % len(active_frames)
+    def _nearby_collision_rects(self, collision_rects, collision_rect):
+        # collision_rects pode ser uma lista simples de Rects ou um TileGrid (consulta só os tiles sob o retângulo)
+        if hasattr(collision_rects, "query"):
+            return collision_rects.query(collision_rect)
+        return collision_rects
 
     def move(self, dx, dy, map_width, map_height, collision_rects=None):
         # Attempt X movement
@@ -96,7 +168,7 @@ class Character:
 
         collided_x = False
         if collision_rects and dx != 0:
-            for rect in collision_rects:
+            for rect in self._nearby_collision_rects(collision_rects, player_collision_rect_x):
                 if player_collision_rect_x.colliderect(rect):
                     if dx > 0:  # Moving right
                         # Adjust map_x so collision_box right edge touches rect left edge
@@ -122,7 +194,7 @@ class Character:
 
         collided_y = False
         if collision_rects and dy != 0:
-            for rect in collision_rects:
+            for rect in self._nearby_collision_rects(collision_rects, player_collision_rect_y):
                 if player_collision_rect_y.colliderect(rect):
                     if dy > 0:  # Moving down
                         # Adjust map_y so collision_box bottom edge touches rect top edge
@@ -140,16 +212,24 @@ class Character:
         self.map_x = max(0, min(self.map_x, map_width - self.map_sprite_width))
         self.map_y = max(0, min(self.map_y, map_height - self.map_sprite_height))
 
-    def draw_on_map(self, screen, position):
-        active_frames = self.directional_frames.get(self.current_direction, self.directional_frames.get("frente", []))
-
-        if active_frames:
-            # Ensure current_frame_index is valid for the current set of frames
-            if self.current_frame_index >= len(active_frames):
-                self.current_frame_index = 0
-            
-            current_frame_surface = active_frames[self.current_frame_index]
-            scaled_sprite = pygame.transform.scale(current_frame_surface, (self.map_sprite_width, self.map_sprite_height))
-            screen.blit(scaled_sprite, position)
+    def map_frame(self, frame_index=None):
+        # Frame do mapa a desenhar agora (None se não há frames). frame_index pode vir já lido do
+        # EntityStore, quando o Game desenha vários personagens de uma vez.
+        if frame_index is None:
+            frame_index = self.current_frame_index
+        map_frames = self.sprite_set.map_frames
+        active_frames = map_frames.get(self._current_direction, map_frames.get("frente", []))
+        if not active_frames:
+            return None
+        # Ensure current_frame_index is valid for the current set of frames
+        if frame_index >= len(active_frames):
+            frame_index = self.current_frame_index = 0
+        return active_frames[frame_index]
+
+    def draw_on_map(self, screen, position, frame_index=None):
+        frame = self.map_frame(frame_index)
+        if frame is not None:
+            screen.blit(frame, position)
+            profiler.count("blit")
         else:
             pygame.draw.rect(screen, self.color, (position[0], position[1], self.map_sprite_width, self.map_sprite_height))
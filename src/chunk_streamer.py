@@ -0,0 +1,234 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pygame
+
+from config import STREAM_LOAD_RADIUS, STREAM_EVICT_RADIUS, STREAM_MAX_CHUNKS
+from map_format import EMPTY_TILE_ID
+from profiler import profiler
+
+
+class StreamedChunk:
+    # Um chunk carregado: ids dos tiles e máscara de colisão (linhas x colunas do chunk)
+    __slots__ = ("chunk_col", "chunk_row", "tile_ids", "blocking")
+
+    def __init__(self, chunk_col, chunk_row, tile_ids, blocking):
+        self.chunk_col = chunk_col
+        self.chunk_row = chunk_row
+        self.tile_ids = tile_ids
+        self.blocking = blocking
+
+    def nbytes(self):
+        return self.tile_ids.nbytes + self.blocking.nbytes
+
+
+class ChunkStreamer:
+    # Mapa em streaming a partir de um ChunkedMap (.vchunks). Só os chunks a até load_radius do chunk
+    # da câmera ficam carregados; a leitura, a descompressão e a máscara de colisão de um chunk novo
+    # são feitas numa thread de trabalho, e os chunks além de evict_radius (ou além de max_chunks, os
+    # menos usados primeiro) são descartados. Assim a memória não depende do tamanho do mapa.
+    # Tem a mesma interface de consulta do TileGrid (query, tile_key), então Character.move e a
+    # detecção de portais funcionam sem mudança; um tile de chunk ainda não carregado bloqueia.
+    def __init__(self, chunked_map, tiles, load_radius=STREAM_LOAD_RADIUS, evict_radius=STREAM_EVICT_RADIUS,
+                 max_chunks=STREAM_MAX_CHUNKS):
+        self.chunked_map = chunked_map
+        self.palette = chunked_map.palette
+        self.rows = chunked_map.rows
+        self.cols = chunked_map.cols
+        self.tile_size = chunked_map.tile_size
+        self.chunk_tiles = chunked_map.chunk_tiles
+        self.chunk_pixels = self.chunk_tiles * self.tile_size
+        self.pattern_pixel_width = chunked_map.pixel_width
+        self.repeat_x = 1
+        self.load_radius = load_radius
+        self.evict_radius = max(evict_radius, load_radius)
+        # Nunca descarta chunks que ainda estão dentro do raio de carga
+        self.max_chunks = max(max_chunks, (2 * load_radius + 1) ** 2)
+        # Imagem de cada id da paleta (None para tiles sem imagem, como 'x') e máscara dos ids desenháveis
+        self.tile_images = [tiles.get(tile_key) for tile_key in self.palette]
+        self.drawable_ids = np.zeros(256, dtype=bool)
+        for tile_id, tile_image in enumerate(self.tile_images):
+            self.drawable_ids[tile_id] = tile_image is not None
+
+        self.chunks = OrderedDict() # (coluna, linha) do chunk -> StreamedChunk, do menos para o mais usado
+        self.pending = {} # (coluna, linha) do chunk -> Future do carregamento
+        self.executor = None # Criado no primeiro update(), na thread principal
+        self.center_chunk = None
+        # Muda sempre que um chunk termina de carregar; o fundo em cache (ScrollBuffer) é redesenhado.
+        # Descartar não muda: os chunks descartados já estão fora da tela.
+        self.version = 0
+        self.loaded_count = 0
+        self.evicted_count = 0
+
+    def __bool__(self):
+        # Qualquer ponto do mundo pode bloquear (ver query); mantém 'if collision_rects' verdadeiro
+        return True
+
+    def load_chunk(self, chunk_col, chunk_row):
+        # Trabalho pesado de um chunk (leitura, descompressão, colisão); roda na thread de trabalho
+        tile_ids = self.chunked_map.read_chunk(chunk_col, chunk_row)
+        return StreamedChunk(chunk_col, chunk_row, tile_ids, self.chunked_map.blocking_ids[tile_ids])
+
+    def chunk_at(self, x, y):
+        # Chunk sob o ponto (x, y) do mundo, limitado ao mapa
+        return (min(max(int(x) // self.chunk_pixels, 0), self.chunked_map.chunks_x - 1),
+                min(max(int(y) // self.chunk_pixels, 0), self.chunked_map.chunks_y - 1))
+
+    def chunks_around(self, center, radius):
+        # Chunks do mapa a até 'radius' (na horizontal e na vertical) de 'center', os mais perto primeiro
+        center_col, center_row = center
+        chunks = [(chunk_col, chunk_row)
+                  for chunk_row in range(max(0, center_row - radius), min(self.chunked_map.chunks_y, center_row + radius + 1))
+                  for chunk_col in range(max(0, center_col - radius), min(self.chunked_map.chunks_x, center_col + radius + 1))]
+        chunks.sort(key=lambda chunk: max(abs(chunk[0] - center_col), abs(chunk[1] - center_row)))
+        return chunks
+
+    def load_around(self, x, y):
+        # Carrega na hora os chunks em volta de (x, y). Usado ao montar o bundle do mapa (na thread do
+        # MapPreloader), para o jogador já chegar com o chão e a colisão em volta dele prontos.
+        self.center_chunk = self.chunk_at(x, y)
+        for chunk_key in self.chunks_around(self.center_chunk, self.load_radius):
+            if chunk_key not in self.chunks:
+                self._store(self.load_chunk(*chunk_key))
+
+    def _store(self, chunk):
+        self.chunks[(chunk.chunk_col, chunk.chunk_row)] = chunk
+        self.loaded_count += 1
+        self.version += 1
+
+    def update(self, x, y):
+        # Chamado a cada tick com o centro da câmera: guarda os chunks que terminaram de carregar,
+        # pede os que entraram no raio e descarta os que ficaram longe
+        stored = False
+        for chunk_key, future in list(self.pending.items()):
+            if future.done():
+                del self.pending[chunk_key]
+                try:
+                    chunk = future.result()
+                except Exception as e:
+                    print(f"Error loading chunk {chunk_key} of {self.chunked_map.path}: {e}")
+                    continue
+                profiler.count("chunk_stream_load")
+                # A câmera pode ter se afastado enquanto o chunk carregava: longe demais, ele nem entra
+                if self._distance(chunk_key, self.center_chunk) <= self.evict_radius:
+                    self._store(chunk)
+                    stored = True
+
+        center = self.chunk_at(x, y)
+        if center == self.center_chunk:
+            if stored:
+                self._evict_over_cap()
+            return
+        self.center_chunk = center
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chunk-streamer")
+        wanted = self.chunks_around(center, self.load_radius)
+        for chunk_key in wanted:
+            if chunk_key in self.chunks:
+                self.chunks.move_to_end(chunk_key)
+            elif chunk_key not in self.pending:
+                self.pending[chunk_key] = self.executor.submit(self.load_chunk, *chunk_key)
+
+        # Pedidos que ficaram longe antes de começar são cancelados; chunks longe saem da memória
+        for chunk_key, future in list(self.pending.items()):
+            if self._distance(chunk_key, center) > self.evict_radius and future.cancel():
+                del self.pending[chunk_key]
+        for chunk_key in [chunk_key for chunk_key in self.chunks if self._distance(chunk_key, center) > self.evict_radius]:
+            self._evict(chunk_key)
+        self._evict_over_cap()
+
+    def _evict_over_cap(self):
+        # Além de max_chunks, descarta os menos usados primeiro
+        while len(self.chunks) > self.max_chunks:
+            self._evict(next(iter(self.chunks)))
+
+    def _distance(self, chunk_key, center):
+        return max(abs(chunk_key[0] - center[0]), abs(chunk_key[1] - center[1]))
+
+    def _evict(self, chunk_key):
+        del self.chunks[chunk_key]
+        self.evicted_count += 1
+
+    def _tile_chunk(self, col, row):
+        return self.chunks.get((col // self.chunk_tiles, row // self.chunk_tiles))
+
+    def tile_key(self, col, row):
+        # Chave do tile na coluna/linha, ou None fora do mapa, em tile vazio ou em chunk não carregado
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            chunk = self._tile_chunk(col, row)
+            if chunk is not None:
+                tile_id = chunk.tile_ids[row % self.chunk_tiles, col % self.chunk_tiles]
+                if tile_id != EMPTY_TILE_ID:
+                    return self.palette[tile_id]
+        return None
+
+    def query(self, rect):
+        # Retângulos dos tiles bloqueadores que cruzam 'rect' (coordenadas do mundo), linha a linha,
+        # como TileGrid.query. Tiles de chunks ainda não carregados contam como bloqueadores.
+        if rect.width <= 0 or rect.height <= 0:
+            return []
+        tile_size = self.tile_size
+        found = []
+        for row in range(max(0, rect.top // tile_size), min(self.rows, (rect.bottom - 1) // tile_size + 1)):
+            for col in range(max(0, rect.left // tile_size), min(self.cols, (rect.right - 1) // tile_size + 1)):
+                chunk = self._tile_chunk(col, row)
+                if chunk is None or chunk.blocking[row % self.chunk_tiles, col % self.chunk_tiles]:
+                    found.append(pygame.Rect(col * tile_size, row * tile_size, tile_size, tile_size))
+        return found
+
+    def draw(self, surface, camera_rect, background=None):
+        # Desenha o fundo (repetido nas duas direções) e os tiles dos chunks carregados, só dentro do clip
+        # da superfície (o ScrollBuffer redesenha apenas as faixas que entraram na tela)
+        clip = surface.get_clip()
+        view = clip.move(-camera_rect.x, -camera_rect.y) # Área a desenhar, em coordenadas do mundo
+        if background is not None:
+            pattern_width, pattern_height = background.get_size()
+            for pattern_y in range(view.top - view.top % pattern_height, view.bottom, pattern_height):
+                for pattern_x in range(view.left - view.left % pattern_width, view.right, pattern_width):
+                    surface.blit(background, (pattern_x + camera_rect.x, pattern_y + camera_rect.y))
+                    profiler.count("blit")
+
+        tile_size = self.tile_size
+        chunk_tiles = self.chunk_tiles
+        first_col = max(0, view.left // tile_size)
+        last_col = min(self.cols, (view.right - 1) // tile_size + 1)
+        first_row = max(0, view.top // tile_size)
+        last_row = min(self.rows, (view.bottom - 1) // tile_size + 1)
+        if first_col >= last_col or first_row >= last_row:
+            return
+        blits = []
+        for chunk_row in range(first_row // chunk_tiles, (last_row - 1) // chunk_tiles + 1):
+            for chunk_col in range(first_col // chunk_tiles, (last_col - 1) // chunk_tiles + 1):
+                chunk = self.chunks.get((chunk_col, chunk_row))
+                if chunk is None:
+                    continue
+                # Faixa visível do chunk, em tiles locais
+                chunk_first_col = chunk_col * chunk_tiles
+                chunk_first_row = chunk_row * chunk_tiles
+                local_left = max(first_col - chunk_first_col, 0)
+                local_top = max(first_row - chunk_first_row, 0)
+                local_right = min(last_col - chunk_first_col, chunk_tiles)
+                local_bottom = min(last_row - chunk_first_row, chunk_tiles)
+                visible_ids = chunk.tile_ids[local_top:local_bottom, local_left:local_right]
+                rows, cols = np.nonzero(self.drawable_ids[visible_ids])
+                for row_index, col_index in zip(rows.tolist(), cols.tolist()):
+                    blits.append((self.tile_images[visible_ids[row_index, col_index]],
+                                  ((chunk_first_col + local_left + col_index) * tile_size + camera_rect.x,
+                                   (chunk_first_row + local_top + row_index) * tile_size + camera_rect.y)))
+        if blits:
+            surface.blits(blits, doreturn=False)
+            profiler.count("blit", len(blits))
+
+    def close(self):
+        # Para a thread (esperando o chunk em andamento) antes de fechar o arquivo
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+        self.pending.clear()
+        self.chunks.clear()
+        self.chunked_map.close()
+
+    def stats(self):
+        return {"entries": len(self.chunks), "bytes": sum(chunk.nbytes() for chunk in self.chunks.values()),
+                "pending": len(self.pending), "loaded": self.loaded_count, "evicted": self.evicted_count}
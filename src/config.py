@@ -1,7 +1,7 @@
 # Constants for the game
 WIDTH = 800
 HEIGHT = 600
-FPS = 60
+FPS = 60 # Limite de quadros desenhados por segundo (0 = sem limite); a simulação roda em SIM_RATE
 
 MAP_WIDTH = 2000
 MAP_HEIGHT = 2000
@@ -10,4 +10,73 @@ MAP_HEIGHT = 2000
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
 BLUE = (0, 0, 255)
-DARK_GRAY = (64, 64, 64)
\ No newline at end of file
+DARK_GRAY = (64, 64, 64)
+
+# Cache de chunks pré-renderizados da camada de tiles
+TILE_CHUNK_SIZE = 512 # Lado de cada chunk, em pixels
+TILE_CHUNK_CACHE_BYTES = 64 * 1024 * 1024 # Orçamento de memória do cache de chunks
+
+# Distância (em tiles) de um portal a partir da qual o mapa de destino começa a ser carregado em segundo plano
+PORTAL_PRELOAD_RADIUS = 3
+
+# Simulação em passo fixo, independente da taxa de desenho. Velocidades e atrasos
+# (player_speed, animation_speed, portal_activation_delay, ...) são contados em ticks de simulação.
+SIM_RATE = 60 # Ticks de simulação por segundo
+MAX_SIM_STEPS_PER_FRAME = 5 # Ticks máximos por frame para recuperar atraso; o resto é descartado
+
+TILE_SIZE = 100 # Tamanho de cada tile no mapa, em pixels
+
+# Profiler de frames (F3 mostra o overlay, F4 exporta JSON/CSV)
+PROFILER_WINDOW = 300 # Número de frames na janela dos percentis
+PROFILE_EXPORT_DIR = "profiles"
+
+# Texto renderizado (diálogos, nomes, instruções) fica em cache; só é renderizado de novo quando muda
+TEXT_CACHE_ENTRIES = 128
+DIALOGUE_REVEAL_SPEED = 0 # Caracteres revelados por tick da simulação (SIM_RATE por segundo) no diálogo (efeito máquina de escrever); 0 mostra tudo de uma vez
+
+# No diálogo o mapa fica parado: com isto ligado, o fundo vira um snapshot e só as regiões que mudam
+# (sprite, caixa de diálogo, overlay) são redesenhadas e enviadas com pygame.display.update(rects)
+DIALOGUE_DIRTY_RECTS = False
+
+# Broad phase das interações com NPCs: tamanho da célula do spatial hash, em pixels
+SPATIAL_HASH_CELL_SIZE = 256
+CULL_MARGIN = 32 # Folga (pixels) em volta da câmera ao descartar personagens fora da tela
+
+# Câmera: zona morta (largura, altura em pixels) no centro da tela e suavização
+# (fração da distância que fica para o próximo tick; 0 = segue o jogador na hora)
+CAMERA_DEAD_ZONE = (0, 0)
+CAMERA_SMOOTHING = 0.0
+
+# Fundo (padrão + tiles) num buffer persistente: quando a câmera anda, os pixels já desenhados são
+# rolados com Surface.scroll e só as faixas que entram pela borda são redesenhadas
+SCROLL_BLIT_BACKGROUND = True
+
+# Imprime o tempo de cada etapa da inicialização (imports, display, tiles, personagens, mapa) depois do
+# primeiro frame do mapa; também pode ser ligado com `python src/main.py --profile-startup`
+PROFILE_STARTUP = False
+# Tempo máximo (ms) de carga de assets por frame enquanto a tela de carregamento é mostrada
+LOADING_FRAME_BUDGET_MS = 12
+
+# Pathfinding dos NPCs (A* e campos de fluxo sobre os tiles bloqueadores). As consultas que não couberem
+# no orçamento do frame continuam no frame seguinte.
+PATHFINDING_BUDGET_MS = 2.0 # Tempo máximo de busca por frame
+# Gravação e replay de entrada trocam o orçamento de tempo por um número fixo de passos de busca por frame,
+# para os caminhos ficarem prontos nos mesmos frames da gravação
+PATHFINDING_WORK_BUDGET = 2000
+PATHFINDING_MAX_EXPANSIONS = 4000 # Nós expandidos pelo A* antes de desistir de um destino
+PATH_CACHE_ENTRIES = 512 # Caminhos A* guardados por mapa (LRU)
+FLOW_FIELD_CACHE_ENTRIES = 8 # Campos de fluxo guardados por mapa (LRU)
+NPC_WALK_SPEED = 2 # Pixels por tick de simulação dos NPCs que andam
+
+# Mundos em streaming (mapas .vchunks, ver map_compiler.py --chunked): só os chunks em volta da câmera
+# ficam na memória, carregados numa thread de trabalho
+STREAM_CHUNK_TILES = 16 # Lado de um chunk no disco, em tiles
+STREAM_LOAD_RADIUS = 1 # Chunks carregados em volta do chunk da câmera (1 = 3x3 chunks)
+STREAM_EVICT_RADIUS = 2 # Chunks mais longe que isto do chunk da câmera são descartados
+STREAM_MAX_CHUNKS = 64 # Máximo de chunks na memória (os menos usados recentemente saem primeiro)
+
+# Salvamento (save_state.py): slot usado por main.py --save sem nome de arquivo, autosave e deltas entre
+# reescritas completas do arquivo
+SAVE_FILE = "savegame.vsav"
+AUTOSAVE_SECONDS = 5 # 0 desliga o autosave (F5 continua salvando)
+SAVE_DELTAS_PER_FULL = 100 # Deltas anexados ao arquivo antes de ele ser reescrito com um snapshot completo
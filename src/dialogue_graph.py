@@ -0,0 +1,140 @@
+# Roteiros de diálogo compilados para um grafo indexado (DialogueGraph), usado pela Story de cada NPC.
+#
+# Um roteiro (JSON/TOML, em arquivo próprio ou direto no manifesto) é uma lista de falas em texto (ditas
+# pelo próprio NPC), a forma antiga, ou um objeto {"start": ..., "nodes": [...]}. Cada nó tem:
+#   "text"     a fala (obrigatório)
+#   "id"       nome do nó, usado em "next"/"start" (opcional; sem id o nó só é alcançado em sequência)
+#   "speaker"  chave do personagem que fala (padrão: o próprio NPC; "protagonist" é o jogador)
+#   "set"      flags ligadas ao mostrar o nó, ex: ["ouviu_ferreiro"]; "!flag" desliga
+#   "next"     id do próximo nó, "end" para terminar, ou uma lista de ramos {"if": condição, "goto": id},
+#              testados em ordem (um ramo sem "if" sempre vale). Sem "next", segue para o nó seguinte da lista.
+# "start" aceita o mesmo que "next" (padrão: o primeiro nó). Uma condição é uma flag, "!flag" ou uma
+# lista delas (todas precisam valer); flags nunca ligadas valem como desligadas.
+
+# Ramo "fim da conversa" antes de saber quantos nós o grafo tem (trocado por len(nodes) na compilação)
+END = None
+
+
+class DialogueScriptError(Exception):
+    pass
+
+
+class DialogueGraph:
+    # Roteiro compilado: nós numerados 0..len-1 em listas paralelas; len(graph) é o índice de "fim".
+    # Os falantes são internados (cada chave aparece uma vez em 'speakers' e os nós guardam o índice),
+    # então a Story resolve cada personagem uma vez por conversa, não a cada fala. 'lines' guarda o texto
+    # de cada nó já quebrado em linhas para a caixa de diálogo (None quando compilado sem medir).
+    def __init__(self, ids, speakers, node_speakers, texts, node_flags, branches, start_branches, lines=None):
+        self.ids = ids # id -> índice do nó (só nós com id)
+        self.speakers = speakers
+        self.node_speakers = node_speakers
+        self.texts = texts
+        self.node_flags = node_flags # Por nó: ((flag, valor), ...) aplicadas ao mostrar o nó
+        self.branches = branches # Por nó: (((flag, valor), ...), destino), ...
+        self.start_branches = start_branches
+        self.lines = lines
+
+    def __len__(self):
+        return len(self.texts)
+
+    def follow(self, branches, flags):
+        # Destino do primeiro ramo cujas condições valem (len(self) = fim)
+        for conditions, target in branches:
+            if all(flags.get(flag, False) == value for flag, value in conditions):
+                return target
+        return len(self)
+
+    def start(self, flags):
+        return self.follow(self.start_branches, flags)
+
+    def next(self, node, flags):
+        return self.follow(self.branches[node], flags)
+
+
+def parse_flag(flag):
+    if not isinstance(flag, str) or not flag.lstrip("!"):
+        raise DialogueScriptError(f"invalid flag {flag!r}")
+    return (flag[1:], False) if flag.startswith("!") else (flag, True)
+
+
+def parse_condition(condition):
+    if condition is None:
+        return ()
+    conditions = [condition] if isinstance(condition, str) else condition
+    if not isinstance(conditions, list):
+        raise DialogueScriptError(f"invalid condition {condition!r}")
+    return tuple(parse_flag(flag) for flag in conditions)
+
+
+def parse_next(value, following, where):
+    # "next"/"start" -> lista de (condições, id do destino ou END); 'following' é o nó seguinte da lista
+    if value is None:
+        return [((), following)]
+    if value == "end":
+        return [((), END)]
+    if isinstance(value, str):
+        return [((), value)]
+    if not isinstance(value, list):
+        raise DialogueScriptError(f"{where}: invalid next {value!r}")
+    branches = []
+    for branch in value:
+        if not isinstance(branch, dict) or "goto" not in branch:
+            raise DialogueScriptError(f"{where}: branch {branch!r} needs a 'goto'")
+        branches.append((parse_condition(branch.get("if")), END if branch["goto"] == "end" else branch["goto"]))
+    return branches
+
+
+def compile_dialogue(script, default_speaker, measure=None):
+    # Compila um roteiro (ver o formato acima) em DialogueGraph. measure(texto) -> linhas, quando dado,
+    # quebra todas as falas uma vez aqui, em vez de a cada vez que o texto aparece na caixa de diálogo.
+    if isinstance(script, list):
+        # Forma antiga: falas em sequência, texto do próprio NPC ou {"character": ..., "text": ...}
+        script = {"nodes": [{"text": line} if isinstance(line, str) else
+                            {"speaker": line.get("character", default_speaker), "text": line.get("text")} for line in script]}
+    if not isinstance(script, dict) or not isinstance(script.get("nodes"), list):
+        raise DialogueScriptError("a dialogue script is a list of lines or an object with a 'nodes' list")
+    nodes = script["nodes"]
+    if not nodes:
+        raise DialogueScriptError("dialogue script has no nodes")
+
+    ids = {}
+    speakers = []
+    speaker_indices = {}
+    node_speakers = []
+    texts = []
+    node_flags = []
+    pending_branches = []
+    for index, node in enumerate(nodes):
+        where = f"node {node.get('id', index)!r}" if isinstance(node, dict) else f"node {index}"
+        if not isinstance(node, dict) or not isinstance(node.get("text"), str):
+            raise DialogueScriptError(f"{where}: missing 'text'")
+        if "id" in node:
+            if node["id"] in ids or node["id"] == "end":
+                raise DialogueScriptError(f"{where}: duplicate or reserved id")
+            ids[node["id"]] = index
+        speaker = node.get("speaker", default_speaker)
+        if speaker not in speaker_indices:
+            speaker_indices[speaker] = len(speakers)
+            speakers.append(speaker)
+        node_speakers.append(speaker_indices[speaker])
+        texts.append(node["text"])
+        node_flags.append(tuple(parse_flag(flag) for flag in node.get("set", ())))
+        pending_branches.append(parse_next(node.get("next"), index + 1, where))
+    pending_start = parse_next(script.get("start"), 0, "start")
+
+    # Destinos por id viram índices; END e o "nó seguinte" do último nó viram len(nodes) (fim)
+    def resolve(branches, where):
+        resolved = []
+        for conditions, target in branches:
+            if target is END:
+                target = len(nodes)
+            elif isinstance(target, str):
+                if target not in ids:
+                    raise DialogueScriptError(f"{where}: unknown node id {target!r}")
+                target = ids[target]
+            resolved.append((conditions, target))
+        return tuple(resolved)
+
+    branches = [resolve(node_branches, f"node {index}") for index, node_branches in enumerate(pending_branches)]
+    lines = [measure(text) for text in texts] if measure else None
+    return DialogueGraph(ids, speakers, node_speakers, texts, node_flags, branches, resolve(pending_start, "start"), lines)
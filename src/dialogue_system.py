@@ -1,5 +1,8 @@
 import pygame
 
+from config import DIALOGUE_REVEAL_SPEED
+from text_cache import text_cache, wrap_text
+
 # Cores (se forem usadas apenas pelo DialogueSystem, podem ficar aqui ou em um config.py)
 WHITE = (255, 255, 255)
 DARK_GRAY = (64, 64, 64)
@@ -12,41 +15,52 @@ class DialogueSystem:
         self.screen_height = screen_height
         self.dialogue_box_height = 150
         self.current_text = ""
+        self.current_lines = None # Texto atual já quebrado em linhas (roteiro compilado), ou None
         self.current_character = None
+        # O texto é quebrado e renderizado uma vez (text_cache); a cada frame só as superfícies prontas são desenhadas
+        self.text_cache = text_cache
+        self.reveal_speed = DIALOGUE_REVEAL_SPEED
+        self.revealed_chars = 0
         
+    def box_rect(self):
+        return pygame.Rect(0, self.screen_height - self.dialogue_box_height, self.screen_width, self.dialogue_box_height)
+
     def draw_dialogue_box(self):
-        box_rect = pygame.Rect(0, self.screen_height - self.dialogue_box_height, self.screen_width, self.dialogue_box_height)
+        box_rect = self.box_rect()
         pygame.draw.rect(self.screen, DARK_GRAY, box_rect)
         pygame.draw.rect(self.screen, WHITE, box_rect, 3)
         
         if self.current_character:
-            name_surface = self.font.render(self.current_character.name, True, WHITE)
+            name_surface = self.text_cache.render(self.font, self.current_character.name, WHITE)
             self.screen.blit(name_surface, (20, self.screen_height - self.dialogue_box_height + 10))
         
         if self.current_text:
             text_y = self.screen_height - self.dialogue_box_height + 50
-            words = self.current_text.split()
-            lines = []
-            current_line = []
-            
-            for word in words:
-                test_line = ' '.join(current_line + [word])
-                if self.font.size(test_line)[0] < self.screen_width - 40:
-                    current_line.append(word)
-                else:
-                    if current_line:
-                        lines.append(' '.join(current_line))
-                        current_line = [word]
-                    else:
-                        lines.append(word)
-            
-            if current_line:
-                lines.append(' '.join(current_line))
-            
-            for i, line in enumerate(lines[:3]):
-                text_surface = self.font.render(line, True, WHITE)
-                self.screen.blit(text_surface, (20, text_y + i * 25))
+            visible_chars = self.revealed_chars if self.reveal_speed > 0 else None
+            self._current_layout().draw(self.screen, (20, text_y), 25, visible_chars)
+
+    def _current_layout(self):
+        return self.text_cache.layout(self.font, self.current_text, WHITE, self.screen_width - 40, max_lines=3,
+                                      lines=self.current_lines)
+
+    def wrap_lines(self, text):
+        # Mesma quebra de linhas da caixa de diálogo; usada para medir as falas ao compilar um roteiro
+        return wrap_text(self.font, text, self.screen_width - 40)[:3]
+
+    def update(self):
+        # Avança o efeito de máquina de escrever, uma vez por tick da simulação (sem efeito com reveal_speed 0)
+        if self.reveal_speed > 0 and self.current_text:
+            self.revealed_chars = min(self.revealed_chars + self.reveal_speed, self._current_layout().char_count)
+
+    def is_revealing(self):
+        return self.reveal_speed > 0 and bool(self.current_text) and self.revealed_chars < self._current_layout().char_count
+
+    def reveal_all(self):
+        if self.current_text:
+            self.revealed_chars = self._current_layout().char_count
     
-    def set_dialogue(self, character, text):
+    def set_dialogue(self, character, text, lines=None):
         self.current_character = character
         self.current_text = text
+        self.current_lines = lines
+        self.revealed_chars = 0
@@ -0,0 +1,92 @@
+import numpy as np
+
+
+class EntityStore:
+    # Estado por entidade (posição, tamanho, animação) em arrays NumPy compactos, um índice por entidade.
+    # Character é só uma "alça" para um índice daqui; as operações que rodam para todos os NPCs a cada
+    # tick (animação, proximidade, snapshot para interpolação) são feitas de uma vez sobre os arrays.
+    def __init__(self, capacity=64):
+        self.count = 0
+        self.x = np.zeros(capacity, dtype=np.int64)
+        self.y = np.zeros(capacity, dtype=np.int64)
+        self.previous_x = np.zeros(capacity, dtype=np.int64) # Posição no tick anterior (interpolação do desenho)
+        self.previous_y = np.zeros(capacity, dtype=np.int64)
+        self.width = np.zeros(capacity, dtype=np.int32)
+        self.height = np.zeros(capacity, dtype=np.int32)
+        self.animation_timer = np.zeros(capacity, dtype=np.int32)
+        self.animation_speed = np.zeros(capacity, dtype=np.int32)
+        self.frame_index = np.zeros(capacity, dtype=np.int32)
+        self.frame_count = np.zeros(capacity, dtype=np.int32) # Frames da animação na direção atual
+        self.moving = np.zeros(capacity, dtype=bool)
+        # Entidades cuja posição mudou desde o último take_moved() (para atualizar índices espaciais).
+        # Quem escreve direto em x/y precisa chamar mark_moved; os setters de Character já fazem isso.
+        self.moved = set()
+
+    _fields = ("x", "y", "previous_x", "previous_y", "width", "height", "animation_timer", "animation_speed",
+               "frame_index", "frame_count", "moving")
+
+    def _grow(self):
+        capacity = len(self.x) * 2
+        for field in self._fields:
+            old = getattr(self, field)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, field, new)
+
+    def add(self, x, y, width, height, animation_speed, frame_count):
+        if self.count == len(self.x):
+            self._grow()
+        index = self.count
+        self.count += 1
+        self.x[index] = self.previous_x[index] = x
+        self.y[index] = self.previous_y[index] = y
+        self.width[index] = width
+        self.height[index] = height
+        self.animation_speed[index] = animation_speed
+        self.frame_count[index] = frame_count
+        return index
+
+    def mark_moved(self, index):
+        self.moved.add(index)
+
+    def take_moved(self):
+        moved = self.moved
+        self.moved = set()
+        return moved
+
+    def snapshot(self):
+        # Posições atuais viram as do tick anterior (antes de cada tick de simulação)
+        self.previous_x[:self.count] = self.x[:self.count]
+        self.previous_y[:self.count] = self.y[:self.count]
+
+    def tick_animation(self, indices):
+        # Um tick de animação para as entidades indicadas, mesma regra de Character.update_animation:
+        # só anima quem está se movendo e tem mais de um frame; os outros voltam ao frame 0
+        animating = self.moving[indices] & (self.frame_count[indices] > 1)
+        timer = np.where(animating, self.animation_timer[indices] + 1, 0)
+        wrapped = animating & (timer >= self.animation_speed[indices])
+        timer[wrapped] = 0
+        frame = np.where(animating, self.frame_index[indices], 0)
+        frame[wrapped] = (frame[wrapped] + 1) % self.frame_count[indices][wrapped]
+        self.animation_timer[indices] = timer
+        self.frame_index[indices] = frame
+
+    def overlapping(self, rect, indices):
+        # Posições (dentro de 'indices') das entidades cujo retângulo do sprite cruza 'rect',
+        # em ordem crescente; mesma regra de pygame.Rect.colliderect
+        x = self.x[indices]
+        y = self.y[indices]
+        width = self.width[indices]
+        height = self.height[indices]
+        hits = ((x < rect.right) & (x + width > rect.left) & (y < rect.bottom) & (y + height > rect.top)
+                & (width > 0) & (height > 0))
+        return np.flatnonzero(hits)
+
+    def render_positions(self, indices, alpha, camera_offset):
+        # Posições de desenho na tela, interpoladas entre o tick anterior e o atual; somar o deslocamento
+        # da câmera (também interpolado) antes de arredondar evita tremida entre o jogador e o mapa
+        previous_x = self.previous_x[indices]
+        previous_y = self.previous_y[indices]
+        screen_x = np.rint(previous_x + (self.x[indices] - previous_x) * alpha + camera_offset[0]).astype(np.int64)
+        screen_y = np.rint(previous_y + (self.y[indices] - previous_y) * alpha + camera_offset[1]).astype(np.int64)
+        return screen_x, screen_y
@@ -1,111 +1,107 @@
+import numpy as np
 import pygame
 import sys
-import os
+import time
 
+from assets import asset_manager
+from background_renderer import BackgroundRenderer
 from camera import Camera
-from character import Character
+from chunk_streamer import ChunkStreamer
+from dialogue_graph import DialogueScriptError
 from dialogue_system import DialogueSystem
-from story import Story
+from entities import EntityStore
+from loading_screen import open_window, draw_loading_screen
+from map_definitions import BLOCKING_TILE_KEYS, WORLD_MANIFEST
+from map_format import definition_hash, load_compiled_map, ChunkedMap
+from map_preloader import MapPreloader
+from npc_movement import NpcMovement
+from pathfinding import NavGrid, PathfindingService
+from profiler import profiler, ProfilerOverlay, StartupTimer
+from scroll_buffer import ScrollBuffer
+from spatial_hash import SpatialHash
+from sprite_cache import sprite_cache
+from text_cache import text_cache
+from timestep import FixedTimestep
+from tile_grid import TileGrid
+from tile_layer import TileLayerRenderer
+from world import WorldManifest, WorldManifestError
 # Import global MAP_WIDTH, MAP_HEIGHT as fallbacks or for initial setup if needed
-from config import WIDTH, HEIGHT, FPS, MAP_WIDTH as DEFAULT_MAP_WIDTH, MAP_HEIGHT as DEFAULT_MAP_HEIGHT, BLACK, BLUE, WHITE, DARK_GRAY
+from config import WIDTH, HEIGHT, FPS, MAP_WIDTH as DEFAULT_MAP_WIDTH, MAP_HEIGHT as DEFAULT_MAP_HEIGHT, BLACK, WHITE, DARK_GRAY, PORTAL_PRELOAD_RADIUS, TILE_SIZE, DIALOGUE_DIRTY_RECTS, SIM_RATE, MAX_SIM_STEPS_PER_FRAME, SPATIAL_HASH_CELL_SIZE, CULL_MARGIN, SCROLL_BLIT_BACKGROUND, PROFILE_STARTUP, LOADING_FRAME_BUDGET_MS
 
 
 class Game:
-    def __init__(self):
-        pygame.init()
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-        pygame.display.set_caption("Vult Game")
+    def __init__(self, profile_startup=PROFILE_STARTUP, startup_timer=None):
+        # Tempo das etapas da inicialização; main.py passa um timer iniciado antes dos imports
+        self.startup_timer = startup_timer if startup_timer is not None else StartupTimer()
+        self.profile_startup = profile_startup
+        self.screen = open_window()
         self.clock = pygame.time.Clock()
+        self.fps_cap = FPS # 0 desliga o limite de FPS (usado pelo benchmark)
+        # update() roda em ticks de duração fixa (SIM_RATE por segundo), desacoplado da taxa de desenho;
+        # draw() interpola as posições entre os dois últimos ticks usando render_alpha
+        self.timestep = FixedTimestep(SIM_RATE, MAX_SIM_STEPS_PER_FRAME)
+        self.render_alpha = 1.0
+        # Fontes do estado do teclado e dos eventos; o benchmark troca por uma entrada roteirizada e
+        # o InputRecorder/InputReplay (input_log.py) por gravação ou reprodução de um log de entrada
+        self.key_state = pygame.key.get_pressed
+        self.event_source = pygame.event.get
         self.running = True
-        self.game_state = "map"
+        # "loading" até terminar as etapas de carga (ver _loading_steps); depois "map" ou "dialogue"
+        self.game_state = "loading"
         
         self.font = pygame.font.Font(None, 24)
         self.dialogue_system = DialogueSystem(self.screen, self.font, WIDTH, HEIGHT)
+        self.startup_timer.mark("display")
         
-        player_sprite_paths = {
-            "frente": os.path.join("src", "assets", "sprite_knight_frente.png"),
-            "costas": os.path.join("src", "assets", "sprite_knight_costas.png"),
-            "esquerda": os.path.join("src", "assets", "sprite_knight_esquerda.png"),
-            "direita": os.path.join("src", "assets", "sprite_knight_direita.png"),
-        }
-        npc_sprite_paths = {
-            "frente": os.path.join("src", "assets", "sprite_knight_frente.png")
-        }
-
-        # Player starting position will be relative to the first map's dimensions
-        # We'll set it properly after loading the first map's info.
-        self.player = Character("Cavaleiro", BLUE, map_x=0, map_y=0, sprite_paths=player_sprite_paths)
-        
-        self.npcs = {
-            "blacksmith": Character("Ferreiro", (100,100,100), map_x=100, map_y=100, sprite_paths=npc_sprite_paths),
-            "merchant": Character("Mercador", (0,100,0), map_x=DEFAULT_MAP_WIDTH - 250, map_y=DEFAULT_MAP_HEIGHT -250, sprite_paths=npc_sprite_paths) # Initial pos, might need adjustment per map
-        }
-        self.characters = {"protagonist": self.player}
-        self.characters.update(self.npcs)
-
-        blacksmith_story = Story()
-        blacksmith_story.scenes = [
-            {"character": "blacksmith", "text": "Olá, nobre cavaleiro! Precisa de uma espada afiada?"},
-            {"character": "blacksmith", "text": "Minhas forjas estão sempre quentes!"}
-        ]
-        self.npcs["blacksmith"].story = blacksmith_story
-
-        merchant_story = Story()
-        merchant_story.scenes = [
-            {"character": "merchant", "text": "Mercadorias raras, direto de terras distantes!"},
-            {"character": "merchant", "text": "Tenho poções e artefatos, se tiveres ouro."}
-        ]
-        self.npcs["merchant"].story = merchant_story
-        
+        # Mapas, portais, tiles, jogador, NPCs e diálogos vêm do manifesto do mundo (src/assets/world.json);
+        # na abertura só o índice é lido, cada mapa e seus NPCs são montados na primeira visita
+        self.world = WorldManifest(WORLD_MANIFEST)
+
+        # Posição e animação de todos os personagens ficam em arrays compartilhados (animação e proximidade em lote)
+        self.entities = EntityStore()
+        self.player = None # Criado na etapa de carga "characters"
+        self.characters = {}
+
+        self.npcs = {}
+        self.npc_list = [] # NPCs na ordem de self.npcs
+        self._npc_indices = None # Índices dos NPCs no EntityStore, recalculados quando a lista muda
+        self.npc_positions = {} # Índice no EntityStore -> posição em npc_list
+        self.npc_hash = SpatialHash(SPATIAL_HASH_CELL_SIZE) # Broad phase da proximidade jogador/NPC (ids = posição em npc_list)
+        # NPCs sem mapa no manifesto aparecem em todos os mapas; os de um mapa são criados na primeira visita
+        self.global_npcs = {}
+        self.map_npcs = {} # mapa -> {chave: NPC}
+        # NPCs que andam (entrada "behavior" do manifesto): caminhos do PathfindingService, com orçamento
+        # por frame, e movimento em lote pelo NpcMovement. Os agentes sobrevivem às trocas de mapa.
+        self.pathfinder = PathfindingService()
+        self.npc_movement = NpcMovement(self.entities, self.pathfinder)
+        self.npc_agents = {} # chave do NPC -> NpcAgent
+
         self.current_dialogue_story = None
-        self.tile_size = 100 # Define tile_size before map_definitions if used in target_player_pos calculations
-
-        self.map_definitions = {
-            "mundo_principal": {
-                "layout_file": os.path.join("src", "assets", "map_layout.map"),
-                "background_image": os.path.join("src", "assets", "map_image.png"),
-                "pixel_width": 2000, 
-                "pixel_height": 2000,
-                "portals": {
-                    (9, 11): {"target_map_key": "caverna_secreta", "target_player_pos": (150, 600)}, 
-                    (10, 11): {"target_map_key": "caverna_secreta", "target_player_pos": (150, 600)},
-                    (9, 12): {"target_map_key": "caverna_secreta", "target_player_pos": (150, 600)},
-                    (10, 12): {"target_map_key": "caverna_secreta", "target_player_pos": (150, 600)},
-                }
-            },
-            "caverna_secreta": {
-                "layout_file": os.path.join("src", "assets", "map_caverna.map"),
-                "background_image": os.path.join("src", "assets", "caverna_bg_animated.png"), # Updated
-                "background_animation_frames": 4, # Added
-                "pixel_width": 1000,  # Largura do padrão original da caverna
-                "pixel_height": 342, # Altura da caverna
-                "repeat_x": 3, # Repetir o padrão da caverna 3 vezes horizontalmente
-                "portals": {
-                    # Portal na primeira instância do padrão
-                    (5, 3): {"target_map_key": "mundo_principal", "target_player_pos": (9 * self.tile_size + self.tile_size // 2, 13 * self.tile_size)},
-                    # Se houver um portal de saída em cada repetição, eles podem ser definidos dinamicamente ou
-                    # a lógica de detecção de portal precisará considerar repeat_x.
-                    # Por simplicidade, vamos assumir que a lógica de detecção de portal lidará com isso.
-                }
-            }
-        }
-        self.current_map_key = "mundo_principal"
+        self.dialogue_flags = {} # Flags ligadas pelos roteiros de diálogo (compartilhadas por todos os NPCs)
+        self.tile_size = TILE_SIZE # Define tile_size before map_definitions if used in target_player_pos calculations
+
+        self.map_definitions = self.world.map_definitions
+        self.current_map_key = self.world.start_map
         self.current_map_info = self.map_definitions[self.current_map_key]
         
         # Calcular a largura efetiva do mapa atual (considerando a repetição)
         self.current_map_effective_pixel_width = self.current_map_info.get("pixel_width", DEFAULT_MAP_WIDTH) * self.current_map_info.get("repeat_x", 1)
         self.current_map_pixel_height = self.current_map_info.get("pixel_height", DEFAULT_MAP_HEIGHT)
 
-
-        # Set initial player position based on the first map
-        # initial_map_pixel_width = self.current_map_info["pixel_width"] # Use effective width for camera
-        self.player.map_x = self.current_map_effective_pixel_width // 2
-        self.player.map_y = self.current_map_pixel_height - self.player.map_sprite_height
-        
-        # Initialize camera with the dimensions of the first loaded map
+        # Initialize camera with the dimensions of the first loaded map (centrada no jogador quando ele existir)
         self.camera = Camera(WIDTH, HEIGHT, self.current_map_effective_pixel_width, self.current_map_pixel_height)
+        # Quanto a câmera desenhada andou desde o frame anterior (dx, dy); None quando não há frame anterior
+        # do mesmo mapa para aproveitar. Renderers podem usar para rolar os pixels em vez de redesenhar tudo.
+        self.render_scroll = None
+        self.last_render_camera = None # (mapa, canto da câmera) do último frame desenhado
         self.dialogue_exit_active = False
 
+        # Renderização por regiões sujas no diálogo: snapshot do mapa parado + regiões desenhadas no último frame
+        self.dialogue_dirty_rects = DIALOGUE_DIRTY_RECTS
+        self.dialogue_backdrop = None
+        self.dialogue_backdrop_key = None
+        self.dialogue_regions = {}
+
         # Background animation attributes
         self.background_animation_frames_surfaces = []
         self.current_background_animation_frame_index = 0
@@ -114,92 +110,271 @@ class Game:
 
         # Portal activation and background override attributes
         self.portal_is_activating = False
-        self.portal_activation_delay = FPS * 1  # 1-second delay (FPS is from config)
+        self.portal_activation_delay = SIM_RATE * 1  # 1-second delay, em ticks de simulação
         self.portal_activation_timer = 0
         self.portal_target_info = None 
+        # Portais do mapa atual, (coluna, linha) no padrão -> destino: do .vmap quando o mapa veio dele,
+        # senão do manifesto (map_info["portals"]); trocados junto com o mapa em _apply_map_bundle
+        self.current_map_portals = {}
         self.raw_portal_open_image = None # Will hold the unscaled porta_aberta.png
         self.scaled_portal_open_background_override = None # porta_aberta.png scaled to current map pattern size
 
-        self.tiles = {
-            "g0": pygame.image.load(os.path.join("src", "assets", "grama_tile_0.png")).convert_alpha(),
-            "g90": pygame.image.load(os.path.join("src", "assets", "grama_tile_90.png")).convert_alpha(),
-            "g180": pygame.image.load(os.path.join("src", "assets", "grama_tile_180.png")).convert_alpha(),
-            "g270": pygame.image.load(os.path.join("src", "assets", "grama_tile_270.png")).convert_alpha(),
-            "s": pygame.image.load(os.path.join("src", "assets", "areia.png")).convert_alpha(),
-            "p": pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
-        }
+        # Todas as imagens passam pelo asset_manager: cada arquivo é lido do disco uma vez só
+        # e as variantes escaladas ficam em cache (escopo global para tiles e sprites)
+        self.assets = asset_manager
+        self.tiles = {} # Preenchido na etapa de carga "tiles"
+        self.portal_open_image_path = self.world.portal_open_image
+
+        self.tile_layer = TileLayerRenderer(self.tile_size)
+        self.background_renderer = BackgroundRenderer()
+        self.scroll_buffer = ScrollBuffer() if SCROLL_BLIT_BACKGROUND else None
+
+        # Grade do mapa atual (ids dos tiles + máscara de colisão), cobre todas as repetições do padrão
+        self.tile_grid = None
+        self.blocking_tile_keys = list(BLOCKING_TILE_KEYS)
+        self.portal_open_background_pattern = None # Fundo do portal aberto, já escalado para o mapa atual
+        # Mundo grande em streaming (mapa com "chunks" no manifesto): é também o self.tile_grid do mapa
+        self.world_streamer = None
+        # Slot de salvamento (save_state.SaveFile, ligado por main.py --save): F5 salva, F9 carrega, autosave
+        self.save_file = None
+        # F9 desligado durante uma gravação de entrada (input_log.InputRecorder): o replay roda sem slot
+        # de salvamento, então um save carregado no meio da gravação não se repetiria
+        self.save_loading_enabled = True
+        
+        # Instrumentação: F3 mostra o overlay do profiler, F4 exporta as medições em JSON/CSV
+        self.profiler = profiler
+        self.profiler_overlay = ProfilerOverlay(self.profiler, self.font)
+        self.profiler.register_cache("assets", self.assets.stats)
+        self.profiler.register_cache("sprites", sprite_cache.stats)
+        self.profiler.register_cache("tile_chunks", self.tile_layer.cache.stats)
+        self.profiler.register_cache("text", text_cache.stats)
+        self.profiler.register_cache("paths", self.pathfinder.stats)
+        self.profiler.register_cache("world_chunks", self.world_chunk_stats)
+
+        # Prepara os mapas de destino dos portais em segundo plano
+        self.map_preloader = MapPreloader(self.build_map_bundle)
+        self.startup_timer.mark("manifest")
+
+        # A janela aparece já com a tela de carregamento; os assets são carregados nos frames seguintes
+        # (até LOADING_FRAME_BUDGET_MS por frame, ver run_frame) ou de uma vez por finish_loading()
+        self.loading_steps = self._loading_steps()
+        self.loading_done = 0
+        self.startup_report_pending = False # Relatório de inicialização sai depois do primeiro frame do mapa
+        self.draw_loading()
+        self.startup_timer.mark("first_frame")
+
+    def _loading_steps(self):
+        # (etapa, função, pronto) na ordem de carga; a etapa dá nome ao tempo no relatório de inicialização.
+        # 'pronto' (opcional) diz se a etapa já pode rodar sem esperar trabalho em segundo plano.
+        steps = [("tiles", lambda tile_key=tile_key, path=path: self._load_tile(tile_key, path), None)
+                 for tile_key, path in self.world.tiles.items()]
+        steps.append(("tiles", self._load_portal_open_image, None))
+        steps.append(("characters", self._load_player, None))
+        steps.extend(("characters", lambda npc_key=npc_key: self._load_global_npc(npc_key), None) for npc_key in self.world.npc_keys())
+        steps.append(("map", self._request_start_map, None))
+        steps.append(("map", self._load_start_map, lambda: self.map_preloader.is_ready(self.current_map_key)))
+        return steps
+
+    def _load_tile(self, tile_key, path):
+        self.tiles[tile_key] = self.assets.scaled(path, (self.tile_size, self.tile_size))
+
+    def _load_portal_open_image(self):
+        self.tiles["p"] = pygame.Surface((self.tile_size, self.tile_size), pygame.SRCALPHA)
         self.tiles["p"].fill((0,0,0,0))
 
         # Load the raw portal open image (unscaled)
         try:
-            portal_open_image_path = os.path.join("src", "assets", "porta_aberta.png")
-            self.raw_portal_open_image = pygame.image.load(portal_open_image_path).convert_alpha()
+            if self.portal_open_image_path:
+                self.raw_portal_open_image = self.assets.image(self.portal_open_image_path)
         except pygame.error as e:
-            print(f"Error loading raw portal open image {portal_open_image_path}: {e}.")
+            print(f"Error loading raw portal open image {self.portal_open_image_path}: {e}.")
             self.raw_portal_open_image = None 
         except FileNotFoundError:
-            print(f"Raw portal open image file not found at {portal_open_image_path}.")
+            print(f"Raw portal open image file not found at {self.portal_open_image_path}.")
             self.raw_portal_open_image = None
 
-        for key in self.tiles:
-            self.tiles[key] = pygame.transform.scale(self.tiles[key], (self.tile_size, self.tile_size))
+    def _load_player(self):
+        self.player = self.world.build_player(self.entities)
+        self.characters["protagonist"] = self.player
 
-        self.map_data = []
-        self.collision_map_rects = []
-        self.blocking_tile_keys = ['x', 'g0', 'g90', 'g180', 'g270'] 
-        
-        self._load_current_map_assets()
+    def _load_global_npc(self, npc_key):
+        self.global_npcs[npc_key] = self._build_npc(npc_key)
+
+    def _build_npc(self, npc_key):
+        npc = self.world.build_npc(npc_key, self.entities)
+        agent = self.world.build_npc_agent(npc_key, npc)
+        if agent is not None:
+            self.npc_agents[npc_key] = agent
+        return npc
 
-    def _load_current_map_assets(self):
+    def _request_start_map(self):
+        # Set initial player position based on the first map
+        self.player.map_x = self.current_map_effective_pixel_width // 2
+        self.player.map_y = self.current_map_pixel_height - self.player.map_sprite_height
+        # O mapa inicial (fundo, .map, chunks em volta do jogador) é preparado na thread do MapPreloader
+        # enquanto a tela de carregamento continua respondendo
+        self.map_preloader.request(self.current_map_key, (self.player.map_x, self.player.map_y))
+
+    def _load_start_map(self):
+        bundle = self.map_preloader.take(self.current_map_key) # Espera a thread, se ainda não terminou
+        if bundle is None:
+            bundle = self.build_map_bundle(self.current_map_key)
+        self.activate_map_npcs(self.current_map_key)
+        self.camera.snap_to(self.player)
+        self._apply_map_bundle(bundle)
+
+    @property
+    def loading(self):
+        return self.loading_done < len(self.loading_steps)
+
+    def advance_loading(self, wait=False):
+        # Roda a próxima etapa de carga e retorna True; retorna False se ela ainda depende de trabalho
+        # em segundo plano (com wait=True espera por ele). Depois da última etapa o jogo começa no mapa.
+        phase, load, ready = self.loading_steps[self.loading_done]
+        if ready is not None and not wait and not ready():
+            return False
+        load()
+        self.loading_done += 1
+        self.startup_timer.mark(phase)
+        if not self.loading:
+            self.game_state = "map"
+            self.snapshot_positions()
+            self.timestep.reset() # O tempo gasto carregando não vira ticks atrasados
+            self.startup_report_pending = self.profile_startup
+        return True
+
+    def finish_loading(self):
+        # Carrega tudo o que falta de uma vez (benchmark, ferramentas, testes)
+        while self.loading:
+            self.advance_loading(wait=True)
+
+    def draw_loading(self):
+        draw_loading_screen(self.screen, self.font, self.loading_done / len(self.loading_steps))
+
+    def build_map_bundle(self, map_key, player_pos=None):
+        # Faz todo o trabalho pesado de carregar um mapa (imagens, .map, colisão, chunks de tiles)
+        # e devolve um dicionário pronto para _apply_map_bundle. Não altera o estado do jogo,
+        # então pode rodar na thread do MapPreloader enquanto o jogo continua.
+        map_info = self.map_definitions[map_key]
+        if "chunk_file" in map_info:
+            return self._build_streamed_map_bundle(map_key, map_info, player_pos)
         # Largura do padrão original do mapa
-        base_map_pixel_width = self.current_map_info["pixel_width"]
+        base_map_pixel_width = map_info["pixel_width"]
         # Altura do mapa
-        current_map_pixel_height = self.current_map_info["pixel_height"]
-        # Fator de repetição
-        repeat_x = self.current_map_info.get("repeat_x", 1)
-        # Largura efetiva total do mapa
-        self.current_map_effective_pixel_width = base_map_pixel_width * repeat_x
+        map_pixel_height = map_info["pixel_height"]
 
-        # Reset background animation frames
-        self.background_animation_frames_surfaces = []
-        self.current_background_animation_frame_index = 0
-        self.background_animation_timer = 0
-
-        num_anim_frames = self.current_map_info.get("background_animation_frames")
+        bundle = {"map_key": map_key, "background_animation_frames": [], "portal_open_background": None}
+        # Usa o .vmap compilado (map_compiler.py) quando existir e estiver atualizado; senão lê o .map em texto
+        compiled_map = load_compiled_map(map_info["layout_file"],
+                                         definition_hash(map_info, self.blocking_tile_keys, self.tile_size))
+        bundle["portals"] = compiled_map.portals if compiled_map is not None else map_info.get("portals", {})
+        num_anim_frames = map_info.get("background_animation_frames")
 
         try:
             if num_anim_frames and num_anim_frames > 0:
-                spritesheet = pygame.image.load(self.current_map_info["background_image"]).convert_alpha()
-                spritesheet_width = spritesheet.get_width()
-                spritesheet_height = spritesheet.get_height()
-                frame_width = spritesheet_width // num_anim_frames
-
-                for i in range(num_anim_frames):
-                    frame_surface = spritesheet.subsurface(pygame.Rect(i * frame_width, 0, frame_width, spritesheet_height))
-                    scaled_frame = pygame.transform.scale(frame_surface, (base_map_pixel_width, current_map_pixel_height))
-                    self.background_animation_frames_surfaces.append(scaled_frame)
+                # Frames da animação já escalados para o tamanho do padrão; ficam no escopo do mapa
+                bundle["background_animation_frames"] = list(self.assets.strip(
+                    map_info["background_image"], num_anim_frames,
+                    size=(base_map_pixel_width, map_pixel_height), scope=map_key))
                 
-                if self.background_animation_frames_surfaces:
-                    self.current_background_image_pattern = self.background_animation_frames_surfaces[0] # Set initial pattern
+                if bundle["background_animation_frames"]:
+                    bundle["background_pattern"] = bundle["background_animation_frames"][0] # Set initial pattern
                 else: # Fallback if slicing failed
-                    self.current_background_image_pattern = pygame.Surface((base_map_pixel_width, current_map_pixel_height))
-                    self.current_background_image_pattern.fill(BLACK)
+                    bundle["background_pattern"] = pygame.Surface((base_map_pixel_width, map_pixel_height))
+                    bundle["background_pattern"].fill(BLACK)
 
             else: # Static background
-                self.current_background_image_pattern = pygame.image.load(self.current_map_info["background_image"]).convert()
-                self.current_background_image_pattern = pygame.transform.scale(self.current_background_image_pattern, (base_map_pixel_width, current_map_pixel_height))
+                bundle["background_pattern"] = self.assets.scaled(
+                    map_info["background_image"], (base_map_pixel_width, map_pixel_height),
+                    alpha=False, scope=map_key)
         
         except pygame.error as e:
-            print(f"Error loading background for {self.current_map_key}: {e}")
-            self.current_background_image_pattern = pygame.Surface((base_map_pixel_width, current_map_pixel_height))
-            self.current_background_image_pattern.fill(BLACK)
-            self.background_animation_frames_surfaces = [] # Ensure it's cleared on error
-
-        self.map_data = self.load_map_data(self.current_map_info["layout_file"])
-        self._create_collision_rects()
-
-    def switch_map(self, new_map_key, player_start_pos):
+            print(f"Error loading background for {map_key}: {e}")
+            bundle["background_pattern"] = pygame.Surface((base_map_pixel_width, map_pixel_height))
+            bundle["background_pattern"].fill(BLACK)
+            bundle["background_animation_frames"] = [] # Ensure it's cleared on error
+
+        # Fundo do portal aberto já escalado para o padrão deste mapa, para não escalar no frame em que o portal abre
+        if bundle["portals"] and self.raw_portal_open_image:
+            bundle["portal_open_background"] = self.assets.scaled(
+                self.portal_open_image_path, (base_map_pixel_width, map_pixel_height), scope=map_key)
+
+        repeat_x = map_info.get("repeat_x", 1)
+        if compiled_map is not None:
+            bundle["tile_grid"] = TileGrid.from_compiled(compiled_map, base_map_pixel_width, repeat_x)
+        else:
+            bundle["tile_grid"] = TileGrid.from_rows(self.load_map_data(map_info["layout_file"]), self.blocking_tile_keys,
+                                                     self.tile_size, base_map_pixel_width, repeat_x)
+        # Grade de navegação dos NPCs (células livres em todas as repetições do padrão)
+        bundle["nav_grid"] = NavGrid.from_tile_grid(bundle["tile_grid"], base_map_pixel_width * repeat_x, map_pixel_height)
+
+        # Pré-renderiza os chunks de tiles em volta da posição inicial do jogador
+        bundle["tile_chunks"] = {}
+        if player_pos is not None:
+            view_rect = pygame.Rect(0, 0, WIDTH, HEIGHT)
+            view_rect.center = player_pos
+            tile_layer = self.tile_layer.make_layer(bundle["tile_grid"], self.tiles, base_map_pixel_width)
+            bundle["tile_chunks"] = tile_layer.bake_view(view_rect.inflate(WIDTH, HEIGHT))
+        return bundle
+
+    def _build_streamed_map_bundle(self, map_key, map_info, player_pos):
+        # Mundo em chunks: nada do tamanho do mapa é carregado, só o padrão pequeno do fundo e os chunks
+        # em volta do jogador. O ChunkStreamer faz o papel do TileGrid (colisão, portais) e desenha os tiles.
+        bundle = {"map_key": map_key, "background_animation_frames": [], "portal_open_background": None,
+                  "background_pattern": None, "nav_grid": None, "tile_chunks": {}, "portals": map_info.get("portals", {})}
+        if map_info.get("background_image"):
+            try:
+                bundle["background_pattern"] = self.assets.scaled(
+                    map_info["background_image"], map_info.get("background_size", (self.tile_size, self.tile_size)),
+                    alpha=False, scope=map_key)
+            except pygame.error as e:
+                print(f"Error loading background for {map_key}: {e}")
+        streamer = ChunkStreamer(ChunkedMap(map_info["chunk_file"]), self.tiles)
+        if player_pos is not None:
+            streamer.load_around(*player_pos)
+        bundle["tile_grid"] = streamer
+        return bundle
+
+    def _apply_map_bundle(self, bundle):
+        # Parte barata da carga de mapa: só troca referências, roda na thread principal
+        self.background_animation_frames_surfaces = bundle["background_animation_frames"]
+        self.current_background_animation_frame_index = 0
+        self.background_animation_timer = 0
+        self.current_background_image_pattern = bundle["background_pattern"]
+        self.portal_open_background_pattern = bundle["portal_open_background"]
+        # Bundles montados fora do build_map_bundle (ex: benchmark) usam os portais do manifesto
+        self.current_map_portals = bundle.get("portals", self.map_definitions[bundle["map_key"]].get("portals", {}))
+
+        previous_grid = self.tile_grid
+        self.tile_grid = bundle["tile_grid"]
+        if isinstance(previous_grid, TileGrid) and previous_grid is not self.tile_grid:
+            previous_grid.close() # Fecha o .vmap do mapa anterior
+        if self.world_streamer is not None and self.world_streamer is not self.tile_grid:
+            self.world_streamer.close() # Para a thread e fecha o arquivo do mundo anterior
+        self.world_streamer = None
+        if isinstance(self.tile_grid, ChunkStreamer):
+            self.world_streamer = self.tile_grid
+            self.tile_layer.clear_map()
+            # Sem grade de navegação para o mundo inteiro: os NPCs com comportamento ficam parados
+            self.pathfinder.set_map(bundle["map_key"], None)
+            return
+        map_info = self.map_definitions[bundle["map_key"]]
+        self.tile_layer.set_map(bundle["map_key"], self.tile_grid, self.tiles, map_info["pixel_width"], bundle["tile_chunks"])
+        # Bundles montados fora do build_map_bundle (ex: benchmark) podem vir sem a grade de navegação
+        nav_grid = bundle.get("nav_grid")
+        if nav_grid is None:
+            nav_grid = NavGrid.from_tile_grid(self.tile_grid, map_info["pixel_width"] * map_info.get("repeat_x", 1), map_info["pixel_height"])
+        self.pathfinder.set_map(bundle["map_key"], nav_grid)
+
+    def switch_map(self, new_map_key, player_start_pos, bundle=None):
         print(f"Switching map to {new_map_key}, player to {player_start_pos}")
+        # Usa o bundle recebido ou o mapa já preparado em segundo plano; senão carrega agora (síncrono)
+        if bundle is None:
+            bundle = self.map_preloader.take(new_map_key)
+        if bundle is None:
+            bundle = self.build_map_bundle(new_map_key, player_start_pos)
+
+        previous_map_key = self.current_map_key
         self.current_map_key = new_map_key
         self.current_map_info = self.map_definitions[self.current_map_key]
         
@@ -209,31 +384,114 @@ class Game:
         repeat_x = self.current_map_info.get("repeat_x", 1)
         self.current_map_effective_pixel_width = base_map_pixel_width * repeat_x
 
-        self._load_current_map_assets() 
+        self._apply_map_bundle(bundle)
+        self.activate_map_npcs(new_map_key)
+        # Descarrega os assets do mapa anterior que nenhum outro escopo está usando
+        if previous_map_key != new_map_key:
+            # Os NPCs do mapa anterior (guardados para a próxima visita) soltam os sprites do escopo dele
+            for npc in self.map_npcs.get(previous_map_key, {}).values():
+                npc.release_sprites()
+            self.assets.release_scope(previous_map_key)
         
         self.player.map_x, self.player.map_y = player_start_pos
         
         self.camera.map_width = self.current_map_effective_pixel_width
         self.camera.map_height = self.current_map_pixel_height
-        self.camera.update(self.player)
-
-    def _create_collision_rects(self):
-        self.collision_map_rects = []
-        base_map_pixel_width = self.current_map_info["pixel_width"] # Largura do padrão
-        repeat_x = self.current_map_info.get("repeat_x", 1)
-
-        for i in range(repeat_x): # Para cada repetição do padrão
-            offset_x = i * base_map_pixel_width
-            for row_index, row_data in enumerate(self.map_data):
-                for col_index, tile_key in enumerate(row_data):
-                    if tile_key in self.blocking_tile_keys:
-                        rect = pygame.Rect(
-                            col_index * self.tile_size + offset_x, 
-                            row_index * self.tile_size, 
-                            self.tile_size, 
-                            self.tile_size
-                        )
-                        self.collision_map_rects.append(rect)
+        self.camera.snap_to(self.player)
+        # Teleporte: não interpola entre a posição no mapa anterior e a nova
+        self.snapshot_positions()
+
+    def load_map_npcs(self, map_key):
+        # NPCs do mapa, criados a partir do manifesto na primeira chamada (None = NPCs de todos os mapas)
+        if map_key is None:
+            return self.global_npcs
+        if map_key not in self.map_npcs:
+            self.map_npcs[map_key] = {key: self._build_npc(key) for key in self.world.npc_keys(map_key)}
+        return self.map_npcs[map_key]
+
+    def activate_map_npcs(self, map_key):
+        # NPCs ativos = os de todos os mapas + os deste mapa (criados a partir do manifesto na primeira visita)
+        self.load_map_npcs(map_key)
+        self.npcs = {}
+        self.npc_list = []
+        self.npc_positions = {}
+        self._npc_indices = None
+        self.npc_hash.clear()
+        self.npc_movement.clear(self.current_map_effective_pixel_width, self.current_map_pixel_height)
+        for npcs in (self.global_npcs, self.map_npcs[map_key]):
+            for key, npc in npcs.items():
+                npc.load_sprites() # Sprites soltos quando o mapa foi descarregado numa visita anterior
+                self.add_npc(key, npc)
+
+    def add_npc(self, key, npc, agent=None):
+        # O NPC precisa estar no EntityStore do jogo para entrar nas operações em lote.
+        # 'agent' (npc_movement.py) faz o NPC andar; os do manifesto já vêm de _build_npc.
+        if npc.store is not self.entities:
+            raise ValueError(f"NPC {key} must be created with entity_store=game.entities")
+        # NPCs ficam de frente e animam se o sprite de 'frente' tiver mais de um frame
+        npc.current_direction = "frente"
+        npc.is_moving = len(npc.directional_frames.get("frente", [])) > 1
+        if key not in self.npcs:
+            position = len(self.npc_list)
+            self.npc_list.append(npc)
+        else:
+            position = self.npc_positions.pop(self.npcs[key].index)
+            self.npc_list[position] = npc
+            if key in self.npc_agents:
+                self.npc_movement.remove(self.npc_agents[key])
+        self.npc_positions[npc.index] = position
+        self.npcs[key] = npc
+        self.characters[key] = npc
+        self._npc_indices = None
+        self.npc_hash.update(position, npc.map_x, npc.map_y, npc.map_sprite_width, npc.map_sprite_height)
+        if agent is not None:
+            self.npc_agents[key] = agent
+        agent = self.npc_agents.get(key)
+        if agent is not None and agent.npc is npc:
+            self.npc_movement.add(agent)
+
+    @property
+    def npc_indices(self):
+        if self._npc_indices is None:
+            self._npc_indices = np.array([npc.index for npc in self.npc_list], dtype=np.intp)
+        return self._npc_indices
+
+    def sync_npc_hash(self):
+        # Leva para o spatial hash só os NPCs que se moveram desde a última chamada
+        entities = self.entities
+        npc_positions = self.npc_positions
+        moved = [entity_index for entity_index in entities.take_moved() if entity_index in npc_positions]
+        if not moved:
+            return
+        # NPCs que andam (npc_movement.py) se movem às centenas por tick: posições lidas em lote
+        indices = np.array(moved, dtype=np.intp)
+        positions = np.array([npc_positions[entity_index] for entity_index in moved], dtype=np.intp)
+        self.npc_hash.update_many(positions, entities.x[indices], entities.y[indices],
+                                  entities.width[indices], entities.height[indices])
+
+    def npcs_touching(self, rect):
+        # Posições em npc_list (ordem crescente) dos NPCs cujo sprite cruza 'rect': candidatos das células
+        # do spatial hash em volta de 'rect' + teste exato só neles
+        candidates = self.npc_hash.query(rect)
+        if len(candidates) == 0:
+            return candidates
+        return candidates[self.entities.overlapping(rect, self.npc_indices[candidates])]
+
+    def snapshot_positions(self):
+        # Guarda as posições atuais como as do tick anterior (chamado antes de cada tick de simulação)
+        self.entities.snapshot()
+        self.camera.snapshot()
+
+    def _preload_nearby_portal_targets(self, tile_col_in_pattern, tile_row):
+        # Começa a preparar em segundo plano o mapa de destino dos portais perto do jogador,
+        # assim quando o portal dispara a troca de mapa só aplica um bundle já pronto
+        base_pattern_width_tiles = max(1, self.current_map_info["pixel_width"] // self.tile_size)
+        for (portal_col, portal_row), portal_data in self.current_map_portals.items():
+            # Distância em colunas considerando a repetição horizontal do padrão
+            col_distance = abs(portal_col - tile_col_in_pattern) % base_pattern_width_tiles
+            col_distance = min(col_distance, base_pattern_width_tiles - col_distance)
+            if col_distance <= PORTAL_PRELOAD_RADIUS and abs(portal_row - tile_row) <= PORTAL_PRELOAD_RADIUS:
+                self.map_preloader.request(portal_data["target_map_key"], portal_data["target_player_pos"])
 
     def load_map_data(self, map_file_path):
         map_data = []
@@ -251,6 +509,13 @@ class Game:
         return map_data
 
     def draw_background(self): 
+        with self.profiler.phase("draw_background"):
+            self._draw_background()
+
+    def _draw_background(self):
+        if self.world_streamer is not None:
+            self._draw_streamed_background()
+            return
         base_map_pixel_width = self.current_map_info["pixel_width"]
         repeat_x = self.current_map_info.get("repeat_x", 1)
 
@@ -267,85 +532,67 @@ class Game:
             pattern_to_draw = pygame.Surface((base_map_pixel_width, self.current_map_pixel_height))
             pattern_to_draw.fill(BLACK)
 
-        # Desenhar a imagem de fundo repetida
-        for i in range(repeat_x):
-            try:
-                self.screen.blit(
-                    pattern_to_draw, 
-                    (i * base_map_pixel_width + self.camera.camera_rect.x, self.camera.camera_rect.y)
-                )
-            except pygame.error as e:
-                print(f"Error blitting background part for {self.current_map_key}: {e}")
-                # Desenhar um placeholder preto para a parte do fundo que falhou
-                placeholder_rect = pygame.Rect(
-                    i * base_map_pixel_width + self.camera.camera_rect.x, 
-                    self.camera.camera_rect.y,
-                    base_map_pixel_width,
-                    self.current_map_pixel_height 
-                )
-                pygame.draw.rect(self.screen, BLACK, placeholder_rect)
-
-
-        # Overlay tiles based on self.map_data, considerando a repetição
-        tiles_in_pattern_width = base_map_pixel_width // self.tile_size
-        
-        # Determinar o range de colunas de tiles visíveis na tela para otimizar o desenho
-        # Isso considera a posição da câmera e a largura da tela
-        # Coordenada X do início da câmera no mundo do jogo
-        camera_world_x = -self.camera.camera_rect.x
-        # Coluna do tile inicial visível (no mapa grande/repetido)
-        start_col_on_screen = camera_world_x // self.tile_size
-        # Coluna do tile final visível (no mapa grande/repetido)
-        end_col_on_screen = (camera_world_x + WIDTH) // self.tile_size + 1 # +1 para garantir que tiles parciais sejam desenhados
-
-        for row_index, row_data in enumerate(self.map_data):
-            # Itera apenas sobre as colunas que podem estar visíveis
-            for col_on_large_map in range(int(start_col_on_screen), int(end_col_on_screen) +1):
-                # Mapeia a coluna do mapa grande de volta para a coluna no padrão original
-                col_in_pattern = col_on_large_map % tiles_in_pattern_width
-                
-                if 0 <= col_in_pattern < len(row_data): # Verifica se col_in_pattern é válido para row_data
-                    tile_key = row_data[col_in_pattern]
-                    tile_image = self.tiles.get(tile_key)
-                    
-                    # tile_image_to_draw = tile_image # Default to the static tile image
-                    # Removed specific logic for changing 'p' tile appearance during portal activation
-                    # The background itself is now changed via scaled_portal_open_background_override
-                    
-                    if tile_image: # Was tile_image_to_draw
-                        # Posição X do tile no mapa grande/repetido
-                        x = col_on_large_map * self.tile_size + self.camera.camera_rect.x
-                        y = row_index * self.tile_size + self.camera.camera_rect.y
-                        
-                        tile_rect_on_screen = pygame.Rect(x, y, self.tile_size, self.tile_size)
-                        # Verifica se o tile está realmente na tela antes de desenhar (dupla checagem, mas útil)
-                        if self.screen.get_rect().colliderect(tile_rect_on_screen):
-                             self.screen.blit(tile_image, (x, y)) # Was tile_image_to_draw
+        def draw_content(surface, camera_rect):
+            # Desenhar a imagem de fundo repetida, apenas as partes das cópias que aparecem na câmera
+            self.background_renderer.draw(surface, pattern_to_draw, camera_rect, base_map_pixel_width, repeat_x)
+
+            # Overlay tiles based on self.tile_grid, considerando a repetição.
+            # A camada de tiles vem de chunks pré-renderizados, reaproveitados em cada repetição do padrão.
+            self.tile_layer.draw(surface, camera_rect)
+
+        if self.scroll_buffer is None:
+            draw_content(self.screen, self.render_camera_rect)
+            return
+        # O padrão escolhido já muda com o frame da animação e com o portal; a camada de tiles muda com o mapa
+        content_key = (self.current_map_key, id(pattern_to_draw), id(self.tile_layer.layer))
+        self.scroll_buffer.draw(self.screen, self.render_camera_rect, content_key, draw_content)
+
+    def _draw_streamed_background(self):
+        # Padrão pequeno repetido + tiles dos chunks carregados; um chunk que termina de carregar muda a versão
+        streamer = self.world_streamer
+        pattern = self.current_background_image_pattern
+
+        def draw_content(surface, camera_rect):
+            streamer.draw(surface, camera_rect, pattern)
+
+        if self.scroll_buffer is None:
+            draw_content(self.screen, self.render_camera_rect)
+            return
+        content_key = (self.current_map_key, id(pattern), id(streamer), streamer.version)
+        self.scroll_buffer.draw(self.screen, self.render_camera_rect, content_key, draw_content)
 
     def events(self):
-        for event in pygame.event.get():
+        for event in self.event_source():
             if event.type == pygame.QUIT:
                 self.running = False
             elif event.type == pygame.KEYDOWN:
-                if self.game_state == "dialogue":
+                if event.key == pygame.K_F3:
+                    self.profiler_overlay.toggle()
+                elif event.key == pygame.K_F4:
+                    json_path, csv_path = self.profiler.export()
+                    print(f"Profile exported to {json_path} and {csv_path}")
+                elif event.key == pygame.K_F5 and self.save_file and not self.loading:
+                    self.save_file.save(self)
+                elif event.key == pygame.K_F9 and self.save_file and self.save_loading_enabled and not self.loading:
+                    self.save_file.load(self)
+                elif self.game_state == "dialogue":
                     if event.key == pygame.K_SPACE:
-                        if self.current_dialogue_story:
+                        if self.dialogue_system.is_revealing():
+                            # Primeiro ESPAÇO completa o texto que ainda está aparecendo
+                            self.dialogue_system.reveal_all()
+                        elif self.current_dialogue_story:
                             self.current_dialogue_story.next_scene()
-                            scene = self.current_dialogue_story.get_current_scene()
-                            if scene is None: # Checa se get_current_scene retornou None
+                            if self.current_dialogue_story.finished:
                                 self.game_state = "map"
                                 self.current_dialogue_story = None # Limpa a história atual
                                 self.dialogue_system.current_character = None # Limpa o personagem no sistema de diálogo
                                 self.dialogue_system.current_text = "" # Limpa o texto no sistema de diálogo
                                 self.dialogue_exit_active = True # Activate flag
                             else:
-                                character_in_dialogue = self.characters.get(scene["character"])
-                                if character_in_dialogue:
-                                    self.dialogue_system.set_dialogue(character_in_dialogue, scene["text"])
+                                self.show_dialogue_scene()
                     elif event.key == pygame.K_ESCAPE:
                         self.game_state = "map"
                         if self.current_dialogue_story:
-                            # self.current_dialogue_story.reset() # Reset is handled when starting new dialogue
                             self.current_dialogue_story = None
                         self.dialogue_system.current_character = None
                         self.dialogue_system.current_text = ""
@@ -354,6 +601,26 @@ class Game:
                     if event.key == pygame.K_ESCAPE:
                         self.running = False
 
+    def start_dialogue(self, story, scene=None):
+        # Abre a conversa do início (ou do nó 'scene', ao carregar um save). Na primeira conversa com o NPC
+        # o roteiro é lido e compilado aqui, com as falas já quebradas em linhas para a caixa de diálogo.
+        try:
+            story.start(self.characters, self.dialogue_flags, self.dialogue_system.wrap_lines, scene)
+        except (DialogueScriptError, WorldManifestError) as e:
+            print(f"Error loading dialogue: {e}")
+            return False
+        self.game_state = "dialogue"
+        self.current_dialogue_story = story
+        self.show_dialogue_scene()
+        return True
+
+    def show_dialogue_scene(self):
+        story = self.current_dialogue_story
+        if not story.finished:
+            character_in_dialogue = story.speaker()
+            if character_in_dialogue:
+                self.dialogue_system.set_dialogue(character_in_dialogue, story.text(), story.lines())
+
     def update(self):
         if self.portal_is_activating:
             self.portal_activation_timer -= 1
@@ -368,7 +635,7 @@ class Game:
             return # Skip other updates (like player movement) during portal activation
 
         if self.game_state == "map":
-            keys = pygame.key.get_pressed()
+            keys = self.key_state()
             dx, dy = 0, 0
             
             any_key_pressed = (keys[pygame.K_LEFT] or keys[pygame.K_a] or
@@ -404,7 +671,7 @@ class Game:
             # Use current map's dimensions for player movement boundaries
             # current_map_pixel_width = self.current_map_info["pixel_width"] # Isso foi movido para self.current_map_effective_pixel_width
             # current_map_pixel_height = self.current_map_info["pixel_height"]
-            if dx != 0 or dy != 0: self.player.move(dx, dy, self.current_map_effective_pixel_width, self.current_map_pixel_height, self.collision_map_rects)
+            if dx != 0 or dy != 0: self.player.move(dx, dy, self.current_map_effective_pixel_width, self.current_map_pixel_height, self.tile_grid)
             self.player.update_animation()
 
             player_feet_x = self.player.map_x + self.player.collision_box_offset_x + self.player.collision_box_width // 2
@@ -421,66 +688,52 @@ class Game:
             tile_col_in_pattern = tile_col_on_large_map % base_pattern_width_tiles
             
             current_tile_coords_in_pattern = (tile_col_in_pattern, tile_row)
+            self._preload_nearby_portal_targets(tile_col_in_pattern, tile_row)
             
-            # Verifica se as coordenadas no padrão são válidas antes de acessar map_data
-            if 0 <= tile_row < len(self.map_data) and \
-               0 <= tile_col_in_pattern < (len(self.map_data[tile_row]) if self.map_data and tile_row < len(self.map_data) else 0) :
-                current_tile_key = self.map_data[tile_row][tile_col_in_pattern]
-                if current_tile_key == 'p':
-                    # A chave do portal em self.current_map_info[\\\"portals\\\"] deve ser a coordenada no padrão
-                    if current_tile_coords_in_pattern in self.current_map_info.get("portals", {}):
-                        portal_data = self.current_map_info["portals"][current_tile_coords_in_pattern]
-                        
-                        if self.raw_portal_open_image: # Check if the base image was loaded
-                            current_map_pattern_width = self.current_map_info["pixel_width"]
-                            current_map_pattern_height = self.current_map_info["pixel_height"]
-                            self.scaled_portal_open_background_override = pygame.transform.scale(
-                                self.raw_portal_open_image, 
-                                (current_map_pattern_width, current_map_pattern_height)
-                            )
-                        else: # Fallback if raw_portal_open_image failed to load
-                            self.scaled_portal_open_background_override = None
-
-                        self.portal_is_activating = True
-                        self.portal_activation_timer = self.portal_activation_delay
-                        self.portal_target_info = portal_data
-                        # self.portal_tile_animating_coords removed
-                        return 
+            # tile_key já devolve None fora do mapa ou além do fim da linha
+            current_tile_key = self.tile_grid.tile_key(tile_col_in_pattern, tile_row)
+            if current_tile_key == 'p':
+                # A chave do portal em self.current_map_portals é a coordenada no padrão
+                if current_tile_coords_in_pattern in self.current_map_portals:
+                    portal_data = self.current_map_portals[current_tile_coords_in_pattern]
+                    
+                    # Já escalado na carga do mapa (None se porta_aberta.png não carregou)
+                    self.scaled_portal_open_background_override = self.portal_open_background_pattern
+
+                    self.portal_is_activating = True
+                    self.portal_activation_timer = self.portal_activation_delay
+                    self.portal_target_info = portal_data
+                    # self.portal_tile_animating_coords removed
+                    return 
             
-            for npc in self.npcs.values():
-                # NPCs can also have directions, but for now, they face "frente" and animate if set
-                if npc.directional_frames.get("frente"): # Check if NPC has 'frente' frames
-                    npc.current_direction = "frente"
-                    if len(npc.directional_frames["frente"]) > 1: # If NPC has animation frames
-                        npc.is_moving = True # Make NPCs animate if they have multiple frames
-                    else:
-                        npc.is_moving = False
-                else: # No 'frente' frames, maybe a static sprite or error
-                    npc.is_moving = False
-                npc.update_animation()
+            # NPCs com comportamento andam pelo caminho; os outros ficam de frente (ver add_npc).
+            # Um tick de animação para todos de uma vez.
+            self.npc_movement.update(self.player)
+            self.entities.tick_animation(self.npc_indices)
             self.camera.update(self.player)
+            if self.world_streamer is not None:
+                # Pede os chunks em volta do centro da câmera e descarta os que ficaram longe
+                self.world_streamer.update(-self.camera.camera_rect.x + WIDTH // 2, -self.camera.camera_rect.y + HEIGHT // 2)
+            self.sync_npc_hash()
 
             player_rect = pygame.Rect(self.player.map_x, self.player.map_y, self.player.map_sprite_width, self.player.map_sprite_height)
+            # NPCs que encostam no jogador: só os candidatos perto dele, vindos do spatial hash
+            touching_npcs = self.npcs_touching(player_rect)
             
             # Check for NPC collision only if dialogue_exit_active is False
             if not self.dialogue_exit_active:
-                for npc_name, npc in self.npcs.items():
-                    npc_rect = pygame.Rect(npc.map_x, npc.map_y, npc.map_sprite_width, npc.map_sprite_height)
-                    if player_rect.colliderect(npc_rect) and npc.story:
-                        self.game_state = "dialogue"
-                        self.current_dialogue_story = npc.story
-                        self.current_dialogue_story.reset() # Reseta a história do NPC para começar do início
-                        scene = self.current_dialogue_story.get_current_scene()
-                        if scene: # Deve haver uma cena após o reset
-                            character_in_dialogue = self.characters.get(scene["character"])
-                            if character_in_dialogue:
-                                self.dialogue_system.set_dialogue(character_in_dialogue, scene["text"])
-                        break # Interage com um NPC de cada vez
+                for npc_position in touching_npcs.tolist():
+                    npc = self.npc_list[npc_position]
+                    if npc.story:
+                        if self.start_dialogue(npc.story):
+                            break # Interage com um NPC de cada vez
+                        npc.story = None # Roteiro com erro: avisa uma vez e o NPC fica sem diálogo
             # If player is not colliding with any NPC, reset the flag
-            elif not any(player_rect.colliderect(pygame.Rect(npc.map_x, npc.map_y, npc.map_sprite_width, npc.map_sprite_height)) for npc in self.npcs.values()):
+            elif len(touching_npcs) == 0:
                 self.dialogue_exit_active = False
 
         elif self.game_state == "dialogue":
+            self.dialogue_system.update()
             # Lógica de animação para personagem em diálogo
             current_char_in_dialogue = self.dialogue_system.current_character
             if current_char_in_dialogue:
@@ -494,57 +747,218 @@ class Game:
                     current_char_in_dialogue.update_animation() # Still call to reset frame index if needed
 
     def draw(self):
+        # Câmera interpolada entre os dois últimos ticks (igual à câmera atual com render_alpha 1)
+        self.render_camera_offset = self.camera.render_offset(self.render_alpha)
+        self.render_camera_rect = pygame.Rect(round(self.render_camera_offset[0]), round(self.render_camera_offset[1]), WIDTH, HEIGHT)
+        render_camera = (self.current_map_key, self.render_camera_rect.topleft)
+        if self.last_render_camera is not None and self.last_render_camera[0] == self.current_map_key:
+            previous_x, previous_y = self.last_render_camera[1]
+            self.render_scroll = (self.render_camera_rect.x - previous_x, self.render_camera_rect.y - previous_y)
+        else:
+            self.render_scroll = None
+        self.last_render_camera = render_camera
+        if self.game_state == "dialogue" and self.dialogue_dirty_rects:
+            self._draw_dialogue_dirty()
+            return
+        self.dialogue_backdrop = None
+
         self.screen.fill(BLACK)
         self.draw_background() # No longer needs background_name
 
         if self.game_state == "map":
-            player_map_pos_rect = pygame.Rect(self.player.map_x, self.player.map_y, self.player.map_sprite_width, self.player.map_sprite_height)
-            self.player.draw_on_map(self.screen, self.camera.apply_to_rect(player_map_pos_rect).topleft)
-            for npc in self.npcs.values():
-                npc_map_pos_rect = pygame.Rect(npc.map_x, npc.map_y, npc.map_sprite_width, npc.map_sprite_height)
-                npc.draw_on_map(self.screen, self.camera.apply_to_rect(npc_map_pos_rect).topleft)
+            self.draw_characters()
             instruction_text = "WASD/Setas: Mover | ESC: Sair | Aproxime-se para interagir"
-            self.screen.blit(self.font.render(instruction_text, True, WHITE), (10, 10))
+            self.screen.blit(text_cache.render(self.font, instruction_text, WHITE), (10, 10))
 
         elif self.game_state == "dialogue":
-            # Desenha personagem em diálogo e caixa de diálogo
-            if self.current_dialogue_story and self.dialogue_system.current_character:
-                char_in_dialogue = self.dialogue_system.current_character
-                # Use 'frente' frames for dialogue, or fallback to any available frames
-                dialogue_frames = char_in_dialogue.directional_frames.get("frente", list(char_in_dialogue.directional_frames.values())[0] if char_in_dialogue.directional_frames else [])
-
-                if dialogue_frames:
-                    # Ensure current_frame_index is valid for dialogue_frames
-                    if char_in_dialogue.current_frame_index >= len(dialogue_frames):
-                        char_in_dialogue.current_frame_index = 0
-
-                    frame_to_draw = dialogue_frames[char_in_dialogue.current_frame_index]
-                    # Use the character's dialogue_sprite_original_width/height for consistent dialogue sprite sizing
-                    sprite_x = WIDTH // 2 - char_in_dialogue.dialogue_sprite_original_width // 2
-                    sprite_y = HEIGHT // 2 - char_in_dialogue.dialogue_sprite_original_height // 2 - 50
-                    self.screen.blit(frame_to_draw, (sprite_x, sprite_y))
-                else: # Fallback se não houver frames
-                    pygame.draw.rect(self.screen, char_in_dialogue.color, 
-                                     (WIDTH//2 - char_in_dialogue.dialogue_sprite_original_width//2, 
-                                      HEIGHT//2 - char_in_dialogue.dialogue_sprite_original_height//2 - 50, 
-                                      char_in_dialogue.dialogue_sprite_original_width, 
-                                      char_in_dialogue.dialogue_sprite_original_height))
-            self.dialogue_system.draw_dialogue_box()
-            instruction_text = "ESPAÇO: Próximo | ESC: Voltar ao Mapa"
-            self.screen.blit(self.font.render(instruction_text, True, WHITE), (10, 10))
+            self._draw_dialogue_foreground()
         
+        self.profiler_overlay.draw(self.screen)
         pygame.display.flip()
 
+    def draw_characters(self):
+        # Desenha o jogador e os NPCs visíveis: os NPCs fora da câmera são descartados pelo spatial hash,
+        # os visíveis são ordenados pela base do sprite (quem está mais abaixo fica na frente) e vão
+        # para a tela numa única chamada de Surface.blits()
+        view_rect = pygame.Rect(-self.render_camera_rect.x, -self.render_camera_rect.y, WIDTH, HEIGHT)
+        self.sync_npc_hash()
+        # Folga para NPCs que a interpolação ainda desenha perto da posição do tick anterior
+        visible_positions = self.npcs_touching(view_rect.inflate(2 * CULL_MARGIN, 2 * CULL_MARGIN))
+        characters = [self.player] + [self.npc_list[position] for position in visible_positions.tolist()]
+        indices = np.concatenate(([self.player.index], self.npc_indices[visible_positions])).astype(np.intp)
+
+        screen_x, screen_y = self.entities.render_positions(indices, self.render_alpha, self.render_camera_offset)
+        screen_x = screen_x.tolist()
+        screen_y = screen_y.tolist()
+        frame_indices = self.entities.frame_index[indices].tolist()
+        # Ordenação estável: em caso de empate fica o jogador primeiro e depois a ordem de npc_list
+        draw_order = np.argsort(self.entities.y[indices] + self.entities.height[indices], kind="stable").tolist()
+
+        blit_sequence = []
+        for position in draw_order:
+            character = characters[position]
+            frame = character.map_frame(frame_indices[position])
+            if frame is not None:
+                blit_sequence.append((frame, (screen_x[position], screen_y[position])))
+            else:
+                # Sem frames: desenha o retângulo na ordem certa, depois do que já estava na fila
+                self.screen.blits(blit_sequence, doreturn=False)
+                self.profiler.count("blit", len(blit_sequence))
+                blit_sequence = []
+                pygame.draw.rect(self.screen, character.color, (screen_x[position], screen_y[position], character.map_sprite_width, character.map_sprite_height))
+        self.screen.blits(blit_sequence, doreturn=False)
+        self.profiler.count("blit", len(blit_sequence))
+        self.profiler.count("culled", len(self.npc_list) - len(visible_positions))
+
+    def _draw_dialogue_foreground(self):
+        # Desenha personagem em diálogo e caixa de diálogo
+        if self.current_dialogue_story and self.dialogue_system.current_character:
+            char_in_dialogue = self.dialogue_system.current_character
+            # Use 'frente' frames for dialogue, or fallback to any available frames
+            dialogue_frames = char_in_dialogue.directional_frames.get("frente", list(char_in_dialogue.directional_frames.values())[0] if char_in_dialogue.directional_frames else [])
+
+            if dialogue_frames:
+                # Ensure current_frame_index is valid for dialogue_frames
+                if char_in_dialogue.current_frame_index >= len(dialogue_frames):
+                    char_in_dialogue.current_frame_index = 0
+
+                frame_to_draw = dialogue_frames[char_in_dialogue.current_frame_index]
+                # Use the character's dialogue_sprite_original_width/height for consistent dialogue sprite sizing
+                sprite_x = WIDTH // 2 - char_in_dialogue.dialogue_sprite_original_width // 2
+                sprite_y = HEIGHT // 2 - char_in_dialogue.dialogue_sprite_original_height // 2 - 50
+                self.screen.blit(frame_to_draw, (sprite_x, sprite_y))
+            else: # Fallback se não houver frames
+                pygame.draw.rect(self.screen, char_in_dialogue.color, 
+                                 (WIDTH//2 - char_in_dialogue.dialogue_sprite_original_width//2, 
+                                  HEIGHT//2 - char_in_dialogue.dialogue_sprite_original_height//2 - 50, 
+                                  char_in_dialogue.dialogue_sprite_original_width, 
+                                  char_in_dialogue.dialogue_sprite_original_height))
+        self.dialogue_system.draw_dialogue_box()
+        instruction_text = "ESPAÇO: Próximo | ESC: Voltar ao Mapa"
+        self.screen.blit(text_cache.render(self.font, instruction_text, WHITE), (10, 10))
+
+    def _dialogue_regions(self):
+        # Regiões da tela que mudam durante o diálogo, cada uma com o estado que define o seu conteúdo
+        regions = {}
+        char_in_dialogue = self.dialogue_system.current_character
+        if self.current_dialogue_story and char_in_dialogue:
+            sprite_rect = pygame.Rect(WIDTH // 2 - char_in_dialogue.dialogue_sprite_original_width // 2,
+                                      HEIGHT // 2 - char_in_dialogue.dialogue_sprite_original_height // 2 - 50,
+                                      char_in_dialogue.dialogue_sprite_original_width,
+                                      char_in_dialogue.dialogue_sprite_original_height)
+            dialogue_frames = char_in_dialogue.directional_frames.get("frente", list(char_in_dialogue.directional_frames.values())[0] if char_in_dialogue.directional_frames else [])
+            if dialogue_frames:
+                # O sprite é desenhado com o tamanho do próprio frame
+                sprite_rect.size = dialogue_frames[0].get_size()
+            regions["sprite"] = (sprite_rect, (char_in_dialogue, char_in_dialogue.current_frame_index))
+        regions["dialogue_box"] = (self.dialogue_system.box_rect(),
+                                   (char_in_dialogue, self.dialogue_system.current_text, self.dialogue_system.revealed_chars))
+        self.profiler_overlay.refresh()
+        overlay_rect = self.profiler_overlay.rect(self.screen)
+        if overlay_rect:
+            regions["profiler_overlay"] = (overlay_rect, self.profiler_overlay.panel)
+        return regions
+
+    def _draw_dialogue_dirty(self):
+        # No diálogo o mapa não se mexe: o fundo é desenhado uma vez e guardado; nos frames seguintes só
+        # as regiões cujo estado mudou são restauradas do snapshot, redesenhadas e enviadas ao display
+        backdrop_key = (self.current_map_key, self.render_camera_rect.topleft, self.current_background_animation_frame_index,
+                        self.portal_is_activating)
+        regions = self._dialogue_regions()
+        if self.dialogue_backdrop is None or self.dialogue_backdrop_key != backdrop_key:
+            self.screen.fill(BLACK)
+            self.draw_background()
+            self.dialogue_backdrop = self.screen.copy()
+            self.dialogue_backdrop_key = backdrop_key
+            self._draw_dialogue_foreground()
+            self.profiler_overlay.draw(self.screen)
+            pygame.display.flip()
+            self.dialogue_regions = regions
+            return
+
+        dirty_rects = []
+        for name in set(regions) | set(self.dialogue_regions):
+            if regions.get(name) != self.dialogue_regions.get(name):
+                # Apaga onde a região estava e desenha onde ela está agora
+                dirty_rects.extend(region[0] for region in (self.dialogue_regions.get(name), regions.get(name)) if region)
+        self.dialogue_regions = regions
+        if not dirty_rects:
+            return
+
+        for rect in dirty_rects:
+            # Restaura o fundo e redesenha tudo que passa pela região, recortado nela
+            self.screen.set_clip(rect)
+            self.screen.blit(self.dialogue_backdrop, rect, rect)
+            self._draw_dialogue_foreground()
+            self.profiler_overlay.draw(self.screen)
+        self.screen.set_clip(None)
+        pygame.display.update(dirty_rects)
+
+    def run_frame(self, elapsed=None):
+        # Um frame completo do loop (também usado pelo benchmark, que controla quantos frames rodar).
+        # Roda quantos ticks de simulação couberem no tempo decorrido; 'elapsed' (segundos) substitui
+        # o relógio real, ex: elapsed=self.timestep.step_seconds roda exatamente um tick por frame.
+        self.profiler.begin_frame()
+        with self.profiler.phase("events"):
+            self.events()
+        if self.loading:
+            # Etapas de carga até esgotar o orçamento do frame, com a barra de progresso redesenhada entre frames
+            with self.profiler.phase("loading"):
+                self.startup_timer.mark("loading_frames") # Eventos, desenho e espera entre os frames de carga
+                budget_end = time.perf_counter() + LOADING_FRAME_BUDGET_MS / 1000
+                while self.loading and self.advance_loading():
+                    if time.perf_counter() >= budget_end:
+                        break
+                self.draw_loading()
+        else:
+            with self.profiler.phase("update"):
+                steps = self.timestep.advance(elapsed)
+                for _ in range(steps):
+                    self.snapshot_positions()
+                    self.update()
+                self.profiler.count("sim_steps", steps)
+                self.render_alpha = self.timestep.alpha
+            # Buscas de caminho pedidas nos ticks, até o orçamento do frame; o resto fica para o próximo
+            with self.profiler.phase("pathfinding"):
+                self.pathfinder.process()
+            if self.save_file:
+                # Autosave: só a captura do estado roda aqui, a escrita fica na thread do SaveFile
+                with self.profiler.phase("save"):
+                    self.save_file.update(self)
+            with self.profiler.phase("draw"):
+                self.draw()
+            if self.startup_report_pending:
+                self.startup_report_pending = False
+                self.startup_timer.mark("first_map_frame")
+                print(self.startup_timer.report())
+        with self.profiler.phase("tick"):
+            self.clock.tick(self.fps_cap)
+        self.profiler.end_frame()
+
     def run(self):
         while self.running:
-            self.events()
-            self.update()
-            self.draw()
-            self.clock.tick(FPS)
+            self.run_frame()
+        self.shutdown()
+
+    def shutdown(self):
+        # Para as threads de trabalho (preparo de mapas, streaming de chunks, gravação do save)
+        if self.save_file:
+            self.save_file.close(self)
+        self.map_preloader.shutdown()
+        if self.world_streamer is not None:
+            self.world_streamer.close()
+            self.world_streamer = None
+        if isinstance(self.tile_grid, TileGrid):
+            self.tile_grid.close()
+
+    def world_chunk_stats(self):
+        if self.world_streamer is None:
+            return {"entries": 0, "bytes": 0}
+        return self.world_streamer.stats()
 
 # Ponto de entrada principal
 if __name__ == '__main__':
-    game = Game()
+    game = Game(profile_startup=PROFILE_STARTUP or "--profile-startup" in sys.argv)
     game.run()
     pygame.quit()
     sys.exit()
\ No newline at end of file
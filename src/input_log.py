@@ -0,0 +1,247 @@
+import hashlib
+import struct
+
+import pygame
+
+from config import PATHFINDING_WORK_BUDGET
+
+# Log binário de entrada (.vinp), gravado frame a frame por InputRecorder e reproduzido por InputReplay.
+#
+# Cabeçalho: magic b"VINP", versão (u16), SIM_RATE da gravação (u16), chave do mapa inicial (u8 + utf-8).
+# Cada frame: ticks de simulação (u8), flags (u8) e, conforme as flags:
+#   FRAME_KEYS   - teclas seguradas mudaram: quantidade (u8) + scancodes (u16 cada)
+#   FRAME_EVENTS - eventos do frame: quantidade (u8) + (tipo u8, tecla i32, mod u16) cada
+# Um frame sem mudanças ocupa 2 bytes. O log termina com END_OF_LOG no lugar dos ticks, seguido do
+# digest (SHA-1) do estado final do jogo, conferido no fim do replay.
+
+MAGIC = b"VINP"
+VERSION = 1
+HEADER = struct.Struct("<4sHH")
+FRAME = struct.Struct("<BB")
+EVENT = struct.Struct("<BiH")
+END_OF_LOG = 0xFF
+DIGEST_SIZE = 20
+
+FRAME_KEYS = 1
+FRAME_EVENTS = 2
+
+# Só os eventos que o jogo trata entram no log
+EVENT_CODES = {pygame.KEYDOWN: 1, pygame.KEYUP: 2, pygame.QUIT: 3}
+EVENT_TYPES = {code: event_type for event_type, code in EVENT_CODES.items()}
+
+
+class InputLogError(Exception):
+    pass
+
+
+def state_digest(game):
+    # Digest do estado que uma reprodução precisa repetir: mapa, estado do jogo, posição do jogador
+    # e o índice da cena de cada história (e da história aberta no diálogo), mais as flags de diálogo.
+    # Sem flags ligadas o digest é o mesmo de antes delas, então logs antigos continuam valendo.
+    stories = [(key, npc.story.current_scene) for key, npc in sorted(game.characters.items()) if getattr(npc, "story", None)]
+    open_story = game.current_dialogue_story.current_scene if game.current_dialogue_story else -1
+    state = (game.current_map_key, game.game_state, int(game.player.map_x), int(game.player.map_y), open_story, stories)
+    if game.dialogue_flags:
+        state += (sorted(game.dialogue_flags.items()),)
+    return hashlib.sha1(repr(state).encode("utf-8")).digest()
+
+
+def pressed_scancodes(key_state):
+    # get_pressed() é indexado por scancode quando percorrido como tupla
+    return tuple(scancode for scancode, pressed in enumerate(key_state) if pressed)
+
+
+def key_state_from_scancodes(scancodes, size=512):
+    pressed = [False] * size
+    for scancode in scancodes:
+        pressed[scancode] = True
+    return pygame.key.ScancodeWrapper(pressed)
+
+
+class RecordedFrame:
+    __slots__ = ("steps", "scancodes", "events")
+
+    def __init__(self, steps, scancodes, events):
+        self.steps = steps
+        self.scancodes = scancodes # Teclas seguradas durante os ticks do frame
+        self.events = events # (tipo, tecla, mod)
+
+
+def encode_frame(frame, previous_scancodes):
+    flags = 0
+    payload = b""
+    if frame.scancodes != previous_scancodes:
+        flags |= FRAME_KEYS
+        payload += struct.pack(f"<B{len(frame.scancodes)}H", len(frame.scancodes), *frame.scancodes)
+    if frame.events:
+        flags |= FRAME_EVENTS
+        payload += struct.pack("<B", len(frame.events)) + b"".join(EVENT.pack(*event) for event in frame.events)
+    return FRAME.pack(frame.steps, flags) + payload
+
+
+def read_input_log(path):
+    # Retorna (sim_rate, mapa inicial, lista de RecordedFrame, digest final ou None se o log não foi fechado)
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise InputLogError(f"{path}: not an input log")
+    magic, version, sim_rate = HEADER.unpack_from(data, 0)
+    if version != VERSION:
+        raise InputLogError(f"{path}: unsupported version {version}")
+    offset = HEADER.size
+    key_length = data[offset]
+    start_map = data[offset + 1:offset + 1 + key_length].decode("utf-8")
+    offset += 1 + key_length
+
+    frames = []
+    scancodes = ()
+    digest = None
+    try:
+        while offset < len(data):
+            steps = data[offset]
+            if steps == END_OF_LOG:
+                digest = data[offset + 1:offset + 1 + DIGEST_SIZE]
+                break
+            steps, flags = FRAME.unpack_from(data, offset)
+            offset += FRAME.size
+            if flags & FRAME_KEYS:
+                count = data[offset]
+                scancodes = struct.unpack_from(f"<{count}H", data, offset + 1)
+                offset += 1 + 2 * count
+            events = []
+            if flags & FRAME_EVENTS:
+                count = data[offset]
+                offset += 1
+                for _ in range(count):
+                    events.append(EVENT.unpack_from(data, offset))
+                    offset += EVENT.size
+            frames.append(RecordedFrame(steps, scancodes, events))
+    except (struct.error, IndexError) as e:
+        raise InputLogError(f"{path}: truncated at byte {offset}") from e
+    return sim_rate, start_map, frames, digest
+
+
+class InputRecorder:
+    # Grava a entrada ao vivo do jogo: eventos, teclas seguradas e número de ticks de cada frame.
+    # Fica entre o jogo e as fontes que ele já usava (game.event_source, game.key_state, game.timestep),
+    # que continuam funcionando normalmente; a gravação começa no primeiro frame depois da carga.
+    def __init__(self, path):
+        self.path = path
+        self.log_file = None
+        self.timestep = None
+        self.source_events = None
+        self.source_key_state = None
+        self.frame_events = []
+        self.scancodes = ()
+        self.key_state = pygame.key.ScancodeWrapper([False] * 512)
+        self.frame_count = 0
+
+    def attach(self, game):
+        self.timestep = game.timestep
+        self.source_events = game.event_source
+        self.source_key_state = game.key_state
+        self.log_file = open(self.path, "wb")
+        map_key = game.current_map_key.encode("utf-8")
+        self.log_file.write(HEADER.pack(MAGIC, VERSION, self.timestep.rate) + struct.pack("<B", len(map_key)) + map_key)
+        game.event_source = self.events
+        game.key_state = self.get_key_state
+        game.timestep = self
+        # Carregar um save (F9) mudaria o estado sem passar pela entrada gravada
+        game.save_loading_enabled = False
+        # Caminhos dos NPCs prontos nos mesmos frames na gravação e no replay (orçamento em passos, não em tempo)
+        game.pathfinder.work_budget = PATHFINDING_WORK_BUDGET
+
+    # Mesma interface de FixedTimestep
+    @property
+    def rate(self):
+        return self.timestep.rate
+
+    @property
+    def step_seconds(self):
+        return self.timestep.step_seconds
+
+    @property
+    def alpha(self):
+        return self.timestep.alpha
+
+    def reset(self):
+        self.timestep.reset()
+
+    def events(self):
+        events = self.source_events()
+        # Os eventos dos frames de carga (sem ticks) não entram no log
+        self.frame_events = [(EVENT_CODES[event.type], getattr(event, "key", 0), getattr(event, "mod", 0))
+                             for event in events if event.type in EVENT_CODES]
+        return events
+
+    def advance(self, elapsed=None):
+        steps = self.timestep.advance(elapsed)
+        # As teclas só mudam quando a fila de eventos é lida (no início do frame), então vale para todos os ticks
+        self.key_state = self.source_key_state()
+        frame = RecordedFrame(steps, pressed_scancodes(self.key_state), self.frame_events[:255])
+        self.log_file.write(encode_frame(frame, self.scancodes))
+        self.scancodes = frame.scancodes
+        self.frame_events = []
+        self.frame_count += 1
+        return steps
+
+    def get_key_state(self):
+        return self.key_state
+
+    def close(self, game):
+        self.log_file.write(bytes([END_OF_LOG]) + state_digest(game))
+        self.log_file.close()
+        self.log_file = None
+
+
+class InputReplay:
+    # Reproduz um log de entrada: substitui as fontes de eventos, de teclas e o passo de tempo do jogo,
+    # então cada frame roda exatamente os mesmos ticks com a mesma entrada, sem depender do relógio.
+    def __init__(self, path):
+        self.sim_rate, self.start_map, self.frames, self.expected_digest = read_input_log(path)
+        self.frame = 0
+        self.scancodes = ()
+        self.key_state = key_state_from_scancodes(())
+        self.step_seconds = 1.0 / self.sim_rate
+        self.alpha = 1.0
+
+    def attach(self, game):
+        if game.timestep.rate != self.sim_rate:
+            raise InputLogError(f"log recorded at SIM_RATE {self.sim_rate}, game runs at {game.timestep.rate}")
+        if game.current_map_key != self.start_map:
+            raise InputLogError(f"log starts on map {self.start_map}, game starts on {game.current_map_key}")
+        game.event_source = self.events
+        game.key_state = self.get_key_state
+        game.timestep = self
+        # Caminhos dos NPCs prontos nos mesmos frames na gravação e no replay (orçamento em passos, não em tempo)
+        game.pathfinder.work_budget = PATHFINDING_WORK_BUDGET
+
+    @property
+    def rate(self):
+        return self.sim_rate
+
+    @property
+    def finished(self):
+        return self.frame >= len(self.frames)
+
+    def reset(self):
+        pass
+
+    def events(self):
+        if self.finished:
+            return []
+        return [pygame.event.Event(EVENT_TYPES[code], key=key, mod=mod) for code, key, mod in self.frames[self.frame].events]
+
+    def advance(self, elapsed=None):
+        if self.finished:
+            return 0
+        frame = self.frames[self.frame]
+        # Frames sem mudança de teclas compartilham a mesma tupla de scancodes (ver read_input_log)
+        if frame.scancodes is not self.scancodes:
+            self.scancodes = frame.scancodes
+            self.key_state = key_state_from_scancodes(frame.scancodes)
+        self.frame += 1
+        return frame.steps
+
+    def get_key_state(self):
+        return self.key_state
@@ -0,0 +1,26 @@
+import pygame
+
+from config import WIDTH, HEIGHT, BLACK, DARK_GRAY, WHITE
+
+# Janela e tela de carregamento. Só depende do pygame e do config, para que main.py mostre o primeiro
+# frame antes de importar o resto do jogo (numpy, mapas, ...).
+
+
+def open_window():
+    # Só os subsistemas usados pelo jogo (pygame.init() também abriria áudio, joystick, ...).
+    # Chamar de novo com a janela aberta reaproveita a mesma janela.
+    pygame.display.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    pygame.display.set_caption("Vult Game")
+    return screen
+
+
+def draw_loading_screen(screen, font, progress):
+    # Barra com a fração (0 a 1) das etapas de carga já concluídas
+    screen.fill(BLACK)
+    bar_rect = pygame.Rect(WIDTH // 4, HEIGHT // 2, WIDTH // 2, 16)
+    pygame.draw.rect(screen, DARK_GRAY, bar_rect)
+    pygame.draw.rect(screen, WHITE, (bar_rect.x, bar_rect.y, round(bar_rect.width * progress), bar_rect.height))
+    screen.blit(font.render("Carregando...", True, WHITE), (bar_rect.x, bar_rect.y - 28))
+    pygame.display.flip()
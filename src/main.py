@@ -1,6 +1,56 @@
-from game import Game
+import argparse
+import time
 
-if __name__ == "__main__":
-    game = Game()
+# Marcado antes dos imports para o relatório de inicialização (--profile-startup) incluir o tempo de import
+started_at = time.perf_counter()
+
+import pygame
+
+from config import SAVE_FILE
+from loading_screen import open_window, draw_loading_screen
+from profiler import StartupTimer
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Vult Game")
+    parser.add_argument("--profile-startup", action="store_true", help="print the startup timing breakdown")
+    parser.add_argument("--record", metavar="LOG", help="record this session's input to LOG (replay with src/replay.py)")
+    parser.add_argument("--save", metavar="SAVE", nargs="?", const=SAVE_FILE,
+                        help=f"continue from this save slot and autosave to it (default slot: {SAVE_FILE})")
+    return parser.parse_args()
+
+
+def main():
+    startup_timer = StartupTimer(started_at)
+    startup_timer.mark("import pygame")
+    args = parse_args()
+
+    # A janela aparece com a tela de carregamento antes de importar o resto do jogo (mapas, renderers, ...).
+    # Fica aqui, e não no nível do módulo, para importar main.py não abrir uma janela.
+    draw_loading_screen(open_window(), pygame.font.Font(None, 24), 0.0)
+    startup_timer.mark("window")
+
+    from game import Game
+    from config import PROFILE_STARTUP
+    from input_log import InputRecorder
+    from save_state import SaveFile
+
+    startup_timer.mark("imports")
+
+    game = Game(profile_startup=PROFILE_STARTUP or args.profile_startup, startup_timer=startup_timer)
+    if args.save:
+        # Uma gravação de entrada começa sempre do estado inicial e não carrega o save no meio (F9 fica
+        # desligado pelo InputRecorder), senão o replay não a reproduz. F5 e o autosave continuam valendo.
+        SaveFile(args.save).attach(game, restore=not args.record)
+    recorder = None
+    if args.record:
+        recorder = InputRecorder(args.record)
+        recorder.attach(game)
     game.run()
-    
\ No newline at end of file
+    if recorder:
+        recorder.close(game)
+        print(f"Recorded {recorder.frame_count} frames to {args.record}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import argparse
+import os
+import sys
+
+from config import TILE_SIZE, STREAM_CHUNK_TILES
+from map_definitions import build_map_definitions, BLOCKING_TILE_KEYS
+from map_format import compile_map, compiled_path_for, read_layout_rows, write_chunked_map, CHUNKED_MAP_EXTENSION, MapCompileError
+from tile_grid import TileGrid
+
+# Compila os arquivos .map (junto com portais e metadados de map_definitions) para o formato binário .vmap.
+# Uso, a partir da raiz do projeto:
+#   python src/map_compiler.py                 # compila todos os mapas
+#   python src/map_compiler.py caverna_secreta # compila só os mapas indicados
+#   python src/map_compiler.py --strict        # linhas irregulares e portais inválidos viram erro
+#   python src/map_compiler.py --chunked       # gera .vchunks (mundo em streaming, ver chunk_streamer.py)
+
+
+def compile_map_definition(map_key, map_info, strict=False, output_dir=None):
+    layout_file = map_info["layout_file"]
+    data, warnings = compile_map(read_layout_rows(layout_file), map_info, BLOCKING_TILE_KEYS, TILE_SIZE, strict=strict)
+    output_file = compiled_path_for(layout_file)
+    if output_dir:
+        output_file = os.path.join(output_dir, os.path.basename(output_file))
+    with open(output_file, "wb") as compiled_file:
+        compiled_file.write(data)
+    return output_file, len(data), warnings
+
+
+def compile_chunked_map_definition(map_key, map_info, output_dir=None):
+    # Converte o .map para o formato em chunks; o mapa passa a usar "chunks" no manifesto em vez de "layout"
+    layout_file = map_info["layout_file"]
+    tile_grid = TileGrid.from_rows(read_layout_rows(layout_file), BLOCKING_TILE_KEYS, TILE_SIZE, map_info["pixel_width"])
+    output_file = os.path.splitext(layout_file)[0] + CHUNKED_MAP_EXTENSION
+    if output_dir:
+        output_file = os.path.join(output_dir, os.path.basename(output_file))
+
+    def chunk_ids(first_col, first_row, width, height):
+        return tile_grid.tile_ids[first_row:first_row + height, first_col:first_col + width]
+
+    size = write_chunked_map(output_file, tile_grid.cols, tile_grid.rows, TILE_SIZE, tile_grid.palette,
+                             BLOCKING_TILE_KEYS, chunk_ids, STREAM_CHUNK_TILES)
+    return output_file, size, []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compile .map layouts to the binary .vmap format")
+    parser.add_argument("maps", nargs="*", help="map keys to compile (default: all maps)")
+    parser.add_argument("--strict", action="store_true", help="fail on ragged rows or invalid portals")
+    parser.add_argument("--output-dir", help="write .vmap files here instead of next to each .map")
+    parser.add_argument("--chunked", action="store_true", help="write chunked .vchunks files for streaming instead of .vmap")
+    args = parser.parse_args(argv)
+
+    map_definitions = build_map_definitions()
+    map_keys = args.maps or list(map_definitions)
+    failed = False
+    for map_key in map_keys:
+        if map_key not in map_definitions:
+            print(f"Unknown map: {map_key}")
+            failed = True
+            continue
+        map_info = map_definitions[map_key]
+        if "layout_file" not in map_info:
+            print(f"Skipping {map_key}: already a chunked map")
+            continue
+        try:
+            if args.chunked:
+                output_file, size, warnings = compile_chunked_map_definition(map_key, map_info, args.output_dir)
+            else:
+                output_file, size, warnings = compile_map_definition(map_key, map_info, args.strict, args.output_dir)
+        except (OSError, MapCompileError) as e:
+            print(f"Error compiling {map_key}: {e}")
+            failed = True
+            continue
+        for warning in warnings:
+            print(f"Warning ({map_key}): {warning}")
+        print(f"{map_key} -> {output_file} ({size} bytes)")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,15 @@
+import os
+
+from world import WorldManifest
+
+# Chaves de tiles que bloqueiam o movimento
+BLOCKING_TILE_KEYS = ('x', 'g0', 'g90', 'g180', 'g270')
+
+# Manifesto com os mapas, portais, NPCs e diálogos do jogo
+WORLD_MANIFEST = os.path.join("src", "assets", "world.json")
+
+
+def build_map_definitions(manifest_path=WORLD_MANIFEST):
+    # Definições dos mapas do jogo, lidas do manifesto do mundo (cada mapa é convertido no primeiro acesso).
+    # Ficam fora do Game para que ferramentas (ex: map_compiler.py) possam usá-las sem abrir uma janela.
+    return WorldManifest(manifest_path).map_definitions
@@ -0,0 +1,320 @@
+import hashlib
+import mmap
+import os
+import struct
+import zlib
+
+import numpy as np
+
+# Formato binário compilado dos mapas (.vmap), gerado pelo map_compiler.py a partir dos arquivos .map.
+# Layout (little-endian):
+#   cabeçalho   HEADER (ver abaixo)
+#   paleta      palette_count x (u8 tamanho + chave do tile em utf-8); o id do tile é o índice na paleta
+#   linhas      rows x u16 com o tamanho original de cada linha (os .map podem ter linhas de tamanhos diferentes)
+#   grade       rows x cols x u8 com o id de cada tile (EMPTY_TILE_ID além do fim da linha)
+#   bloqueio    rows x ceil(cols / 8) bytes, um bit por tile (1 = bloqueia o movimento)
+#   portais     portal_count x (PORTAL + u8 tamanho + chave do mapa de destino em utf-8), pela coluna/linha do tile
+#   fundo       u16 tamanho + caminho da imagem de fundo em utf-8
+# O cabeçalho guarda o definition_hash da definição do mapa no manifesto (tamanhos, portais, fundo) e das
+# chaves bloqueadoras; um .vmap compilado com outra definição é ignorado, mesmo sendo mais novo que o .map.
+MAGIC = b"VMAP"
+VERSION = 3
+HEADER = struct.Struct("<4sHHHHIIHHHB8s")
+PORTAL = struct.Struct("<HHii")
+EMPTY_TILE_ID = 255
+MAX_PALETTE_SIZE = 255 # O id 255 é reservado para EMPTY_TILE_ID
+COMPILED_MAP_EXTENSION = ".vmap"
+
+
+class MapCompileError(Exception):
+    pass
+
+
+def compiled_path_for(layout_file):
+    return os.path.splitext(layout_file)[0] + COMPILED_MAP_EXTENSION
+
+
+def definition_hash(map_info, blocking_tile_keys, tile_size):
+    # Hash (8 bytes) de tudo que, além do .map, define o conteúdo do .vmap ou o mapa em jogo
+    portals = sorted((tuple(tile), portal_data["target_map_key"], tuple(portal_data["target_player_pos"]))
+                     for tile, portal_data in map_info.get("portals", {}).items())
+    definition = (tile_size, sorted(blocking_tile_keys), map_info["pixel_width"], map_info["pixel_height"],
+                  map_info.get("repeat_x", 1), map_info.get("background_animation_frames") or 0,
+                  os.path.basename(map_info.get("background_image") or ""), portals)
+    return hashlib.blake2b(repr(definition).encode("utf-8"), digest_size=8).digest()
+
+
+def read_layout_rows(layout_file):
+    with open(layout_file, "r") as map_file:
+        return [line.strip().split() for line in map_file.readlines()]
+
+
+def compile_map(map_rows, map_info, blocking_tile_keys, tile_size, strict=False):
+    # Converte as linhas de um .map (lista de listas de chaves) e a definição do mapa em bytes .vmap.
+    # Retorna (bytes, avisos). Com strict=True, qualquer aviso vira MapCompileError.
+    warnings = []
+    rows = len(map_rows)
+    cols = max((len(row) for row in map_rows), default=0)
+    pattern_cols = map_info["pixel_width"] // tile_size
+
+    # Linhas irregulares são validadas aqui, uma vez, em vez de a cada consulta durante o jogo
+    for row_index, row in enumerate(map_rows):
+        if len(row) != pattern_cols:
+            warnings.append(f"row {row_index} has {len(row)} tiles, pattern width is {pattern_cols}")
+
+    palette = []
+    palette_ids = {}
+    for row in map_rows:
+        for tile_key in row:
+            if tile_key not in palette_ids:
+                if len(palette) >= MAX_PALETTE_SIZE:
+                    raise MapCompileError(f"more than {MAX_PALETTE_SIZE} distinct tile keys")
+                palette_ids[tile_key] = len(palette)
+                palette.append(tile_key)
+
+    # A tabela de portais é conferida com os tiles 'p' do layout: o jogo só dispara um portal sobre um 'p'
+    portals = map_info.get("portals", {})
+    for (portal_col, portal_row), portal_data in portals.items():
+        if not (0 <= portal_row < rows and 0 <= portal_col < len(map_rows[portal_row])):
+            warnings.append(f"portal {(portal_col, portal_row)} is outside the map layout")
+        elif map_rows[portal_row][portal_col] != 'p':
+            warnings.append(f"portal {(portal_col, portal_row)} is on tile '{map_rows[portal_row][portal_col]}', not 'p'")
+        if any(int(coord) != coord for coord in portal_data["target_player_pos"]):
+            raise MapCompileError(f"portal {(portal_col, portal_row)} target position must be whole pixels")
+    for row_index, row in enumerate(map_rows):
+        for col_index, tile_key in enumerate(row):
+            if tile_key == 'p' and (col_index, row_index) not in portals:
+                warnings.append(f"tile 'p' at {(col_index, row_index)} has no portal")
+
+    if strict and warnings:
+        raise MapCompileError("; ".join(warnings))
+
+    grid = bytearray([EMPTY_TILE_ID]) * (rows * cols)
+    mask_stride = (cols + 7) // 8
+    blocking_mask = bytearray(rows * mask_stride)
+    for row_index, row in enumerate(map_rows):
+        for col_index, tile_key in enumerate(row):
+            grid[row_index * cols + col_index] = palette_ids[tile_key]
+            if tile_key in blocking_tile_keys:
+                blocking_mask[row_index * mask_stride + col_index // 8] |= 1 << (col_index % 8)
+
+    out = bytearray(HEADER.pack(
+        MAGIC, VERSION, cols, rows, tile_size,
+        map_info["pixel_width"], map_info["pixel_height"],
+        map_info.get("repeat_x", 1), map_info.get("background_animation_frames") or 0,
+        len(portals), len(palette), definition_hash(map_info, blocking_tile_keys, tile_size)))
+    for tile_key in palette:
+        encoded = tile_key.encode("utf-8")
+        out += struct.pack("<B", len(encoded)) + encoded
+    out += struct.pack(f"<{rows}H", *(len(row) for row in map_rows))
+    out += grid
+    out += blocking_mask
+    for (portal_col, portal_row), portal_data in portals.items():
+        target_x, target_y = portal_data["target_player_pos"]
+        encoded = portal_data["target_map_key"].encode("utf-8")
+        out += PORTAL.pack(portal_col, portal_row, int(target_x), int(target_y)) + struct.pack("<B", len(encoded)) + encoded
+    encoded = map_info.get("background_image", "").encode("utf-8")
+    out += struct.pack("<H", len(encoded)) + encoded
+    return bytes(out), warnings
+
+
+class CompiledMap:
+    # Mapa .vmap carregado via mmap: a grade e a máscara de bloqueio são memoryviews sobre o arquivo,
+    # sem nenhuma alocação por tile.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as map_file:
+            self.mapped = mmap.mmap(map_file.fileno(), 0, access=mmap.ACCESS_READ)
+        data = memoryview(self.mapped)
+
+        (magic, version, self.cols, self.rows, self.tile_size, self.pixel_width, self.pixel_height,
+         self.repeat_x, self.background_animation_frames, portal_count, palette_count,
+         self.definition_hash) = HEADER.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise MapCompileError(f"{path} is not a version {VERSION} compiled map")
+        offset = HEADER.size
+
+        self.palette = []
+        for _ in range(palette_count):
+            length = data[offset]
+            self.palette.append(bytes(data[offset + 1:offset + 1 + length]).decode("utf-8"))
+            offset += 1 + length
+
+        self.row_lengths = struct.unpack_from(f"<{self.rows}H", data, offset)
+        offset += 2 * self.rows
+        self.grid = data[offset:offset + self.rows * self.cols]
+        offset += self.rows * self.cols
+        self.mask_stride = (self.cols + 7) // 8
+        self.blocking_mask = data[offset:offset + self.rows * self.mask_stride]
+        offset += self.rows * self.mask_stride
+
+        # Mesmo formato de map_info["portals"] (ver world.py): (coluna, linha) no padrão -> destino
+        self.portals = {}
+        for _ in range(portal_count):
+            portal_col, portal_row, target_x, target_y = PORTAL.unpack_from(data, offset)
+            offset += PORTAL.size
+            length = data[offset]
+            target_map_key = bytes(data[offset + 1:offset + 1 + length]).decode("utf-8")
+            offset += 1 + length
+            self.portals[(portal_col, portal_row)] = {"target_map_key": target_map_key, "target_player_pos": (target_x, target_y)}
+
+        length = struct.unpack_from("<H", data, offset)[0]
+        self.background_image = bytes(data[offset + 2:offset + 2 + length]).decode("utf-8")
+
+    def close(self):
+        # Libera as memoryviews antes de fechar o mmap
+        self.grid = self.blocking_mask = None
+        self.mapped.close()
+
+    def tile_key(self, col, row):
+        if 0 <= row < self.rows and 0 <= col < self.row_lengths[row]:
+            return self.palette[self.grid[row * self.cols + col]]
+        return None
+
+    def is_blocking(self, col, row):
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            return bool(self.blocking_mask[row * self.mask_stride + col // 8] & (1 << (col % 8)))
+        return False
+
+    def blocking_cells(self):
+        # (col, row) de cada tile bloqueador, na mesma ordem da leitura linha a linha do .map
+        for row in range(self.rows):
+            row_mask = self.blocking_mask[row * self.mask_stride:(row + 1) * self.mask_stride]
+            for col in range(self.row_lengths[row]):
+                if row_mask[col // 8] & (1 << (col % 8)):
+                    yield (col, row)
+
+    def to_rows(self):
+        # Linhas no mesmo formato do .map lido como texto (as strings vêm da paleta, não são duplicadas)
+        palette = self.palette
+        return [[palette[tile_id] for tile_id in self.grid[row * self.cols:row * self.cols + self.row_lengths[row]]]
+                for row in range(self.rows)]
+
+
+def load_compiled_map(layout_file, expected_hash=None):
+    # Retorna o CompiledMap do .vmap ao lado de layout_file, ou None se ele não existir ou estiver
+    # desatualizado em relação ao .map ou à definição do mapa (expected_hash, de definition_hash);
+    # nesse caso o jogo lê o texto normalmente.
+    compiled_file = compiled_path_for(layout_file)
+    if not os.path.exists(compiled_file):
+        return None
+    if os.path.exists(layout_file) and os.path.getmtime(layout_file) > os.path.getmtime(compiled_file):
+        print(f"Compiled map {compiled_file} is older than {layout_file}, reading the text layout")
+        return None
+    try:
+        compiled_map = CompiledMap(compiled_file)
+    except (MapCompileError, struct.error, ValueError) as e:
+        print(f"Error loading compiled map {compiled_file}: {e}")
+        return None
+    if expected_hash is not None and compiled_map.definition_hash != expected_hash:
+        print(f"Compiled map {compiled_file} was built from a different map definition, reading the text layout")
+        compiled_map.close()
+        return None
+    return compiled_map
+
+
+# Formato em chunks (.vchunks) para mundos grandes demais para ficar inteiros na memória. O mapa é
+# dividido em chunks de chunk_tiles x chunk_tiles tiles, cada um comprimido (zlib) separadamente,
+# e só os chunks perto da câmera são lidos (ver chunk_streamer.py). Layout (little-endian):
+#   cabeçalho   CHUNKED_HEADER (ver abaixo)
+#   paleta      palette_count x (u8 tamanho + chave do tile em utf-8 + u8 1 se o tile bloqueia)
+#   índice      chunks_y x chunks_x x CHUNK_ENTRY (offset, tamanho comprimido), linha a linha;
+#               tamanho 0 = chunk vazio (só EMPTY_TILE_ID), sem dados no arquivo
+#   chunks      ids dos tiles do chunk (linhas x colunas, u8) comprimidos; os chunks da borda
+#               direita/de baixo são menores quando o mapa não é múltiplo de chunk_tiles
+CHUNKED_MAGIC = b"VCHK"
+CHUNKED_VERSION = 1
+CHUNKED_HEADER = struct.Struct("<4sHIIHHB")
+CHUNK_ENTRY = struct.Struct("<QI")
+CHUNKED_MAP_EXTENSION = ".vchunks"
+
+
+def write_chunked_map(path, cols, rows, tile_size, palette, blocking_tile_keys, chunk_ids, chunk_tiles):
+    # Grava o mapa chunk a chunk: chunk_ids(first_col, first_row, width, height) devolve os ids (u8, linhas x colunas)
+    # de um chunk, então um mundo gerado ou convertido nunca precisa estar inteiro na memória. Retorna o tamanho em bytes.
+    if len(palette) > MAX_PALETTE_SIZE:
+        raise MapCompileError(f"more than {MAX_PALETTE_SIZE} distinct tile keys")
+    chunks_x = -(-cols // chunk_tiles)
+    chunks_y = -(-rows // chunk_tiles)
+    with open(path, "wb") as chunked_file:
+        chunked_file.write(CHUNKED_HEADER.pack(CHUNKED_MAGIC, CHUNKED_VERSION, cols, rows, tile_size, chunk_tiles, len(palette)))
+        for tile_key in palette:
+            encoded = tile_key.encode("utf-8")
+            chunked_file.write(struct.pack("<B", len(encoded)) + encoded + struct.pack("<B", tile_key in blocking_tile_keys))
+        index_offset = chunked_file.tell()
+        chunked_file.write(bytes(CHUNK_ENTRY.size * chunks_x * chunks_y)) # Preenchido no fim
+        index = []
+        for chunk_row in range(chunks_y):
+            for chunk_col in range(chunks_x):
+                first_col = chunk_col * chunk_tiles
+                first_row = chunk_row * chunk_tiles
+                width = min(chunk_tiles, cols - first_col)
+                height = min(chunk_tiles, rows - first_row)
+                tile_ids = np.ascontiguousarray(chunk_ids(first_col, first_row, width, height), dtype=np.uint8)
+                if tile_ids.shape != (height, width):
+                    raise MapCompileError(f"chunk {(chunk_col, chunk_row)} has shape {tile_ids.shape}, expected {(height, width)}")
+                if (tile_ids == EMPTY_TILE_ID).all():
+                    index.append(CHUNK_ENTRY.pack(0, 0))
+                    continue
+                payload = zlib.compress(tile_ids.tobytes())
+                index.append(CHUNK_ENTRY.pack(chunked_file.tell(), len(payload)))
+                chunked_file.write(payload)
+        size = chunked_file.tell()
+        chunked_file.seek(index_offset)
+        chunked_file.write(b"".join(index))
+    return size
+
+
+class ChunkedMap:
+    # Mapa .vchunks aberto via mmap: só o cabeçalho, a paleta e o índice são lidos na abertura;
+    # read_chunk descomprime um chunk e pode ser chamado de uma thread de trabalho.
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as chunked_file:
+            self.mapped = mmap.mmap(chunked_file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, version, self.cols, self.rows, self.tile_size, self.chunk_tiles,
+             palette_count) = CHUNKED_HEADER.unpack_from(self.mapped, 0)
+            if magic != CHUNKED_MAGIC or version != CHUNKED_VERSION:
+                raise MapCompileError(f"{path} is not a version {CHUNKED_VERSION} chunked map")
+            offset = CHUNKED_HEADER.size
+            self.palette = []
+            self.blocking_ids = np.zeros(256, dtype=bool) # id -> bloqueia
+            for tile_id in range(palette_count):
+                length = self.mapped[offset]
+                self.palette.append(self.mapped[offset + 1:offset + 1 + length].decode("utf-8"))
+                self.blocking_ids[tile_id] = bool(self.mapped[offset + 1 + length])
+                offset += 2 + length
+            self.chunks_x = -(-self.cols // self.chunk_tiles)
+            self.chunks_y = -(-self.rows // self.chunk_tiles)
+            self.index = [CHUNK_ENTRY.unpack_from(self.mapped, offset + entry * CHUNK_ENTRY.size)
+                          for entry in range(self.chunks_x * self.chunks_y)]
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            self.close()
+            raise MapCompileError(f"{path}: truncated or invalid chunked map") from e
+        except MapCompileError:
+            self.close()
+            raise
+        self.pixel_width = self.cols * self.tile_size
+        self.pixel_height = self.rows * self.tile_size
+
+    def close(self):
+        self.mapped.close()
+
+    def chunk_shape(self, chunk_col, chunk_row):
+        # (linhas, colunas) de tiles do chunk
+        return (min(self.chunk_tiles, self.rows - chunk_row * self.chunk_tiles),
+                min(self.chunk_tiles, self.cols - chunk_col * self.chunk_tiles))
+
+    def read_chunk(self, chunk_col, chunk_row):
+        # Ids dos tiles do chunk (u8, linhas x colunas)
+        offset, size = self.index[chunk_row * self.chunks_x + chunk_col]
+        shape = self.chunk_shape(chunk_col, chunk_row)
+        if size == 0:
+            return np.full(shape, EMPTY_TILE_ID, dtype=np.uint8)
+        try:
+            data = zlib.decompress(self.mapped[offset:offset + size])
+        except zlib.error as e:
+            raise MapCompileError(f"{self.path}: chunk {(chunk_col, chunk_row)} is corrupt") from e
+        return np.frombuffer(data, dtype=np.uint8).reshape(shape)
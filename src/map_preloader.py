@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+
+class MapPreloader:
+    # Prepara mapas em uma thread de trabalho para que a troca de mapa não trave um frame.
+    # build_function(map_key, player_pos) faz todo o trabalho pesado (leitura do disco, decodificação
+    # e escala das imagens, leitura do .map, colisão, chunks de tiles) e devolve um "bundle" pronto
+    # para ser aplicado pela thread principal.
+    def __init__(self, build_function):
+        self.build_function = build_function
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="map-preloader")
+        # map_key -> Future com o bundle. Um bundle pedido fica guardado até ser usado (no máximo um por mapa),
+        # assim o jogador pode se afastar e voltar ao portal sem refazer o trabalho.
+        self.pending = {}
+
+    def request(self, map_key, player_pos):
+        # Começa a preparar o mapa, se ainda não estiver sendo preparado
+        if map_key not in self.pending:
+            self.pending[map_key] = self.executor.submit(self.build_function, map_key, player_pos)
+
+    def is_requested(self, map_key):
+        return map_key in self.pending
+
+    def is_ready(self, map_key):
+        future = self.pending.get(map_key)
+        return future is not None and future.done()
+
+    def take(self, map_key):
+        # Retorna o bundle do mapa (esperando a thread terminar, se preciso) ou None se nunca foi pedido.
+        # Se a preparação falhou, retorna None e o chamador carrega o mapa de forma síncrona.
+        future = self.pending.pop(map_key, None)
+        if future is None:
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Error preloading map {map_key}: {e}")
+            return None
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        self.pending.clear()
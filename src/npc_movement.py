@@ -0,0 +1,300 @@
+import random
+import zlib
+
+import numpy as np
+
+from config import NPC_WALK_SPEED
+from pathfinding import FlowField
+
+
+class NpcAgent:
+    # Comportamento de um NPC que anda pelo mapa. O agente só decide para onde ir (plan/next_cell);
+    # o NpcMovement move todos os agentes juntos, de célula em célula, e chama o agente só quando
+    # ele chega a uma célula, termina uma pausa ou recebe o resultado de uma busca.
+    def __init__(self, key, npc, speed=NPC_WALK_SPEED, pause=(30, 120)):
+        self.key = key
+        self.npc = npc
+        self.speed = speed
+        self.pause = tuple(pause) # (mínimo, máximo) de ticks parado entre um trajeto e outro
+        # Semente fixa por NPC: a mesma entrada produz os mesmos trajetos (replay de um log de entrada)
+        self.rng = random.Random(zlib.crc32(key.encode("utf-8")))
+        self.home = (npc.map_x, npc.map_y) # Posição do manifesto, centro das andanças
+        self.idle_moving = False # Animação parado (ver Game.add_npc), restaurada nas pausas
+        self.slot = None # Posição nos arrays do NpcMovement
+        self.cell = None
+        self.target_cell = None
+        self.query = None
+        self.path = ()
+        self.path_position = 0
+        self.flow_field = None
+
+    def feet(self):
+        npc = self.npc
+        return (npc.map_x + npc.collision_box_offset_x + npc.collision_box_width // 2,
+                npc.map_y + npc.collision_box_offset_y + npc.collision_box_height // 2)
+
+    def home_cell(self, nav_grid):
+        npc = self.npc
+        return nav_grid.cell_at(self.home[0] + npc.collision_box_offset_x + npc.collision_box_width // 2,
+                                self.home[1] + npc.collision_box_offset_y + npc.collision_box_height // 2)
+
+    def reset(self):
+        # Esquece trajeto e consulta (o mapa mudou)
+        self.cell = None
+        self.target_cell = None
+        self.query = None
+        self.path = ()
+        self.path_position = 0
+        self.flow_field = None
+
+    def plan(self, movement):
+        # Pede o próximo trajeto ao PathfindingService; None para ficar parado mais um pouco
+        return None
+
+    def next_cell(self, movement):
+        if self.path_position < len(self.path):
+            self.path_position += 1
+            return self.path[self.path_position - 1]
+        return None
+
+    def pause_ticks(self):
+        return self.rng.randint(*self.pause)
+
+
+class WanderAgent(NpcAgent):
+    # Anda até células livres sorteadas a até 'radius' células de casa, com uma pausa entre os trajetos
+    def __init__(self, key, npc, radius=3, **options):
+        super().__init__(key, npc, **options)
+        self.radius = radius
+
+    def plan(self, movement):
+        nav_grid = movement.pathfinder.nav_grid
+        home_col, home_row = self.home_cell(nav_grid)
+        for _ in range(8):
+            goal = (home_col + self.rng.randint(-self.radius, self.radius),
+                    home_row + self.rng.randint(-self.radius, self.radius))
+            if goal != self.cell and nav_grid.is_walkable(goal):
+                return movement.pathfinder.find_path(self.cell, goal)
+        return None
+
+
+class PatrolAgent(NpcAgent):
+    # Percorre os pontos de patrulha (células) em ciclo; os trajetos se repetem e vêm do cache de caminhos
+    def __init__(self, key, npc, waypoints, **options):
+        options.setdefault("pause", (30, 30))
+        super().__init__(key, npc, **options)
+        self.waypoints = [tuple(waypoint) for waypoint in waypoints]
+        self.waypoint_index = 0
+
+    def plan(self, movement):
+        if not self.waypoints:
+            return None
+        goal = self.waypoints[self.waypoint_index % len(self.waypoints)]
+        self.waypoint_index += 1
+        return movement.pathfinder.find_path(self.cell, goal)
+
+
+class SeekAgent(NpcAgent):
+    # Segue o campo de fluxo até o jogador (goal "player") ou até uma célula fixa, parando a
+    # 'stop_distance' células dele. Todos os agentes com o mesmo destino usam o mesmo campo.
+    def __init__(self, key, npc, goal="player", stop_distance=1, **options):
+        options.setdefault("pause", (15, 30))
+        super().__init__(key, npc, **options)
+        self.goal = goal if goal == "player" else tuple(goal)
+        self.stop_distance = stop_distance
+
+    def goal_cell(self, movement):
+        return movement.player_cell if self.goal == "player" else self.goal
+
+    def plan(self, movement):
+        return movement.pathfinder.flow_field(self.goal_cell(movement))
+
+    def next_cell(self, movement):
+        # A cada célula confere se já há campo para a posição atual do destino; enquanto o novo campo
+        # não fica pronto, continua seguindo o anterior
+        query = movement.pathfinder.flow_field(self.goal_cell(movement))
+        if query.done and query.result is not None:
+            self.flow_field = query.result
+        if self.flow_field is None:
+            return None
+        distance = self.flow_field.distance_at(self.cell)
+        if 0 <= distance <= self.stop_distance:
+            return None
+        return self.flow_field.next_cell(self.cell)
+
+
+AGENT_TYPES = {"wander": WanderAgent, "patrol": PatrolAgent, "seek": SeekAgent}
+
+
+def build_agent(key, npc, behavior):
+    # Agente a partir da entrada "behavior" do manifesto, ex: {"type": "wander", "radius": 4}
+    options = dict(behavior)
+    agent_type = AGENT_TYPES.get(options.pop("type", None))
+    if agent_type is None:
+        raise ValueError(f"unknown behavior type {behavior.get('type')!r}")
+    return agent_type(key, npc, **options)
+
+
+class NpcMovement:
+    # Move os NPCs com comportamento (agentes) do mapa atual. Posição e alvo de todos ficam em arrays e
+    # cada tick anda todos de uma vez em direção ao centro da próxima célula do trajeto; o trabalho em
+    # Python por agente só acontece quando ele chega a uma célula ou precisa de um novo trajeto.
+    # Como os trajetos só passam por células livres vizinhas (sem diagonais) e a caixa de colisão dos
+    # pés cabe numa célula, andar de centro a centro nunca atravessa um tile bloqueador.
+    def __init__(self, entities, pathfinder):
+        self.entities = entities
+        self.pathfinder = pathfinder
+        self.agents = []
+        self.map_width = 0
+        self.map_height = 0
+        self.player_cell = None
+        self.planning = [] # Agentes esperando o resultado de uma busca
+        self._resize()
+
+    def _resize(self):
+        count = len(self.agents)
+        for slot, agent in enumerate(self.agents):
+            agent.slot = slot
+        self.indices = np.array([agent.npc.index for agent in self.agents], dtype=np.intp)
+        self.target_x = np.zeros(count, dtype=np.int64)
+        self.target_y = np.zeros(count, dtype=np.int64)
+        self.speed = np.array([agent.speed for agent in self.agents], dtype=np.int64)
+        self.walking = np.zeros(count, dtype=bool)
+        self.wait = np.zeros(count, dtype=np.int32) # Ticks de pausa restantes
+
+    def clear(self, map_width, map_height):
+        for agent in self.agents:
+            agent.reset()
+        self.agents = []
+        self.planning = []
+        self.map_width = map_width
+        self.map_height = map_height
+        self._resize()
+
+    def add(self, agent):
+        agent.reset()
+        agent.idle_moving = agent.npc.is_moving
+        self.agents.append(agent)
+        self._resize_keeping_state()
+        # Primeiro trajeto depois de uma pausa sorteada, para os agentes não pedirem caminho todos no mesmo tick
+        self.wait[-1] = 1 + agent.rng.randint(0, agent.pause[1])
+
+    def remove(self, agent):
+        if agent in self.agents:
+            slot = agent.slot
+            del self.agents[slot]
+            if agent in self.planning:
+                self.planning.remove(agent)
+            agent.reset()
+            self._resize_keeping_state(removed_slot=slot)
+
+    def _resize_keeping_state(self, removed_slot=None):
+        state = (self.target_x, self.target_y, self.walking, self.wait)
+        if removed_slot is not None:
+            state = tuple(np.delete(array, removed_slot) for array in state)
+        self._resize()
+        kept = min(len(state[0]), len(self.agents))
+        for array, old in zip((self.target_x, self.target_y, self.walking, self.wait), state):
+            array[:kept] = old[:kept]
+
+    def update(self, player):
+        # Um tick de simulação para todos os agentes
+        nav_grid = self.pathfinder.nav_grid
+        if not self.agents or nav_grid is None:
+            return
+        self.player_cell = nav_grid.cell_at(player.map_x + player.collision_box_offset_x + player.collision_box_width // 2,
+                                            player.map_y + player.collision_box_offset_y + player.collision_box_height // 2)
+
+        walking_slots = np.flatnonzero(self.walking)
+        if len(walking_slots):
+            entities = self.entities
+            indices = self.indices[walking_slots]
+            speed = self.speed[walking_slots]
+            target_x = self.target_x[walking_slots]
+            target_y = self.target_y[walking_slots]
+            x = entities.x[indices]
+            y = entities.y[indices]
+            new_x = x + np.clip(target_x - x, -speed, speed)
+            new_y = y + np.clip(target_y - y, -speed, speed)
+            entities.x[indices] = new_x
+            entities.y[indices] = new_y
+            entities.moved.update(indices[(new_x != x) | (new_y != y)].tolist())
+            for slot in walking_slots[(new_x == target_x) & (new_y == target_y)].tolist():
+                agent = self.agents[slot]
+                agent.cell = agent.target_cell
+                self._step(slot)
+
+        paused = self.wait > 0
+        self.wait[paused] -= 1
+        for slot in np.flatnonzero(paused & (self.wait == 0)).tolist():
+            self._plan(slot)
+
+        if self.planning:
+            planning = self.planning
+            self.planning = []
+            for agent in planning:
+                if agent.query.done:
+                    self._start(agent.slot, agent.query.result)
+                else:
+                    self.planning.append(agent)
+
+    def _plan(self, slot):
+        agent = self.agents[slot]
+        agent.cell = self.pathfinder.nav_grid.cell_at(*agent.feet())
+        agent.query = agent.plan(self)
+        if agent.query is None:
+            self._pause(slot)
+        elif agent.query.done:
+            self._start(slot, agent.query.result)
+        else:
+            self.planning.append(agent)
+
+    def _start(self, slot, result):
+        agent = self.agents[slot]
+        agent.query = None
+        if result is None: # Sem caminho (ou consulta cancelada): tenta de novo depois da pausa
+            self._pause(slot)
+            return
+        if isinstance(result, FlowField):
+            agent.flow_field = result
+            agent.path = ()
+        else:
+            agent.path = result
+        agent.path_position = 0
+        # Antes do trajeto vai ao centro da própria célula, para andar sempre de centro a centro
+        self._walk_to(slot, agent.cell)
+
+    def _step(self, slot):
+        agent = self.agents[slot]
+        next_cell = agent.next_cell(self)
+        if next_cell is None:
+            self._pause(slot)
+        else:
+            self._walk_to(slot, next_cell)
+
+    def _walk_to(self, slot, cell):
+        agent = self.agents[slot]
+        npc = agent.npc
+        center_x, center_y = self.pathfinder.nav_grid.cell_center(cell)
+        # Posição do sprite com os pés no centro da célula, dentro dos limites do mapa (como em Character.move)
+        target_x = max(0, min(center_x - npc.collision_box_offset_x - npc.collision_box_width // 2, self.map_width - npc.map_sprite_width))
+        target_y = max(0, min(center_y - npc.collision_box_offset_y - npc.collision_box_height // 2, self.map_height - npc.map_sprite_height))
+        dx = target_x - npc.map_x
+        dy = target_y - npc.map_y
+        if dx or dy:
+            if abs(dx) >= abs(dy):
+                npc.current_direction = "direita" if dx > 0 else "esquerda"
+            else:
+                npc.current_direction = "frente" if dy > 0 else "costas"
+        npc.is_moving = True
+        agent.target_cell = cell
+        self.target_x[slot] = target_x
+        self.target_y[slot] = target_y
+        self.walking[slot] = True
+
+    def _pause(self, slot):
+        agent = self.agents[slot]
+        agent.npc.current_direction = "frente"
+        agent.npc.is_moving = agent.idle_moving
+        self.walking[slot] = False
+        self.wait[slot] = max(1, agent.pause_ticks())
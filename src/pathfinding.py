@@ -0,0 +1,302 @@
+import heapq
+import time
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from config import PATHFINDING_BUDGET_MS, PATHFINDING_MAX_EXPANSIONS, PATH_CACHE_ENTRIES, FLOW_FIELD_CACHE_ENTRIES
+from profiler import profiler
+
+# Vizinhos (coluna, linha) de uma célula; só os 4 lados, então um caminho nunca corta a quina de um tile bloqueador
+NEIGHBOR_OFFSETS = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+
+class NavGrid:
+    # Grade de navegação de um mapa: uma célula por tile, cobrindo a largura efetiva (todas as repetições
+    # do padrão) e a altura do mapa. Uma célula é livre se nenhum tile bloqueador a ocupa, inclusive as
+    # áreas sem tiles (além do fim das linhas do .map), por onde os personagens também andam.
+    def __init__(self, walkable, cell_size):
+        self.walkable = walkable # bool (linhas, colunas)
+        self.rows, self.cols = walkable.shape
+        self.cell_size = cell_size
+        # O A* roda em Python puro: indexar uma lista é bem mais rápido que ler elemento a elemento do array
+        self.walkable_flat = walkable.ravel().tolist()
+
+    @classmethod
+    def from_tile_grid(cls, tile_grid, map_pixel_width, map_pixel_height):
+        cell_size = tile_grid.tile_size
+        cols = -(-map_pixel_width // cell_size)
+        rows = -(-map_pixel_height // cell_size)
+        blocked = np.zeros((rows, cols), dtype=bool)
+        tile_rows, tile_cols = np.nonzero(tile_grid.blocking)
+        inside_rows = tile_rows < rows
+        tile_rows, tile_cols = tile_rows[inside_rows], tile_cols[inside_rows]
+        for repeat_index in range(tile_grid.repeat_x):
+            left = tile_cols * cell_size + repeat_index * tile_grid.pattern_pixel_width
+            # Se a largura do padrão não for múltipla do tile, um tile repetido ocupa duas células
+            for grid_cols in (left // cell_size, (left + cell_size - 1) // cell_size):
+                inside = grid_cols < cols
+                blocked[tile_rows[inside], grid_cols[inside]] = True
+        return cls(~blocked, cell_size)
+
+    def contains(self, cell):
+        return 0 <= cell[0] < self.cols and 0 <= cell[1] < self.rows
+
+    def is_walkable(self, cell):
+        return self.contains(cell) and self.walkable_flat[cell[1] * self.cols + cell[0]]
+
+    def cell_at(self, x, y):
+        # Célula sob o ponto (x, y) do mundo, limitada à grade
+        return (min(max(int(x) // self.cell_size, 0), self.cols - 1),
+                min(max(int(y) // self.cell_size, 0), self.rows - 1))
+
+    def cell_center(self, cell):
+        half = self.cell_size // 2
+        return cell[0] * self.cell_size + half, cell[1] * self.cell_size + half
+
+
+class FlowField:
+    # Distâncias (em passos) de todas as células até um destino comum e, para cada célula, o vizinho
+    # que leva até ele. Qualquer número de agentes segue o mesmo campo sem nova busca.
+    def __init__(self, goal, distance, direction):
+        self.goal = goal
+        self.distance = distance # int32 (linhas, colunas), -1 onde o destino é inalcançável
+        self.direction = direction # int8, índice em NEIGHBOR_OFFSETS; -1 no destino e nas inalcançáveis
+
+    def next_cell(self, cell):
+        # Próxima célula a partir de 'cell' rumo ao destino (None no destino ou se não há caminho)
+        col, row = cell
+        if not (0 <= row < self.direction.shape[0] and 0 <= col < self.direction.shape[1]):
+            return None
+        direction = self.direction[row, col]
+        if direction >= 0:
+            offset_col, offset_row = NEIGHBOR_OFFSETS[direction]
+            return col + offset_col, row + offset_row
+        if self.distance[row, col] >= 0:
+            return None # Já no destino
+        # Célula fora do campo (ex: um NPC posto sobre um tile bloqueador): sai pelo vizinho mais perto do destino
+        best_cell = None
+        best_distance = None
+        for offset_col, offset_row in NEIGHBOR_OFFSETS:
+            neighbor_col = col + offset_col
+            neighbor_row = row + offset_row
+            if 0 <= neighbor_row < self.distance.shape[0] and 0 <= neighbor_col < self.distance.shape[1]:
+                distance = self.distance[neighbor_row, neighbor_col]
+                if distance >= 0 and (best_distance is None or distance < best_distance):
+                    best_cell, best_distance = (neighbor_col, neighbor_row), distance
+        return best_cell
+
+    def distance_at(self, cell):
+        return int(self.distance[cell[1], cell[0]])
+
+
+def astar_search(nav_grid, start, goal, max_expansions=PATHFINDING_MAX_EXPANSIONS):
+    # Gerador: cede o controle a cada nó expandido (para o PathfindingService dividir a busca entre frames)
+    # e termina retornando as células do caminho, sem a inicial e com o destino, ou None se não houver
+    # caminho (ou se a busca passar de max_expansions nós).
+    if not nav_grid.is_walkable(goal) or not nav_grid.contains(start):
+        return None
+    cols = nav_grid.cols
+    rows = nav_grid.rows
+    walkable = nav_grid.walkable_flat
+    goal_col, goal_row = goal
+    start_index = start[1] * cols + start[0]
+    goal_index = goal_row * cols + goal_col
+
+    came_from = {start_index: -1}
+    cost = {start_index: 0}
+    # (custo + heurística, -custo, índice): no empate vai primeiro o nó mais perto do destino
+    heap = [(abs(start[0] - goal_col) + abs(start[1] - goal_row), 0, start_index)]
+    expansions = 0
+    while heap:
+        _, negative_cost, index = heapq.heappop(heap)
+        if index == goal_index:
+            path = []
+            while index != start_index:
+                path.append(divmod(index, cols)[::-1])
+                index = came_from[index]
+            path.reverse()
+            return tuple(path)
+        path_cost = -negative_cost
+        if path_cost > cost[index]:
+            continue # Entrada velha da heap: o nó já foi alcançado por um caminho mais curto
+        expansions += 1
+        if expansions > max_expansions:
+            return None
+        row, col = divmod(index, cols)
+        next_cost = path_cost + 1
+        for offset_col, offset_row in NEIGHBOR_OFFSETS:
+            neighbor_col = col + offset_col
+            neighbor_row = row + offset_row
+            if not (0 <= neighbor_col < cols and 0 <= neighbor_row < rows):
+                continue
+            neighbor = neighbor_row * cols + neighbor_col
+            if not walkable[neighbor] or next_cost >= cost.get(neighbor, next_cost + 1):
+                continue
+            cost[neighbor] = next_cost
+            came_from[neighbor] = index
+            heuristic = abs(neighbor_col - goal_col) + abs(neighbor_row - goal_row)
+            heapq.heappush(heap, (next_cost + heuristic, -next_cost, neighbor))
+        yield
+    return None
+
+
+def flow_field_search(nav_grid, goal):
+    # Gerador: busca em largura a partir do destino, uma frente de onda (todas as células à mesma
+    # distância) por passo, com operações sobre a grade inteira; termina retornando o FlowField.
+    walkable = nav_grid.walkable
+    distance = np.full(walkable.shape, -1, dtype=np.int32)
+    if not nav_grid.contains(goal):
+        return FlowField(goal, distance, np.full(walkable.shape, -1, dtype=np.int8))
+    goal_col, goal_row = goal
+    distance[goal_row, goal_col] = 0
+    frontier = np.zeros(walkable.shape, dtype=bool)
+    frontier[goal_row, goal_col] = True
+    step = 0
+    while True:
+        reached = np.zeros(walkable.shape, dtype=bool)
+        reached[:, 1:] |= frontier[:, :-1]
+        reached[:, :-1] |= frontier[:, 1:]
+        reached[1:, :] |= frontier[:-1, :]
+        reached[:-1, :] |= frontier[1:, :]
+        frontier = reached & walkable & (distance < 0)
+        if not frontier.any():
+            break
+        step += 1
+        distance[frontier] = step
+        yield
+
+    # Cada célula aponta para o primeiro vizinho (na ordem de NEIGHBOR_OFFSETS) um passo mais perto do destino
+    direction = np.full(walkable.shape, -1, dtype=np.int8)
+    padded = np.pad(distance, 1, constant_values=-1)
+    rows, cols = walkable.shape
+    for direction_index, (offset_col, offset_row) in enumerate(NEIGHBOR_OFFSETS):
+        neighbor_distance = padded[1 + offset_row:1 + offset_row + rows, 1 + offset_col:1 + offset_col + cols]
+        closer = (distance > 0) & (neighbor_distance == distance - 1) & (direction < 0)
+        direction[closer] = direction_index
+    return FlowField(goal, distance, direction)
+
+
+class PathQuery:
+    # Consulta de caminho em andamento. O agente guarda a consulta e confere 'done' nos ticks seguintes;
+    # 'result' é a tupla de células (A*), o FlowField ou None (sem caminho ou consulta cancelada).
+    __slots__ = ("key", "job", "done", "result", "cancelled")
+
+    def __init__(self, key, job=None):
+        self.key = key
+        self.job = job
+        self.done = job is None
+        self.result = None
+        self.cancelled = False
+
+    def finish(self, result):
+        self.job = None
+        self.done = True
+        self.result = result
+
+    def cancel(self):
+        self.finish(None)
+        self.cancelled = True
+
+
+class PathfindingService:
+    # Caminhos para os NPCs do mapa atual: A* para um agente (find_path) e campos de fluxo para destinos
+    # comuns, como o jogador ou um portal (flow_field). Os resultados ficam em caches LRU do mapa e
+    # consultas iguais em andamento são compartilhadas. As buscas rodam em process(), uma vez por frame,
+    # até gastar o orçamento; o que sobrar continua no frame seguinte, na mesma ordem.
+    def __init__(self, budget_ms=PATHFINDING_BUDGET_MS, work_budget=None,
+                 path_cache_entries=PATH_CACHE_ENTRIES, flow_field_cache_entries=FLOW_FIELD_CACHE_ENTRIES):
+        self.budget_ms = budget_ms
+        self.work_budget = work_budget # Passos de busca por frame; quando definido substitui budget_ms
+        self.path_cache_entries = path_cache_entries
+        self.flow_field_cache_entries = flow_field_cache_entries
+        self.map_key = None
+        self.nav_grid = None
+        self.paths = OrderedDict() # (início, destino) -> tupla de células ou None
+        self.flow_fields = OrderedDict() # destino -> FlowField
+        self.pending = {} # chave -> PathQuery ainda na fila
+        self.queue = deque()
+        self.hits = 0
+        self.misses = 0
+
+    def set_map(self, map_key, nav_grid):
+        # Caminhos e campos calculados valem só para a grade em que foram buscados: trocar de mapa
+        # (ou recarregar o mesmo) descarta os caches e cancela as consultas pendentes
+        if nav_grid is self.nav_grid:
+            return
+        for query in self.queue:
+            query.cancel()
+        self.queue.clear()
+        self.pending.clear()
+        self.paths.clear()
+        self.flow_fields.clear()
+        self.map_key = map_key
+        self.nav_grid = nav_grid
+
+    def _cache_for(self, key):
+        if key[0] == "path":
+            return self.paths, self.path_cache_entries
+        return self.flow_fields, self.flow_field_cache_entries
+
+    def _request(self, key, make_job):
+        cache, _ = self._cache_for(key)
+        if key in cache:
+            self.hits += 1
+            cache.move_to_end(key)
+            query = PathQuery(key)
+            query.result = cache[key]
+            return query
+        query = self.pending.get(key)
+        if query is None:
+            self.misses += 1
+            query = self.pending[key] = PathQuery(key, make_job())
+            self.queue.append(query)
+        return query
+
+    def find_path(self, start, goal):
+        # Caminho A* de 'start' até 'goal' (células); start == goal resulta num caminho vazio
+        key = ("path", start, goal)
+        if self.nav_grid is None:
+            return PathQuery(key)
+        return self._request(key, lambda: astar_search(self.nav_grid, start, goal))
+
+    def flow_field(self, goal):
+        # Campo de fluxo até 'goal', compartilhado por todos os agentes que vão para o mesmo lugar
+        key = ("flow", goal)
+        if self.nav_grid is None:
+            return PathQuery(key)
+        return self._request(key, lambda: flow_field_search(self.nav_grid, goal))
+
+    def process(self):
+        # Avança as buscas da fila até esgotar o orçamento do frame (tempo ou passos); uma busca
+        # interrompida continua de onde parou no próximo process()
+        work_left = self.work_budget
+        deadline = time.perf_counter() + self.budget_ms / 1000
+        steps = 0
+        completed = 0
+        while self.queue:
+            query = self.queue[0]
+            try:
+                next(query.job)
+            except StopIteration as finished:
+                self.queue.popleft()
+                del self.pending[query.key]
+                cache, max_entries = self._cache_for(query.key)
+                cache[query.key] = finished.value
+                while len(cache) > max_entries:
+                    cache.popitem(last=False)
+                query.finish(finished.value)
+                completed += 1
+            steps += 1
+            if work_left is not None:
+                if steps >= work_left:
+                    break
+            elif time.perf_counter() >= deadline:
+                break
+        profiler.count("path_steps", steps)
+        profiler.count("paths_completed", completed)
+        profiler.count("paths_queued", len(self.queue))
+
+    def stats(self):
+        return {"entries": len(self.paths) + len(self.flow_fields), "paths": len(self.paths),
+                "flow_fields": len(self.flow_fields), "queued": len(self.queue), "hits": self.hits, "misses": self.misses}
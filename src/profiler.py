@@ -0,0 +1,217 @@
+import csv
+import json
+import math
+import os
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import pygame
+
+from config import PROFILER_WINDOW, PROFILE_EXPORT_DIR, WHITE
+
+
+def percentile(values, percent):
+    # Percentil pelo método do posto mais próximo (values não precisa estar ordenado)
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class FrameProfiler:
+    # Instrumentação do loop do jogo: tempo por fase (events, update, draw, ...), tempo de frame com
+    # percentis em janela deslizante, contadores por frame (blits, scales, ...) e estatísticas dos caches.
+    # Os contadores são incrementados direto nos pontos quentes com profiler.count("blit").
+    def __init__(self, window=PROFILER_WINDOW):
+        self.window = window
+        self.frame_times = deque(maxlen=window) # ms
+        self.phase_times = {} # fase -> deque de ms
+        self.counter_history = {} # contador -> deque de valores por frame
+        self.history = deque(maxlen=window) # um registro por frame, para exportação
+        self.cache_providers = {} # nome -> função que devolve um dict de estatísticas
+        self.frame_number = 0
+        self.frame_start = None
+        self.current_phases = {}
+        self.counters = {}
+
+    def register_cache(self, name, stats_function):
+        self.cache_providers[name] = stats_function
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.current_phases = {}
+        self.counters = {}
+
+    def end_frame(self):
+        if self.frame_start is None:
+            return
+        frame_ms = (time.perf_counter() - self.frame_start) * 1000
+        self.frame_start = None
+        self.frame_number += 1
+        self.frame_times.append(frame_ms)
+        for name, elapsed in self.current_phases.items():
+            self.phase_times.setdefault(name, deque(maxlen=self.window)).append(elapsed)
+        # Contadores que não apareceram neste frame entram como zero, para as médias ficarem corretas
+        for name in set(self.counter_history) | set(self.counters):
+            self.counter_history.setdefault(name, deque(maxlen=self.window)).append(self.counters.get(name, 0))
+        record = {"frame": self.frame_number, "frame_ms": frame_ms}
+        record.update({f"{name}_ms": elapsed for name, elapsed in self.current_phases.items()})
+        record.update(self.counters)
+        self.history.append(record)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.current_phases[name] = self.current_phases.get(name, 0.0) + elapsed
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        # Zera as medições, mantendo os caches registrados
+        cache_providers = self.cache_providers
+        self.__init__(self.window)
+        self.cache_providers = cache_providers
+
+    def summary(self):
+        frame_times = list(self.frame_times)
+        average_ms = sum(frame_times) / len(frame_times) if frame_times else 0.0
+        return {
+            "frames": self.frame_number,
+            "fps": 1000 / average_ms if average_ms > 0 else 0.0,
+            "frame_ms": {
+                "mean": average_ms,
+                "p50": percentile(frame_times, 50),
+                "p95": percentile(frame_times, 95),
+                "p99": percentile(frame_times, 99),
+                "max": max(frame_times) if frame_times else 0.0,
+            },
+            "phases_ms": {
+                name: {"mean": sum(times) / len(times), "p95": percentile(list(times), 95)}
+                for name, times in self.phase_times.items() if times
+            },
+            "counters_per_frame": {
+                name: sum(values) / len(values) for name, values in self.counter_history.items() if values
+            },
+            "caches": {name: stats_function() for name, stats_function in self.cache_providers.items()},
+        }
+
+    def export_json(self, path):
+        with open(path, "w") as export_file:
+            json.dump({"summary": self.summary(), "frames": list(self.history)}, export_file, indent=2)
+        return path
+
+    def export_csv(self, path):
+        columns = []
+        for record in self.history:
+            for column in record:
+                if column not in columns:
+                    columns.append(column)
+        with open(path, "w", newline="") as export_file:
+            writer = csv.DictWriter(export_file, fieldnames=columns, restval=0)
+            writer.writeheader()
+            writer.writerows(self.history)
+        return path
+
+    def export(self, directory=PROFILE_EXPORT_DIR):
+        # Exporta JSON e CSV com um nome baseado no horário; retorna os caminhos gerados
+        os.makedirs(directory, exist_ok=True)
+        base_name = os.path.join(directory, time.strftime("profile_%Y%m%d_%H%M%S"))
+        return self.export_json(base_name + ".json"), self.export_csv(base_name + ".csv")
+
+
+class ProfilerOverlay:
+    # Painel no canto da tela com o resumo do profiler. O texto é renderizado só algumas vezes
+    # por segundo, para o próprio overlay não pesar no tempo de frame que ele está medindo.
+    def __init__(self, profiler, font, refresh_interval_ms=250):
+        self.profiler = profiler
+        self.font = font
+        self.refresh_interval_ms = refresh_interval_ms
+        self.visible = False
+        self.panel = None
+        self.last_refresh = 0
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.panel = None
+
+    def _lines(self):
+        summary = self.profiler.summary()
+        frame_ms = summary["frame_ms"]
+        lines = [
+            f"FPS {summary['fps']:.1f}",
+            f"frame p50 {frame_ms['p50']:.2f} p95 {frame_ms['p95']:.2f} p99 {frame_ms['p99']:.2f} ms",
+        ]
+        for name, times in summary["phases_ms"].items():
+            lines.append(f"{name}: {times['mean']:.2f} ms (p95 {times['p95']:.2f})")
+        for name, value in sorted(summary["counters_per_frame"].items()):
+            lines.append(f"{name}/frame: {value:.1f}")
+        for name, stats in summary["caches"].items():
+            lines.append(f"{name}: {stats.get('entries', 0)} entries, {stats.get('bytes', 0) // 1024} KB, "
+                         f"hits {stats.get('hits', 0)} misses {stats.get('misses', 0)}")
+        return lines
+
+    def _render_panel(self):
+        line_surfaces = [self.font.render(line, True, WHITE) for line in self._lines()]
+        width = max(surface.get_width() for surface in line_surfaces) + 16
+        height = sum(surface.get_height() for surface in line_surfaces) + 16
+        panel = pygame.Surface((width, height), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 170))
+        y = 8
+        for surface in line_surfaces:
+            panel.blit(surface, (8, y))
+            y += surface.get_height()
+        return panel
+
+    def refresh(self):
+        # Renderiza o painel de novo se o intervalo já passou
+        if not self.visible:
+            return
+        now = pygame.time.get_ticks()
+        if self.panel is None or now - self.last_refresh >= self.refresh_interval_ms:
+            self.panel = self._render_panel()
+            self.last_refresh = now
+
+    def rect(self, screen):
+        # Área ocupada pelo painel na tela (None se o overlay está escondido)
+        if not self.visible or self.panel is None:
+            return None
+        return self.panel.get_rect(topright=(screen.get_width() - 10, 40))
+
+    def draw(self, screen):
+        if not self.visible:
+            return
+        self.refresh()
+        screen.blit(self.panel, self.rect(screen))
+
+
+class StartupTimer:
+    # Tempo de cada etapa da inicialização (imports, display, assets, mapa, ...), medido entre marcas
+    # sucessivas. Etapas com o mesmo nome (ex: cada tile carregado) somam no mesmo total.
+    def __init__(self, started_at=None):
+        self.started_at = started_at if started_at is not None else time.perf_counter()
+        self.last_mark = self.started_at
+        self.phases = {} # etapa -> segundos
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases[name] = self.phases.get(name, 0.0) + now - self.last_mark
+        self.last_mark = now
+
+    def total(self):
+        return self.last_mark - self.started_at
+
+    def report(self):
+        lines = [f"Startup: {self.total() * 1000:.1f} ms"]
+        for name, seconds in self.phases.items():
+            lines.append(f"  {name:<16} {seconds * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+profiler = FrameProfiler()
@@ -0,0 +1,75 @@
+import argparse
+import os
+import sys
+import time
+
+# Roda sem janela e sem som: precisa estar definido antes de importar o pygame
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+from game import Game
+from input_log import InputReplay, InputLogError, state_digest
+from profiler import profiler
+
+# Reproduz um log de entrada gravado com `python src/main.py --record sessao.vinp`, sem janela e sem
+# limite de FPS, e confere o digest do estado final com o gravado no log.
+# Uso, a partir da raiz do projeto:
+#   python src/replay.py sessao.vinp            # reproduz desenhando cada frame (traço de desempenho)
+#   python src/replay.py sessao.vinp --no-draw  # só a simulação (checagem rápida de correção)
+
+
+def replay(path, draw=True):
+    replay_input = InputReplay(path)
+    game = Game()
+    game.finish_loading()
+    game.fps_cap = 0
+    replay_input.attach(game)
+    if not draw:
+        game.draw = lambda: None
+
+    profiler.window = max(1, len(replay_input.frames))
+    profiler.reset()
+    start = time.perf_counter()
+    while game.running and not replay_input.finished:
+        game.run_frame()
+    elapsed = time.perf_counter() - start
+    game.shutdown()
+    return replay_input, game, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a recorded input log headlessly and check the final state")
+    parser.add_argument("log", help="input log recorded with main.py --record")
+    parser.add_argument("--no-draw", action="store_true", help="skip rendering (simulation only)")
+    args = parser.parse_args(argv)
+
+    try:
+        replay_input, game, elapsed = replay(args.log, draw=not args.no_draw)
+    except (OSError, InputLogError) as e:
+        print(f"Error: {e}")
+        return 1
+
+    frames = replay_input.frame
+    summary = profiler.summary()
+    phases = ", ".join(f"{phase} {times['mean']:.2f}" for phase, times in summary["phases_ms"].items())
+    print(f"{frames} frames in {elapsed:.2f} s ({frames / elapsed if elapsed > 0 else 0.0:.1f} fps) | "
+          f"frame p50 {summary['frame_ms']['p50']:.2f} p95 {summary['frame_ms']['p95']:.2f} ms")
+    print(f"phases (mean ms): {phases}")
+
+    digest = state_digest(game)
+    print(f"final state {digest.hex()} (map {game.current_map_key}, player {game.player.map_x},{game.player.map_y})")
+    if frames < len(replay_input.frames):
+        print(f"MISMATCH: game quit after {frames} of {len(replay_input.frames)} frames")
+        return 1
+    if replay_input.expected_digest is None:
+        print("log has no final state (recording was not closed)")
+        return 0
+    if digest != replay_input.expected_digest:
+        print(f"MISMATCH: recorded final state {replay_input.expected_digest.hex()}")
+        return 1
+    print("final state matches the recording")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+import os
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from operator import attrgetter
+
+import numpy as np
+
+from config import AUTOSAVE_SECONDS, SAVE_DELTAS_PER_FULL
+
+# Snapshots binários do estado do jogo (.vsav), gravados por SaveFile.
+#
+# Cabeçalho: magic b"VSAV", versão (u16).
+# Registros, um depois do outro: tipo (u8, RECORD_FULL ou RECORD_DELTA), tamanho do payload (u32),
+# payload e crc32 do payload (u32). Um registro completo tem todas as seções do estado; um delta só
+# as que mudaram desde o registro anterior. A leitura aplica os registros em ordem; um registro final
+# incompleto ou com crc errado (jogo fechado no meio da gravação) é ignorado, e o estado fica o do
+# último registro íntegro. Depois de SAVE_DELTAS_PER_FULL deltas o arquivo é reescrito com um só
+# registro completo.
+#
+# Payload: seções com tag (u8) + dados; str = u8 tamanho + utf-8
+#   SECTION_MAP      chave do mapa atual (str)
+#   SECTION_STATE    game_state (str)
+#   SECTION_PLAYER   x (i32), y (i32), direção (str)
+#   SECTION_PORTAL   ativando (u8), ticks restantes (i32), mapa de destino (str, vazio = nenhum), x (i32), y (i32)
+#   SECTION_DIALOGUE NPC da história aberta (str, vazio = nenhum), cena (i32), dialogue_exit_active (u8)
+#   SECTION_STORY    chave do personagem (str), cena atual (i32); uma por história
+#   SECTION_NPC      chave do NPC (str), x (i32), y (i32); uma por NPC
+#   SECTION_FLAG     nome da flag de diálogo (str), valor (u8); uma por flag já ligada ou desligada.
+#                    Saves sem ela (anteriores às flags) carregam sem nenhuma flag.
+
+MAGIC = b"VSAV"
+VERSION = 1
+HEADER = struct.Struct("<4sH")
+RECORD = struct.Struct("<BI")
+CRC = struct.Struct("<I")
+RECORD_FULL = 1
+RECORD_DELTA = 2
+
+SECTION_MAP = 1
+SECTION_STATE = 2
+SECTION_PLAYER = 3
+SECTION_PORTAL = 4
+SECTION_DIALOGUE = 5
+SECTION_STORY = 6
+SECTION_NPC = 7
+SECTION_FLAG = 8
+
+POSITION = struct.Struct("<ii")
+PORTAL = struct.Struct("<Bi")
+SCENE = struct.Struct("<i")
+FLAG = struct.Struct("<B")
+
+# Seções com um valor só, na ordem do snapshot; histórias, NPCs e flags são uma seção por chave
+SINGLE_SECTIONS = (("map", SECTION_MAP), ("state", SECTION_STATE), ("player", SECTION_PLAYER),
+                   ("portal", SECTION_PORTAL), ("dialogue", SECTION_DIALOGUE))
+KEYED_SECTIONS = (("stories", SECTION_STORY), ("npcs", SECTION_NPC), ("flags", SECTION_FLAG))
+
+
+class SaveError(Exception):
+    pass
+
+
+def pack_str(text):
+    encoded = text.encode("utf-8")
+    return FLAG.pack(len(encoded)) + encoded
+
+
+def unpack_str(data, offset):
+    length = data[offset]
+    return data[offset + 1:offset + 1 + length].decode("utf-8"), offset + 1 + length
+
+
+def capture_state(game):
+    # Estado do jogo como valores simples (tuplas, strings, dicts), sem referências a objetos do jogo.
+    # É a única parte do salvamento que roda na thread principal.
+    player = game.player
+    portal_target = game.portal_target_info or {}
+    target_x, target_y = portal_target.get("target_player_pos", (0, 0))
+    open_story = game.current_dialogue_story
+    npcs = {key: character for key, character in game.characters.items() if character is not player}
+    stories = {key: character.story for key, character in npcs.items() if character.story}
+    dialogue_key = next((key for key, story in stories.items() if story is open_story), "")
+    entities = game.entities
+    npc_indices = np.fromiter(map(attrgetter("index"), npcs.values()), dtype=np.intp, count=len(npcs))
+    npc_positions = zip(entities.x[npc_indices].tolist(), entities.y[npc_indices].tolist())
+    return {
+        "map": game.current_map_key,
+        "state": game.game_state,
+        "player": (int(player.map_x), int(player.map_y), player.current_direction),
+        "portal": (game.portal_is_activating, game.portal_activation_timer,
+                   portal_target.get("target_map_key", ""), int(target_x), int(target_y)),
+        "dialogue": (dialogue_key, open_story.current_scene if open_story else 0, game.dialogue_exit_active),
+        "stories": {key: story.current_scene for key, story in stories.items()},
+        "npcs": dict(zip(npcs, npc_positions)),
+        "flags": dict(game.dialogue_flags),
+    }
+
+
+def diff_state(previous, current):
+    # Só o que mudou de 'previous' para 'current' (mesmo formato de capture_state); None = tudo
+    if previous is None:
+        return current
+    changes = {name: current[name] for name, _ in SINGLE_SECTIONS if current[name] != previous[name]}
+    for name, _ in KEYED_SECTIONS:
+        previous_values = previous[name]
+        changed = {key: value for key, value in current[name].items() if previous_values.get(key) != value}
+        if changed:
+            changes[name] = changed
+    return changes
+
+
+def encode_sections(state):
+    # Payload com as seções presentes em 'state' (um snapshot completo ou um delta de diff_state)
+    out = bytearray()
+    if "map" in state:
+        out += FLAG.pack(SECTION_MAP) + pack_str(state["map"])
+    if "state" in state:
+        out += FLAG.pack(SECTION_STATE) + pack_str(state["state"])
+    if "player" in state:
+        x, y, direction = state["player"]
+        out += FLAG.pack(SECTION_PLAYER) + POSITION.pack(x, y) + pack_str(direction)
+    if "portal" in state:
+        activating, timer, target_map, target_x, target_y = state["portal"]
+        out += FLAG.pack(SECTION_PORTAL) + PORTAL.pack(activating, timer) + pack_str(target_map) + POSITION.pack(target_x, target_y)
+    if "dialogue" in state:
+        story_key, scene, exit_active = state["dialogue"]
+        out += FLAG.pack(SECTION_DIALOGUE) + pack_str(story_key) + SCENE.pack(scene) + FLAG.pack(exit_active)
+    for key, scene in state.get("stories", {}).items():
+        out += FLAG.pack(SECTION_STORY) + pack_str(key) + SCENE.pack(scene)
+    for key, (x, y) in state.get("npcs", {}).items():
+        out += FLAG.pack(SECTION_NPC) + pack_str(key) + POSITION.pack(x, y)
+    for flag, value in state.get("flags", {}).items():
+        out += FLAG.pack(SECTION_FLAG) + pack_str(flag) + FLAG.pack(value)
+    return bytes(out)
+
+
+def encode_record(kind, state):
+    payload = encode_sections(state)
+    return RECORD.pack(kind, len(payload)) + payload + CRC.pack(zlib.crc32(payload))
+
+
+def decode_sections(payload, state):
+    # Aplica as seções do payload sobre 'state' (dict no formato de capture_state)
+    offset = 0
+    while offset < len(payload):
+        tag = payload[offset]
+        offset += 1
+        if tag == SECTION_MAP:
+            state["map"], offset = unpack_str(payload, offset)
+        elif tag == SECTION_STATE:
+            state["state"], offset = unpack_str(payload, offset)
+        elif tag == SECTION_PLAYER:
+            x, y = POSITION.unpack_from(payload, offset)
+            direction, offset = unpack_str(payload, offset + POSITION.size)
+            state["player"] = (x, y, direction)
+        elif tag == SECTION_PORTAL:
+            activating, timer = PORTAL.unpack_from(payload, offset)
+            target_map, offset = unpack_str(payload, offset + PORTAL.size)
+            target_x, target_y = POSITION.unpack_from(payload, offset)
+            offset += POSITION.size
+            state["portal"] = (bool(activating), timer, target_map, target_x, target_y)
+        elif tag == SECTION_DIALOGUE:
+            story_key, offset = unpack_str(payload, offset)
+            scene, = SCENE.unpack_from(payload, offset)
+            exit_active = payload[offset + SCENE.size]
+            offset += SCENE.size + 1
+            state["dialogue"] = (story_key, scene, bool(exit_active))
+        elif tag == SECTION_STORY:
+            key, offset = unpack_str(payload, offset)
+            state["stories"][key], = SCENE.unpack_from(payload, offset)
+            offset += SCENE.size
+        elif tag == SECTION_NPC:
+            key, offset = unpack_str(payload, offset)
+            state["npcs"][key] = POSITION.unpack_from(payload, offset)
+            offset += POSITION.size
+        elif tag == SECTION_FLAG:
+            flag, offset = unpack_str(payload, offset)
+            state["flags"][flag] = bool(payload[offset])
+            offset += 1
+        else:
+            raise SaveError(f"unknown section {tag} at byte {offset - 1}")
+
+
+def read_save(path):
+    # (estado salvo no formato de capture_state depois de aplicar todos os registros íntegros, em ordem;
+    # True se a leitura parou antes do fim do arquivo, num registro incompleto ou com crc errado)
+    with open(path, "rb") as save_file:
+        data = save_file.read()
+    if len(data) < HEADER.size or data[:4] != MAGIC:
+        raise SaveError(f"{path}: not a save file")
+    magic, version = HEADER.unpack_from(data, 0)
+    if version != VERSION:
+        raise SaveError(f"{path}: unsupported version {version}")
+    state = None
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        kind, size = RECORD.unpack_from(data, offset)
+        payload_start = offset + RECORD.size
+        payload_end = payload_start + size
+        if payload_end + CRC.size > len(data):
+            break # Gravação interrompida
+        payload = data[payload_start:payload_end]
+        if CRC.unpack_from(data, payload_end)[0] != zlib.crc32(payload):
+            break
+        if kind == RECORD_FULL:
+            state = {"stories": {}, "npcs": {}, "flags": {}}
+        elif kind != RECORD_DELTA or state is None:
+            raise SaveError(f"{path}: unexpected record type {kind} at byte {offset}")
+        try:
+            decode_sections(payload, state)
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            raise SaveError(f"{path}: invalid record at byte {offset}") from e
+        offset = payload_end + CRC.size
+    if state is None or any(name not in state for name, _ in SINGLE_SECTIONS):
+        raise SaveError(f"{path}: no complete snapshot")
+    return state, offset < len(data)
+
+
+def check_state(game, state):
+    # Um save de outra versão do mundo (mapa, NPC ou história que não existe mais) vira SaveError antes
+    # de mexer no jogo, em vez de um KeyError no meio da troca de mapa
+    maps = set(game.map_definitions)
+    if state["map"] not in maps:
+        raise SaveError(f"unknown map {state['map']!r}")
+    target_map = state["portal"][2]
+    if target_map and target_map not in maps:
+        raise SaveError(f"unknown portal target map {target_map!r}")
+    player = game.player
+    npc_keys = game.world.npcs.keys() | {key for key, character in game.characters.items() if character is not player}
+    unknown_npcs = state["npcs"].keys() - npc_keys
+    if unknown_npcs:
+        raise SaveError(f"unknown NPCs {sorted(unknown_npcs)}")
+    story_key = state["dialogue"][0]
+    story_keys = state["stories"].keys() | ({story_key} if story_key else set())
+    unknown_stories = [key for key in story_keys if not (game.world.npcs.get(key, {}).get("dialogue")
+                                                         or getattr(game.characters.get(key), "story", None))]
+    if unknown_stories:
+        raise SaveError(f"stories of unknown NPCs or NPCs without dialogue {sorted(unknown_stories)}")
+
+
+def restore_state(game, state):
+    # Põe o jogo no estado salvo. Não recria o Game nem recarrega tiles, sprites e fundos: a troca de
+    # mapa (quando o mapa salvo não é o atual) usa o mesmo caminho dos portais, com os caches de assets.
+    # Um save que não bate com o mundo levanta SaveError sem mudar nada.
+    check_state(game, state)
+    loaded_maps = set()
+    for key in state["npcs"].keys() | state["stories"].keys():
+        if key not in game.characters and key in game.world.npcs:
+            loaded_maps.add(game.world.npcs[key].get("map"))
+            game.load_map_npcs(game.world.npcs[key].get("map"))
+
+    player_x, player_y, direction = state["player"]
+    if state["map"] != game.current_map_key:
+        game.switch_map(state["map"], (player_x, player_y))
+    for key, scene in state["stories"].items():
+        story = getattr(game.characters.get(key), "story", None)
+        if story:
+            story.current_scene = scene
+    for key, (x, y) in state["npcs"].items():
+        npc = game.characters.get(key)
+        if npc is not None:
+            npc.map_x, npc.map_y = x, y
+    # Mesmo dict (as Storys abertas guardam a referência)
+    game.dialogue_flags.clear()
+    game.dialogue_flags.update(state["flags"])
+    # Reativa os NPCs do mapa: spatial hash nas posições restauradas e agentes recomeçando dali
+    game.activate_map_npcs(game.current_map_key)
+    # NPCs de outros mapas, criados só para receber o estado salvo, não seguram os sprites desses mapas
+    for map_key in loaded_maps - {game.current_map_key, None}:
+        for npc in game.map_npcs[map_key].values():
+            npc.release_sprites()
+        game.assets.release_scope(map_key)
+
+    player = game.player
+    player.map_x, player.map_y = player_x, player_y
+    player.current_direction = direction
+    player.is_moving = False
+    game.camera.snap_to(player)
+
+    activating, timer, target_map, target_x, target_y = state["portal"]
+    game.portal_is_activating = activating
+    game.portal_activation_timer = timer
+    game.portal_target_info = {"target_map_key": target_map, "target_player_pos": (target_x, target_y)} if target_map else None
+    game.scaled_portal_open_background_override = game.portal_open_background_pattern if activating else None
+
+    story_key, scene, exit_active = state["dialogue"]
+    game.game_state = state["state"]
+    game.dialogue_exit_active = exit_active
+    game.dialogue_backdrop = None
+    game.current_dialogue_story = None
+    game.dialogue_system.current_character = None
+    game.dialogue_system.current_text = ""
+    story = getattr(game.characters.get(story_key), "story", None)
+    if game.game_state == "dialogue" and not (story and game.start_dialogue(story, scene)):
+        game.game_state = "map" # A história aberta não existe mais neste mundo (ou o roteiro tem erro)
+    # Teleporte: não interpola a partir das posições de antes da carga
+    game.snapshot_positions()
+
+
+class SaveFile:
+    # Slot de salvamento com autosave. Na thread principal só roda capture_state e a comparação com o
+    # último estado salvo (diff_state); a codificação e a escrita no disco ficam numa thread de trabalho,
+    # que grava os registros na ordem em que foram pedidos.
+    def __init__(self, path, autosave_seconds=AUTOSAVE_SECONDS, deltas_per_full=SAVE_DELTAS_PER_FULL):
+        self.path = path
+        self.autosave_seconds = autosave_seconds
+        self.deltas_per_full = deltas_per_full
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save-writer")
+        self.writes = [] # Gravações ainda não conferidas (Futures)
+        self.saved_state = None # Último estado enviado para o disco (base do próximo delta)
+        self.deltas = 0
+        self.next_autosave = None
+        self.restore_pending = False
+        self.save_count = 0
+
+    def attach(self, game, restore=True):
+        # Liga o slot ao jogo (F5 salva, F9 carrega, autosave). Com restore=True e um save existente,
+        # o jogo continua dele assim que a carga dos assets terminar.
+        game.save_file = self
+        self.restore_pending = restore and os.path.exists(self.path)
+        self.executor.submit(lambda: None) # Sobe a thread de gravação agora, não no frame do primeiro save
+
+    def update(self, game):
+        # Chamado uma vez por frame depois da carga
+        if self.restore_pending:
+            self.restore_pending = False
+            self.load(game)
+        now = time.perf_counter()
+        if self.next_autosave is None:
+            self.next_autosave = now + self.autosave_seconds
+        elif self.autosave_seconds > 0 and now >= self.next_autosave:
+            self.next_autosave = now + self.autosave_seconds
+            self.save(game)
+        self._check_writes()
+
+    def save(self, game):
+        state = capture_state(game)
+        if self.saved_state is None or self.deltas >= self.deltas_per_full:
+            self.deltas = 0
+            self.writes.append(self.executor.submit(self._write_full, state))
+        else:
+            changes = diff_state(self.saved_state, state)
+            if not changes:
+                return
+            self.deltas += 1
+            self.writes.append(self.executor.submit(self._append, changes))
+        self.saved_state = state
+        self.save_count += 1
+
+    def _write_full(self, state):
+        # Arquivo novo com um só registro completo, trocado de uma vez (um save antigo nunca fica pela metade)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as save_file:
+            save_file.write(HEADER.pack(MAGIC, VERSION) + encode_record(RECORD_FULL, state))
+        os.replace(temp_path, self.path)
+
+    def _append(self, changes):
+        with open(self.path, "ab") as save_file:
+            save_file.write(encode_record(RECORD_DELTA, changes))
+
+    def _check_writes(self):
+        # Erros de disco aparecem aqui, sem a thread principal esperar pela escrita
+        pending = []
+        for future in self.writes:
+            if not future.done():
+                pending.append(future)
+            elif future.exception() is not None:
+                print(f"Error writing save {self.path}: {future.exception()}")
+                self.saved_state = None # O próximo save reescreve o arquivo inteiro
+        self.writes = pending
+
+    def flush(self):
+        # Espera as gravações pendentes
+        self.executor.submit(lambda: None).result()
+        self._check_writes()
+
+    def load(self, game):
+        self.flush()
+        try:
+            state, torn = read_save(self.path)
+            restore_state(game, state)
+        except (OSError, SaveError) as e:
+            print(f"Error loading save {self.path}: {e}")
+            return False
+        # O próximo save é um delta em relação ao que está no arquivo. Se a leitura parou num registro
+        # estragado, deltas anexados depois dele nunca seriam lidos: o próximo save reescreve o arquivo.
+        self.saved_state = None if torn else state
+        return True
+
+    def close(self, game=None):
+        # Salva uma última vez (se houver jogo) e espera a escrita terminar
+        if game is not None and not game.loading:
+            self.save(game)
+        self.executor.shutdown(wait=True)
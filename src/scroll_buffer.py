@@ -0,0 +1,67 @@
+import pygame
+
+from config import BLACK
+from profiler import profiler
+
+
+class ScrollBuffer:
+    # Buffer persistente com o fundo (padrão + tiles) da área visível. Quando a câmera anda, os pixels
+    # que continuam na tela são deslocados com Surface.scroll e só as faixas que entraram pela borda
+    # são desenhadas de novo. Qualquer mudança de conteúdo (outro mapa, frame da animação do fundo,
+    # portal aberto) muda a chave e força o redesenho completo.
+    def __init__(self):
+        self.surface = None
+        self.content_key = None
+        self.camera_topleft = None # Câmera para a qual o buffer foi desenhado
+
+    def invalidate(self):
+        self.content_key = None
+
+    def exposed_strips(self, dx, dy, size):
+        # Faixas da tela que ficam sem conteúdo depois de rolar o buffer por (dx, dy)
+        width, height = size
+        strips = []
+        if dx > 0:
+            strips.append(pygame.Rect(0, 0, dx, height))
+        elif dx < 0:
+            strips.append(pygame.Rect(width + dx, 0, -dx, height))
+        # A faixa horizontal não repete o canto já coberto pela vertical
+        left = dx if dx > 0 else 0
+        strip_width = width - abs(dx)
+        if dy > 0:
+            strips.append(pygame.Rect(left, 0, strip_width, dy))
+        elif dy < 0:
+            strips.append(pygame.Rect(left, height + dy, strip_width, -dy))
+        return strips
+
+    def draw(self, screen, camera_rect, content_key, draw_content):
+        # draw_content(surface, camera_rect) desenha o fundo inteiro; o clip da superfície limita
+        # o trabalho às faixas expostas
+        size = screen.get_size()
+        if self.surface is None or self.surface.get_size() != size:
+            self.surface = pygame.Surface(size, 0, screen)
+            self.content_key = None
+
+        if self.content_key != content_key:
+            regions = [self.surface.get_rect()]
+        else:
+            dx = camera_rect.x - self.camera_topleft[0]
+            dy = camera_rect.y - self.camera_topleft[1]
+            if abs(dx) >= size[0] or abs(dy) >= size[1]:
+                regions = [self.surface.get_rect()] # Andou mais que uma tela: nada a aproveitar
+            else:
+                if dx or dy:
+                    self.surface.scroll(dx, dy)
+                regions = self.exposed_strips(dx, dy, size)
+
+        for region in regions:
+            self.surface.set_clip(region)
+            self.surface.fill(BLACK)
+            draw_content(self.surface, camera_rect)
+            profiler.count("background_redraw_pixels", region.width * region.height)
+        self.surface.set_clip(None)
+        self.content_key = content_key
+        self.camera_topleft = camera_rect.topleft
+
+        screen.blit(self.surface, (0, 0))
+        profiler.count("blit")
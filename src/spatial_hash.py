@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class SpatialHash:
+    # Broad phase em grade uniforme: cada objeto fica nos baldes das células que o seu retângulo cobre.
+    # update() é chamado só para objetos que se moveram e só mexe nos baldes quando o objeto troca de
+    # célula; query() devolve os candidatos perto de um retângulo, sem olhar os objetos do resto do mapa.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.buckets = {} # (célula x, célula y) -> set de ids
+        self.bounds = {} # id -> células cobertas (x0, y0, x1, y1)
+
+    def __len__(self):
+        return len(self.bounds)
+
+    def _cell_bounds(self, x, y, width, height):
+        cell_size = self.cell_size
+        return (x // cell_size, y // cell_size,
+                (x + max(width, 1) - 1) // cell_size, (y + max(height, 1) - 1) // cell_size)
+
+    def _cells(self, bounds):
+        x0, y0, x1, y1 = bounds
+        for cell_y in range(y0, y1 + 1):
+            for cell_x in range(x0, x1 + 1):
+                yield cell_x, cell_y
+
+    def update(self, object_id, x, y, width, height):
+        # Insere o objeto ou o move para a posição atual (nada muda se ele continua nas mesmas células)
+        bounds = self._cell_bounds(x, y, width, height)
+        previous_bounds = self.bounds.get(object_id)
+        if bounds != previous_bounds:
+            self._move(object_id, previous_bounds, bounds)
+
+    def update_many(self, object_ids, x, y, width, height):
+        # update() para vários objetos de uma vez (arrays NumPy): as células são calculadas em lote e só
+        # os objetos que trocaram de célula passam pelo trabalho em Python dos baldes
+        cell_size = self.cell_size
+        x0 = x // cell_size
+        y0 = y // cell_size
+        x1 = (x + np.maximum(width, 1) - 1) // cell_size
+        y1 = (y + np.maximum(height, 1) - 1) // cell_size
+        current_bounds = self.bounds
+        for object_id, bounds in zip(object_ids.tolist(), zip(x0.tolist(), y0.tolist(), x1.tolist(), y1.tolist())):
+            previous_bounds = current_bounds.get(object_id)
+            if bounds != previous_bounds:
+                self._move(object_id, previous_bounds, bounds)
+
+    def _move(self, object_id, previous_bounds, bounds):
+        if previous_bounds is not None:
+            self._discard_from_cells(object_id, previous_bounds)
+        for cell in self._cells(bounds):
+            self.buckets.setdefault(cell, set()).add(object_id)
+        self.bounds[object_id] = bounds
+
+    def remove(self, object_id):
+        previous_bounds = self.bounds.pop(object_id, None)
+        if previous_bounds is not None:
+            self._discard_from_cells(object_id, previous_bounds)
+
+    def _discard_from_cells(self, object_id, bounds):
+        for cell in self._cells(bounds):
+            bucket = self.buckets.get(cell)
+            if bucket is not None:
+                bucket.discard(object_id)
+                if not bucket:
+                    del self.buckets[cell]
+
+    def query(self, rect):
+        # Ids (em ordem crescente) dos objetos nas células que 'rect' cobre; o teste exato fica com quem chama
+        candidates = set()
+        for cell in self._cells(self._cell_bounds(rect.left, rect.top, rect.width, rect.height)):
+            bucket = self.buckets.get(cell)
+            if bucket:
+                candidates.update(bucket)
+        return np.array(sorted(candidates), dtype=np.intp)
+
+    def clear(self):
+        self.buckets.clear()
+        self.bounds.clear()
@@ -0,0 +1,92 @@
+import pygame
+
+from assets import asset_manager
+
+
+class SpriteSet:
+    # Frames de um personagem (por direção), carregados uma vez e compartilhados por referência entre
+    # todos os personagens com os mesmos sprites. directional_frames tem os frames originais (diálogo),
+    # map_frames os frames escalados para o mapa.
+    __slots__ = ("directional_frames", "map_frames", "dialogue_size")
+
+    def __init__(self, directional_frames, map_frames, dialogue_size):
+        self.directional_frames = directional_frames
+        self.map_frames = map_frames
+        self.dialogue_size = dialogue_size # Tamanho do sprite no diálogo (do primeiro frame de 'frente')
+
+    def frame_count(self, direction):
+        # Número de frames da animação na direção (com 'frente' como alternativa, igual ao desenho)
+        return len(self.directional_frames.get(direction, self.directional_frames.get("frente", [])))
+
+
+class SpriteCache:
+    # SpriteSets compartilhados (um por combinação de sprites, tamanho no mapa e escopo de assets).
+    # Os frames, originais e escalados, vêm do asset_manager no escopo do SpriteSet: cada arquivo é
+    # escalado uma única vez e todos os personagens com os mesmos sprites recebem as mesmas Surfaces.
+    # Quando o asset_manager libera um escopo (ex: troca de mapa), os SpriteSets dele saem daqui também,
+    # então o cache não segura frames que o asset_manager já descartou.
+    def __init__(self, assets=asset_manager):
+        self.assets = assets
+        self.sprite_sets = {} # (caminhos por direção, tamanho no mapa, escopo) -> SpriteSet
+        self.hits = 0
+        self.misses = 0
+        assets.add_release_listener(self.release_scope)
+
+    def get_sprite_set(self, sprite_paths, map_size, scope):
+        key = (tuple(sorted(sprite_paths.items())), tuple(map_size), scope)
+        sprite_set = self.sprite_sets.get(key)
+        if sprite_set is None:
+            self.misses += 1
+            sprite_set = self.sprite_sets[key] = self._load_sprite_set(sprite_paths, map_size, scope)
+        else:
+            self.hits += 1
+        return sprite_set
+
+    def _load_sprite_set(self, sprite_paths, map_size, scope):
+        directional_frames = {}
+        map_frames = {}
+        dialogue_size = (150, 200) # Default dialogue sprite size, can be overridden by 'frente' sprite
+        for direction, path in sprite_paths.items():
+            try:
+                # O asset_manager carrega cada arquivo uma vez só, mesmo que vários personagens usem o mesmo sprite
+                full_sprite_image = self.assets.image(path, scope=scope)
+                spritesheet_width = full_sprite_image.get_width()
+                # Assuming 2 frames horizontally for animation if spritesheet is wide enough
+                frame_width = spritesheet_width // 2
+
+                if frame_width > 0 and spritesheet_width >= frame_width * 2: # Check if it's a 2-frame sheet
+                    current_direction_frames = list(self.assets.strip(path, 2, scope=scope))
+                    # Escala os frames uma única vez, na carga (a tira escalada também fica no asset_manager)
+                    map_frames[direction] = list(self.assets.strip(path, 2, size=map_size, scope=scope))
+                else: # Single frame sprite
+                    current_direction_frames = [full_sprite_image]
+                    map_frames[direction] = [self.assets.scaled(path, map_size, scope=scope)]
+
+                directional_frames[direction] = current_direction_frames
+
+                # If this is the 'frente' sprite, set dialogue dimensions from its first frame
+                if direction == "frente" and current_direction_frames:
+                    dialogue_size = current_direction_frames[0].get_size()
+
+            except pygame.error as e:
+                print(f"Cannot load sprite for direction {direction} at {path}: {e}")
+                directional_frames[direction] = [] # Store empty list if loading fails
+                map_frames[direction] = []
+        return SpriteSet(directional_frames, map_frames, dialogue_size)
+
+    def release_scope(self, scope):
+        # Chamado pelo asset_manager ao liberar o escopo
+        for key in [key for key in self.sprite_sets if key[2] == scope]:
+            del self.sprite_sets[key]
+
+    def clear(self):
+        self.sprite_sets.clear()
+
+    def stats(self):
+        frames = {id(frame): frame for sprite_set in self.sprite_sets.values()
+                  for direction_frames in sprite_set.map_frames.values() for frame in direction_frames}
+        total_bytes = sum(frame.get_width() * frame.get_height() * frame.get_bytesize() for frame in frames.values())
+        return {"entries": len(frames), "sprite_sets": len(self.sprite_sets), "bytes": total_bytes, "hits": self.hits, "misses": self.misses}
+
+
+sprite_cache = SpriteCache()
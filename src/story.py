@@ -1,20 +1,61 @@
-\
+from dialogue_graph import compile_dialogue
+
+
 class Story:
-    def __init__(self):
-        self.scenes = [] # Default to empty, will be populated by Game
+    # Conversa de um NPC: cursor (current_scene, o índice do nó atual) sobre o DialogueGraph do roteiro.
+    # O roteiro só é lido e compilado na primeira conversa (load_script devolve o roteiro), então NPCs
+    # com quem o jogador nunca fala não custam nada além desta instância.
+    def __init__(self, load_script=None, default_speaker=None):
+        self.load_script = load_script
+        self.default_speaker = default_speaker
+        self.graph = None
+        self.flags = {} # Flags do jogo (Game.dialogue_flags), lidas pelas condições e alteradas pelos nós
+        self.speaker_characters = [] # Personagem de cada falante do grafo, resolvido no início da conversa
         self.current_scene = 0
-    
-    def get_current_scene(self):
-        if 0 <= self.current_scene < len(self.scenes):
-            return self.scenes[self.current_scene]
-        return None # Indicates no more scenes or invalid index
-    
+
+    @property
+    def loaded(self):
+        return self.graph is not None
+
+    def load(self, measure=None):
+        # Compila o roteiro (com as falas já quebradas em linhas por 'measure', se dado)
+        if self.graph is None:
+            self.graph = compile_dialogue(self.load_script(), self.default_speaker, measure)
+            self.load_script = None
+
+    def start(self, characters, flags, measure=None, scene=None):
+        # Começa a conversa do início (primeiro ramo de "start" que vale com as flags atuais) ou, ao
+        # carregar um save, continua do nó 'scene' (as flags salvas já incluem as dele)
+        self.load(measure)
+        self.flags = flags
+        self.speaker_characters = [characters.get(speaker) for speaker in self.graph.speakers]
+        if scene is not None:
+            self.current_scene = scene
+            return
+        self.current_scene = self.graph.start(flags)
+        self._enter()
+
     def next_scene(self):
-        # Advance the scene index.
-        # The check for whether the dialogue should end will happen in get_current_scene()
-        # or by checking the length of scenes vs current_scene index.
-        self.current_scene += 1
-        # No automatic reset here. Game logic will handle resetting or ending dialogue.
-    
-    def reset(self):
-        self.current_scene = 0
+        if not self.finished:
+            self.current_scene = self.graph.next(self.current_scene, self.flags)
+            self._enter()
+
+    def _enter(self):
+        if not self.finished:
+            for flag, value in self.graph.node_flags[self.current_scene]:
+                self.flags[flag] = value
+
+    @property
+    def finished(self):
+        return self.graph is None or not 0 <= self.current_scene < len(self.graph)
+
+    def speaker(self):
+        # Personagem da fala atual (None se ele não existe neste mundo)
+        return self.speaker_characters[self.graph.node_speakers[self.current_scene]]
+
+    def text(self):
+        return self.graph.texts[self.current_scene]
+
+    def lines(self):
+        # Fala atual já quebrada em linhas (None se o grafo foi compilado sem medir o texto)
+        return self.graph.lines[self.current_scene] if self.graph.lines else None
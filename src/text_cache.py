@@ -0,0 +1,119 @@
+from collections import OrderedDict
+
+import pygame
+
+from config import TEXT_CACHE_ENTRIES
+from profiler import profiler
+
+
+def wrap_text(font, text, max_width):
+    # Quebra o texto em linhas que cabem em max_width (mesma regra que o DialogueSystem sempre usou:
+    # uma palavra entra na linha se a linha resultante for mais estreita que max_width)
+    lines = []
+    current_line = []
+    for word in text.split():
+        test_line = ' '.join(current_line + [word])
+        if font.size(test_line)[0] < max_width:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(' '.join(current_line))
+                current_line = [word]
+            else:
+                lines.append(word)
+    if current_line:
+        lines.append(' '.join(current_line))
+    return lines
+
+
+class TextLayout:
+    # Texto já quebrado e renderizado, uma superfície por linha. Para o efeito de máquina de escrever,
+    # a linha parcial é desenhada recortando a superfície pronta na largura do prefixo visível,
+    # sem renderizar o texto de novo a cada caractere.
+    def __init__(self, font, lines, surfaces):
+        self.font = font
+        self.lines = lines
+        self.surfaces = surfaces
+        self.char_count = sum(len(line) for line in lines)
+        self.prefix_widths = None # Calculado só quando a revelação parcial é usada
+
+    def _prefix_width(self, line_index, char_count):
+        if self.prefix_widths is None:
+            self.prefix_widths = [[self.font.size(line[:n])[0] for n in range(len(line) + 1)] for line in self.lines]
+        return self.prefix_widths[line_index][char_count]
+
+    def draw(self, screen, position, line_height, visible_chars=None):
+        x, y = position
+        remaining = self.char_count if visible_chars is None else visible_chars
+        for line_index, (line, surface) in enumerate(zip(self.lines, self.surfaces)):
+            if remaining <= 0:
+                break
+            line_position = (x, y + line_index * line_height)
+            if remaining >= len(line):
+                screen.blit(surface, line_position)
+            else:
+                visible_area = pygame.Rect(0, 0, self._prefix_width(line_index, remaining), surface.get_height())
+                screen.blit(surface, line_position, visible_area)
+            remaining -= len(line)
+
+
+class TextCache:
+    # Cache LRU de texto renderizado. render() guarda linhas simples (nomes, instruções) e layout()
+    # guarda textos quebrados em linhas; a chave inclui a fonte, a cor e a largura, então o mesmo
+    # texto só é medido e renderizado uma vez enquanto estiver no cache.
+    def __init__(self, max_entries=TEXT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def _put(self, key, entry):
+        self.entries[key] = entry
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _render(self, font, text, color):
+        profiler.count("text_render")
+        return font.render(text, True, color)
+
+    def render(self, font, text, color):
+        key = ("line", font, text, color)
+        surface = self._get(key)
+        if surface is None:
+            surface = self._render(font, text, color)
+            self._put(key, surface)
+        return surface
+
+    def layout(self, font, text, color, max_width, max_lines=None, lines=None):
+        # 'lines': o texto já quebrado com a mesma fonte e largura (ex: falas medidas na compilação do roteiro)
+        key = ("layout", font, text, color, max_width, max_lines)
+        layout = self._get(key)
+        if layout is None:
+            if lines is None:
+                lines = wrap_text(font, text, max_width)
+            lines = lines[:max_lines]
+            layout = TextLayout(font, lines, [self._render(font, line, color) for line in lines])
+            self._put(key, layout)
+        return layout
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        total_bytes = 0
+        for entry in self.entries.values():
+            for surface in (entry.surfaces if isinstance(entry, TextLayout) else [entry]):
+                total_bytes += surface.get_width() * surface.get_height() * surface.get_bytesize()
+        return {"entries": len(self.entries), "bytes": total_bytes, "hits": self.hits, "misses": self.misses}
+
+
+text_cache = TextCache()
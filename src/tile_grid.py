@@ -0,0 +1,112 @@
+import numpy as np
+import pygame
+
+from map_format import EMPTY_TILE_ID
+
+
+class TileGrid:
+    # Estado de um mapa como array 2D de ids de tiles (uint8, linhas x colunas do padrão) mais uma
+    # máscara booleana de colisão do mesmo formato. As consultas de colisão, portal e visibilidade
+    # são fatias desses arrays; as repetições (repeat_x) são resolvidas por aritmética, sem copiar nada.
+    # Posições além do fim de uma linha (linhas irregulares no .map) têm o id EMPTY_TILE_ID.
+    def __init__(self, tile_ids, palette, blocking, tile_size, pattern_pixel_width, repeat_x=1, source=None):
+        self.tile_ids = tile_ids
+        self.palette = list(palette) # id -> chave do tile
+        self.blocking = blocking
+        self.rows, self.cols = tile_ids.shape
+        self.tile_size = tile_size
+        self.pattern_pixel_width = pattern_pixel_width
+        self.repeat_x = repeat_x
+        self.source = source # Mantém vivo o CompiledMap (mmap) quando tile_ids aponta para ele
+        self.blocking_count = int(np.count_nonzero(blocking))
+
+    @classmethod
+    def from_rows(cls, map_rows, blocking_tile_keys, tile_size, pattern_pixel_width, repeat_x=1):
+        # Constrói a grade a partir das linhas de um .map em texto
+        palette = []
+        palette_ids = {}
+        cols = max((len(row) for row in map_rows), default=0)
+        tile_ids = np.full((len(map_rows), cols), EMPTY_TILE_ID, dtype=np.uint8)
+        for row_index, row in enumerate(map_rows):
+            for col_index, tile_key in enumerate(row):
+                tile_id = palette_ids.get(tile_key)
+                if tile_id is None:
+                    tile_id = palette_ids[tile_key] = len(palette)
+                    palette.append(tile_key)
+                tile_ids[row_index, col_index] = tile_id
+
+        blocking_lookup = np.zeros(256, dtype=bool)
+        for tile_id, tile_key in enumerate(palette):
+            blocking_lookup[tile_id] = tile_key in blocking_tile_keys
+        return cls(tile_ids, palette, blocking_lookup[tile_ids], tile_size, pattern_pixel_width, repeat_x)
+
+    @classmethod
+    def from_compiled(cls, compiled_map, pattern_pixel_width, repeat_x=1):
+        # Usa direto a memória do .vmap (np.frombuffer sobre o mmap), sem copiar a grade
+        tile_ids = np.frombuffer(compiled_map.grid, dtype=np.uint8).reshape(compiled_map.rows, compiled_map.cols)
+        mask_bits = np.frombuffer(compiled_map.blocking_mask, dtype=np.uint8).reshape(compiled_map.rows, compiled_map.mask_stride)
+        blocking = np.unpackbits(mask_bits, axis=1, bitorder="little")[:, :compiled_map.cols].astype(bool)
+        return cls(tile_ids, compiled_map.palette, blocking, compiled_map.tile_size, pattern_pixel_width, repeat_x, source=compiled_map)
+
+    def close(self):
+        # Fecha o .vmap (mmap) de um mapa compilado que saiu de uso. A grade vira uma cópia na memória,
+        # então quem ainda tiver este TileGrid continua com uma grade válida.
+        if self.source is not None:
+            self.tile_ids = self.tile_ids.copy()
+            source, self.source = self.source, None
+            try:
+                source.close()
+            except BufferError:
+                pass # Ainda há views sobre o mmap; ele é fechado quando elas forem coletadas
+
+    def signature(self):
+        # Identifica o conteúdo da grade (para saber se caches derivados dela ainda são válidos)
+        return (tuple(self.palette), self.tile_ids.shape, self.tile_ids.tobytes())
+
+    def tile_key(self, col, row):
+        # Chave do tile na coluna/linha do padrão, ou None fora do mapa (ou além do fim da linha)
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            tile_id = self.tile_ids[row, col]
+            if tile_id != EMPTY_TILE_ID:
+                return self.palette[tile_id]
+        return None
+
+    def _repeats_touching(self, left, right):
+        # Cópias do padrão cujos tiles (inclusive colunas além da largura do padrão) podem tocar [left, right)
+        if self.pattern_pixel_width <= 0:
+            return range(0)
+        grid_pixel_width = self.cols * self.tile_size
+        first_repeat = max(0, (left - grid_pixel_width) // self.pattern_pixel_width)
+        last_repeat = min(self.repeat_x - 1, (right - 1) // self.pattern_pixel_width)
+        return range(first_repeat, last_repeat + 1)
+
+    def query(self, rect):
+        # Retângulos dos tiles bloqueadores que cruzam 'rect' (coordenadas do mundo), na mesma ordem
+        # em que a lista completa de colisão seria montada (repetição, linha, coluna).
+        # Compatível com Character.move, que aceita qualquer objeto com query().
+        if rect.width <= 0 or rect.height <= 0:
+            return []
+        first_row = max(0, rect.top // self.tile_size)
+        last_row = min(self.rows, (rect.bottom - 1) // self.tile_size + 1)
+        if first_row >= last_row:
+            return []
+
+        found = []
+        for repeat_index in self._repeats_touching(rect.left, rect.right):
+            offset_x = repeat_index * self.pattern_pixel_width
+            first_col = max(0, (rect.left - offset_x) // self.tile_size)
+            last_col = min(self.cols, (rect.right - 1 - offset_x) // self.tile_size + 1)
+            if first_col >= last_col:
+                continue
+            rows, cols = np.nonzero(self.blocking[first_row:last_row, first_col:last_col])
+            for row_index, col_index in zip(rows.tolist(), cols.tolist()):
+                found.append(pygame.Rect(
+                    (first_col + col_index) * self.tile_size + offset_x,
+                    (first_row + row_index) * self.tile_size,
+                    self.tile_size,
+                    self.tile_size))
+        return found
+
+    def __len__(self):
+        # Número de tiles bloqueadores em todas as repetições (mantém 'if collision_rects' funcionando)
+        return self.blocking_count * self.repeat_x
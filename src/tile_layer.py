@@ -0,0 +1,202 @@
+from collections import OrderedDict
+
+import numpy as np
+import pygame
+
+from config import TILE_CHUNK_SIZE, TILE_CHUNK_CACHE_BYTES
+from profiler import profiler
+
+
+def surface_bytes(surface):
+    return surface.get_width() * surface.get_height() * surface.get_bytesize()
+
+
+class ChunkCache:
+    # Cache LRU de superfícies com orçamento em bytes.
+    # Entradas com valor None (chunks vazios) ficam no cache sem ocupar memória.
+    def __init__(self, max_bytes=TILE_CHUNK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # chave -> (superfície ou None, bytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, surface):
+        self.discard(key)
+        size = surface_bytes(surface) if surface is not None else 0
+        self.entries[key] = (surface, size)
+        self.total_bytes += size
+        # Remove os chunks menos usados recentemente até caber no orçamento (o recém-inserido sempre fica)
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def discard_where(self, predicate):
+        for key in [key for key in self.entries if predicate(key)]:
+            self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        self.total_bytes = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.total_bytes, "hits": self.hits, "misses": self.misses}
+
+
+class TileLayer:
+    # Geometria e conteúdo da camada de tiles de um padrão do mapa (a partir de um TileGrid).
+    # Não guarda estado de renderização, então pode ser usada para pré-renderizar chunks
+    # em outra thread (ex: pelo MapPreloader) sem tocar no cache do renderer.
+    def __init__(self, tile_grid, tiles, tile_size, pattern_pixel_width, chunk_size=TILE_CHUNK_SIZE):
+        self.tile_grid = tile_grid
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+        # Apenas as colunas dentro da largura do padrão são desenhadas (mesma regra do col % largura)
+        self.pattern_cols = max(1, pattern_pixel_width // tile_size)
+        self.layer_width = self.pattern_cols * tile_size
+        self.layer_height = tile_grid.rows * tile_size
+        # Imagem de cada id da paleta (None para tiles sem imagem, como 'x') e máscara dos ids desenháveis
+        self.tile_images = [tiles.get(tile_key) for tile_key in tile_grid.palette]
+        self.drawable_ids = np.zeros(256, dtype=bool)
+        for tile_id, tile_image in enumerate(self.tile_images):
+            self.drawable_ids[tile_id] = tile_image is not None
+
+    def bake_chunk(self, chunk_col, chunk_row):
+        chunk_x = chunk_col * self.chunk_size
+        chunk_y = chunk_row * self.chunk_size
+        width = min(self.chunk_size, self.layer_width - chunk_x)
+        height = min(self.chunk_size, self.layer_height - chunk_y)
+
+        first_col = chunk_x // self.tile_size
+        last_col = min(self.pattern_cols, self.tile_grid.cols, (chunk_x + width - 1) // self.tile_size + 1)
+        first_row = chunk_y // self.tile_size
+        last_row = min(self.tile_grid.rows, (chunk_y + height - 1) // self.tile_size + 1)
+        if first_col >= last_col or first_row >= last_row:
+            return None
+
+        # Só os tiles com imagem dentro do chunk, encontrados por fatia da grade
+        chunk_ids = self.tile_grid.tile_ids[first_row:last_row, first_col:last_col]
+        rows, cols = np.nonzero(self.drawable_ids[chunk_ids])
+        if len(rows) == 0:
+            return None # Chunk sem nenhum tile visível
+
+        chunk_surface = pygame.Surface((width, height), pygame.SRCALPHA)
+        chunk_surface.fill((0, 0, 0, 0))
+        for row_index, col_index in zip(rows.tolist(), cols.tolist()):
+            tile_image = self.tile_images[chunk_ids[row_index, col_index]]
+            chunk_surface.blit(tile_image, ((first_col + col_index) * self.tile_size - chunk_x,
+                                            (first_row + row_index) * self.tile_size - chunk_y))
+        return chunk_surface
+
+    def chunks_in_view(self, view_rect):
+        # Retorna (x da cópia do padrão no mundo, coluna do chunk, linha do chunk) para cada chunk que cruza view_rect.
+        # A camada de tiles é periódica na horizontal: cada cópia do padrão reaproveita os mesmos chunks.
+        if self.layer_width <= 0 or self.layer_height <= 0:
+            return []
+        first_chunk_row = max(0, view_rect.top // self.chunk_size)
+        last_chunk_row = min((self.layer_height - 1) // self.chunk_size, (view_rect.bottom - 1) // self.chunk_size)
+        if first_chunk_row > last_chunk_row:
+            return []
+
+        chunks = []
+        first_copy = view_rect.left // self.layer_width
+        last_copy = (view_rect.right - 1) // self.layer_width
+        for copy_index in range(first_copy, last_copy + 1):
+            copy_x = copy_index * self.layer_width
+            local_left = max(0, view_rect.left - copy_x)
+            local_right = min(self.layer_width, view_rect.right - copy_x)
+            for chunk_col in range(local_left // self.chunk_size, (local_right - 1) // self.chunk_size + 1):
+                for chunk_row in range(first_chunk_row, last_chunk_row + 1):
+                    chunks.append((copy_x, chunk_col, chunk_row))
+        return chunks
+
+    def bake_view(self, view_rect):
+        # Pré-renderiza todos os chunks distintos visíveis em view_rect: {(coluna, linha): superfície ou None}
+        baked = {}
+        for _, chunk_col, chunk_row in self.chunks_in_view(view_rect):
+            if (chunk_col, chunk_row) not in baked:
+                baked[(chunk_col, chunk_row)] = self.bake_chunk(chunk_col, chunk_row)
+        return baked
+
+
+class TileLayerRenderer:
+    # Renderiza a camada estática de tiles a partir de chunks pré-renderizados (ex: 512x512 px).
+    # Os chunks cobrem um único padrão do mapa; mapas com repeat_x reutilizam os mesmos chunks
+    # em cada repetição, então cada frame custa só alguns blits.
+    def __init__(self, tile_size, chunk_size=TILE_CHUNK_SIZE, cache=None):
+        self.tile_size = tile_size
+        self.chunk_size = chunk_size
+        self.cache = cache if cache is not None else ChunkCache()
+        self.map_key = None
+        self.layer = None
+        self.map_versions = {} # map_key -> assinatura do TileGrid usado para gerar os chunks
+
+    def make_layer(self, tile_grid, tiles, pattern_pixel_width):
+        return TileLayer(tile_grid, tiles, self.tile_size, pattern_pixel_width, self.chunk_size)
+
+    def set_map(self, map_key, tile_grid, tiles, pattern_pixel_width, prebaked_chunks=None):
+        self.map_key = map_key
+        self.layer = self.make_layer(tile_grid, tiles, pattern_pixel_width)
+
+        # Só descarta os chunks se o conteúdo do mapa realmente mudou desde que foram gerados
+        signature = tile_grid.signature()
+        previous_signature = self.map_versions.get(map_key)
+        if previous_signature is not None and previous_signature != signature:
+            self.invalidate(map_key)
+        self.map_versions[map_key] = signature
+
+        # Chunks já renderizados em segundo plano (ex: pelo MapPreloader) entram direto no cache
+        for (chunk_col, chunk_row), chunk_surface in (prebaked_chunks or {}).items():
+            self.cache.put((map_key, chunk_col, chunk_row), chunk_surface)
+
+    def clear_map(self):
+        # Mapa atual sem camada de tiles pré-renderizada (mundos em streaming desenham os próprios tiles)
+        self.map_key = None
+        self.layer = None
+
+    def invalidate(self, map_key=None):
+        if map_key is None:
+            self.cache.clear()
+            self.map_versions.clear()
+        else:
+            self.cache.discard_where(lambda key: key[0] == map_key)
+            self.map_versions.pop(map_key, None)
+
+    def get_chunk(self, chunk_col, chunk_row):
+        key = (self.map_key, chunk_col, chunk_row)
+        if key in self.cache:
+            return self.cache.get(key)
+        self.cache.misses += 1
+        profiler.count("chunk_bake")
+        chunk_surface = self.layer.bake_chunk(chunk_col, chunk_row)
+        self.cache.put(key, chunk_surface)
+        return chunk_surface
+
+    def draw(self, screen, camera_rect):
+        if self.layer is None:
+            return
+        # Área visível em coordenadas do mundo (camera_rect guarda o deslocamento negativo da câmera)
+        view_rect = pygame.Rect(-camera_rect.x, -camera_rect.y, *screen.get_size())
+        for copy_x, chunk_col, chunk_row in self.layer.chunks_in_view(view_rect):
+            chunk_surface = self.get_chunk(chunk_col, chunk_row)
+            if chunk_surface is not None:
+                screen.blit(chunk_surface, (copy_x + chunk_col * self.chunk_size + camera_rect.x,
+                                            chunk_row * self.chunk_size + camera_rect.y))
+                profiler.count("blit")
@@ -0,0 +1,40 @@
+import time
+
+
+class FixedTimestep:
+    # Passo fixo de simulação com acumulador: o tempo real de cada frame entra no acumulador e vira
+    # zero ou mais ticks de simulação de duração fixa. A sobra (alpha, entre 0 e 1) é a fração do
+    # próximo tick já decorrida, usada para interpolar o desenho entre os dois últimos ticks.
+    def __init__(self, rate, max_steps):
+        self.rate = rate
+        self.step_seconds = 1.0 / rate
+        self.max_steps = max_steps # Máximo de ticks por frame; o atraso além disso é descartado
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.last_time = None
+        self.dropped_seconds = 0.0 # Tempo descartado por atraso (o jogo desacelera em vez de travar)
+
+    def advance(self, elapsed=None):
+        # Retorna quantos ticks rodar neste frame. 'elapsed' (segundos) substitui o relógio real,
+        # por exemplo para rodar exatamente um tick por frame no benchmark ou num replay.
+        now = time.perf_counter()
+        if elapsed is None:
+            elapsed = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+
+        self.accumulator += elapsed
+        steps = int(self.accumulator / self.step_seconds)
+        if steps > self.max_steps:
+            self.dropped_seconds += (steps - self.max_steps) * self.step_seconds
+            steps = self.max_steps
+            self.accumulator %= self.step_seconds
+        else:
+            self.accumulator -= steps * self.step_seconds
+        self.alpha = min(1.0, self.accumulator / self.step_seconds)
+        return steps
+
+    def reset(self):
+        # Esquece o tempo acumulado (ex: depois de uma pausa longa ou de um carregamento)
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.last_time = None
@@ -0,0 +1,186 @@
+import json
+import os
+from collections.abc import MutableMapping
+
+try:
+    import tomllib
+except ImportError: # Python < 3.11: só manifestos JSON
+    tomllib = None
+
+from assets import GLOBAL_SCOPE
+from character import Character
+from map_format import ChunkedMap, MapCompileError
+from npc_movement import build_agent
+from story import Story
+
+
+class WorldManifestError(Exception):
+    pass
+
+
+def read_data_file(path):
+    # Lê um arquivo de dados do mundo em JSON ou TOML (pela extensão)
+    try:
+        if path.endswith(".toml"):
+            if tomllib is None:
+                raise WorldManifestError(f"{path}: TOML needs Python 3.11+ (tomllib)")
+            with open(path, "rb") as data_file:
+                return tomllib.load(data_file)
+        with open(path, "r", encoding="utf-8") as data_file:
+            return json.load(data_file)
+    except (OSError, ValueError) as e:
+        raise WorldManifestError(f"{path}: {e}") from e
+
+
+class MapDefinitions(MutableMapping):
+    # Definições dos mapas, indexadas pela chave. Cada entrada do manifesto só é convertida para o formato
+    # usado pelo jogo (portais por (coluna, linha), caminhos a partir da raiz do projeto) no primeiro acesso;
+    # uma entrada que é só um nome de arquivo aponta para a definição do mapa em arquivo próprio, lida nesse
+    # momento. Assim o custo de iniciar o jogo não cresce com o número de mapas.
+    def __init__(self, entries, base_dir):
+        self.entries = dict(entries)
+        self.base_dir = base_dir
+        self.built = {}
+
+    def __getitem__(self, map_key):
+        map_info = self.built.get(map_key)
+        if map_info is None:
+            if map_key not in self.entries:
+                raise KeyError(map_key)
+            map_info = self.built[map_key] = self._build(map_key, self.entries[map_key])
+        return map_info
+
+    def __setitem__(self, map_key, map_info):
+        # Mapas montados em código (ex: o mapa sintético do benchmark) entram já no formato do jogo
+        self.entries[map_key] = None
+        self.built[map_key] = map_info
+
+    def __delitem__(self, map_key):
+        del self.entries[map_key]
+        self.built.pop(map_key, None)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _build(self, map_key, entry):
+        base_dir = self.base_dir
+        if isinstance(entry, str):
+            map_file = os.path.join(base_dir, entry)
+            entry = read_data_file(map_file)
+            base_dir = os.path.dirname(map_file)
+        try:
+            if "chunks" in entry:
+                map_info = self._build_streamed(base_dir, entry)
+            else:
+                map_info = {
+                    "layout_file": os.path.join(base_dir, entry["layout"]),
+                    "background_image": os.path.join(base_dir, entry["background"]),
+                    "pixel_width": entry["pixel_width"],
+                    "pixel_height": entry["pixel_height"],
+                    "portals": {},
+                }
+            for optional_key in ("repeat_x", "background_animation_frames"):
+                if optional_key in entry:
+                    map_info[optional_key] = entry[optional_key]
+            # Um portal pode ocupar vários tiles, todos com o mesmo destino
+            for portal in entry.get("portals", []):
+                for portal_col, portal_row in portal["tiles"]:
+                    map_info["portals"][(portal_col, portal_row)] = {
+                        "target_map_key": portal["target_map"], "target_player_pos": tuple(portal["target_pos"])}
+        except (KeyError, TypeError, ValueError) as e:
+            raise WorldManifestError(f"map {map_key}: invalid or missing field {e}") from e
+        except (OSError, MapCompileError) as e:
+            raise WorldManifestError(f"map {map_key}: {e}") from e
+        return map_info
+
+    def _build_streamed(self, base_dir, entry):
+        # Mundo grande em chunks (.vchunks, ver chunk_streamer.py): sem .map nem imagem de fundo do tamanho
+        # do mapa; o fundo opcional é um padrão pequeno repetido nas duas direções ("background_size").
+        # O tamanho em pixels vem do cabeçalho do arquivo quando não está no manifesto.
+        chunk_file = os.path.join(base_dir, entry["chunks"])
+        map_info = {"chunk_file": chunk_file, "portals": {}}
+        if "pixel_width" in entry and "pixel_height" in entry:
+            map_info["pixel_width"] = entry["pixel_width"]
+            map_info["pixel_height"] = entry["pixel_height"]
+        else:
+            chunked_map = ChunkedMap(chunk_file)
+            map_info["pixel_width"] = chunked_map.pixel_width
+            map_info["pixel_height"] = chunked_map.pixel_height
+            chunked_map.close()
+        if "background" in entry:
+            map_info["background_image"] = os.path.join(base_dir, entry["background"])
+        if "background_size" in entry:
+            map_info["background_size"] = tuple(entry["background_size"])
+        return map_info
+
+
+class WorldManifest:
+    # Manifesto do mundo: mapas, portais, tiles, jogador, NPCs e seus diálogos. Na abertura só o índice é
+    # montado (chaves dos mapas, NPCs por mapa); mapas e NPCs de um mapa são construídos quando usados.
+    def __init__(self, path):
+        self.path = path
+        self.base_dir = os.path.dirname(path)
+        data = read_data_file(path)
+        try:
+            self.start_map = data["start_map"]
+            self.player = data["player"]
+        except KeyError as e:
+            raise WorldManifestError(f"{path}: missing field {e}") from e
+        self.tiles = {tile_key: self.asset_path(file_name) for tile_key, file_name in data.get("tiles", {}).items()}
+        self.portal_open_image = self.asset_path(data["portal_open_image"]) if "portal_open_image" in data else None
+        self.map_definitions = MapDefinitions(data.get("maps", {}), self.base_dir)
+        self.npcs = data.get("npcs", {})
+        # NPCs por mapa; a chave None guarda os NPCs sem "map", presentes em todos os mapas
+        self.npcs_by_map = {}
+        for npc_key, npc_entry in self.npcs.items():
+            self.npcs_by_map.setdefault(npc_entry.get("map"), []).append(npc_key)
+        if self.start_map not in self.map_definitions:
+            raise WorldManifestError(f"{path}: start_map {self.start_map} is not a map")
+
+    def asset_path(self, file_name):
+        return os.path.join(self.base_dir, file_name)
+
+    def sprite_paths(self, sprites):
+        return {direction: self.asset_path(file_name) for direction, file_name in sprites.items()}
+
+    def npc_keys(self, map_key=None):
+        return self.npcs_by_map.get(map_key, [])
+
+    def build_player(self, entity_store):
+        return Character(self.player["name"], tuple(self.player.get("color", (255, 255, 255))), map_x=0, map_y=0,
+                         sprite_paths=self.sprite_paths(self.player["sprites"]), entity_store=entity_store)
+
+    def build_npc(self, npc_key, entity_store):
+        entry = self.npcs[npc_key]
+        try:
+            map_x, map_y = entry["position"]
+            # Os sprites de um NPC de mapa ficam no escopo do mapa e são liberados com ele
+            npc = Character(entry["name"], tuple(entry.get("color", (255, 255, 255))), map_x=map_x, map_y=map_y,
+                            sprite_paths=self.sprite_paths(entry["sprites"]), asset_scope=entry.get("map") or GLOBAL_SCOPE,
+                            entity_store=entity_store)
+        except (KeyError, TypeError, ValueError) as e:
+            raise WorldManifestError(f"npc {npc_key}: invalid or missing field {e}") from e
+        if entry.get("dialogue"):
+            npc.story = self.build_story(npc_key, entry["dialogue"])
+        return npc
+
+    def build_npc_agent(self, npc_key, npc):
+        # Agente de movimento do NPC (npc_movement.py), ou None se ele fica parado (sem "behavior")
+        behavior = self.npcs[npc_key].get("behavior")
+        if not behavior:
+            return None
+        try:
+            return build_agent(npc_key, npc, behavior)
+        except (TypeError, ValueError) as e:
+            raise WorldManifestError(f"npc {npc_key}: invalid behavior: {e}") from e
+
+    def build_story(self, npc_key, dialogue):
+        # "dialogue" é o roteiro (ver dialogue_graph.py) ou o nome do arquivo dele. Nada é lido nem compilado
+        # aqui: a Story faz isso na primeira conversa com o NPC.
+        if isinstance(dialogue, str):
+            script_path = self.asset_path(dialogue)
+            return Story(lambda: read_data_file(script_path), npc_key)
+        return Story(lambda: dialogue, npc_key)
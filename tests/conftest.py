@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Os módulos do jogo ficam em src/ e são importados pelo nome (como main.py faz); sem janela nos testes
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC_DIR)
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
@@ -0,0 +1,78 @@
+import os
+import random
+
+import pygame
+import pytest
+
+from character import Character
+from config import TILE_SIZE
+from conftest import SRC_DIR
+from map_definitions import BLOCKING_TILE_KEYS
+from tile_grid import TileGrid
+from world import WorldManifest
+
+# Character.move com o TileGrid (consulta indexada) precisa parar exatamente onde a varredura da lista
+# completa de retângulos de colisão (a forma antiga) pararia, em todos os mapas e repetições.
+
+WORLD = WorldManifest(os.path.join(SRC_DIR, "assets", "world.json"))
+STEPS = 400
+
+
+def read_map_rows(path):
+    # Mesmo parse de Game.load_map_data
+    with open(path, "r") as map_file:
+        return [line.strip().split() for line in map_file.readlines()]
+
+
+def flat_collision_rects(map_rows, tile_size, pattern_pixel_width, repeat_x):
+    # Lista completa montada como Game._create_collision_rects fazia: repetição, linha, coluna
+    rects = []
+    for repeat_index in range(repeat_x):
+        offset_x = repeat_index * pattern_pixel_width
+        for row_index, row in enumerate(map_rows):
+            for col_index, tile_key in enumerate(row):
+                if tile_key in BLOCKING_TILE_KEYS:
+                    rects.append(pygame.Rect(col_index * tile_size + offset_x, row_index * tile_size, tile_size, tile_size))
+    return rects
+
+
+def map_cases():
+    cases = []
+    for map_key in WORLD.map_definitions:
+        map_info = WORLD.map_definitions[map_key]
+        if "layout_file" not in map_info:
+            continue
+        for repeat_x in sorted({1, map_info.get("repeat_x", 1), 3}):
+            cases.append(pytest.param(map_key, repeat_x, id=f"{map_key}-x{repeat_x}"))
+    return cases
+
+
+@pytest.mark.parametrize("map_key, repeat_x", map_cases())
+def test_indexed_collision_matches_flat_scan(map_key, repeat_x):
+    map_info = WORLD.map_definitions[map_key]
+    tile_size = TILE_SIZE
+    map_rows = read_map_rows(map_info["layout_file"])
+    pattern_pixel_width = map_info["pixel_width"]
+    map_width = pattern_pixel_width * repeat_x
+    map_height = map_info["pixel_height"]
+    grid = TileGrid.from_rows(map_rows, BLOCKING_TILE_KEYS, tile_size, pattern_pixel_width, repeat_x)
+    flat_rects = flat_collision_rects(map_rows, tile_size, pattern_pixel_width, repeat_x)
+    assert len(grid) == len(flat_rects)
+
+    rng = random.Random(f"{map_key}-{repeat_x}")
+    blocked_steps = 0
+    for walk in range(8):
+        start = (rng.randrange(0, map_width), rng.randrange(0, map_height))
+        indexed = Character("indexed", map_x=start[0], map_y=start[1])
+        scanned = Character("scanned", map_x=start[0], map_y=start[1])
+        for step in range(STEPS):
+            # Passos de até um tile e meio, para cruzar bordas de tiles e de repetições
+            dx = rng.choice((0, rng.randint(-tile_size * 3 // 2, tile_size * 3 // 2)))
+            dy = rng.choice((0, rng.randint(-tile_size * 3 // 2, tile_size * 3 // 2)))
+            target = (indexed.map_x + dx, indexed.map_y + dy)
+            indexed.move(dx, dy, map_width, map_height, grid)
+            scanned.move(dx, dy, map_width, map_height, flat_rects)
+            assert (indexed.map_x, indexed.map_y) == (scanned.map_x, scanned.map_y), f"walk {walk}, step {step}"
+            blocked_steps += (indexed.map_x, indexed.map_y) != target
+    # Os passeios precisam de fato bater em paredes, senão a comparação não testa nada
+    assert blocked_steps > STEPS
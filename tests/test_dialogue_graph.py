@@ -0,0 +1,80 @@
+import json
+import os
+
+import pytest
+
+from dialogue_graph import DialogueScriptError, compile_dialogue
+from story import Story
+from world import WorldManifest, WorldManifestError
+
+# Roteiro de exemplo com ramos, condições, ids e flags (não é conteúdo do jogo)
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "branching_dialogue.json")
+
+
+def load_fixture():
+    with open(FIXTURE, "r", encoding="utf-8") as script_file:
+        return json.load(script_file)
+
+
+def play(story, characters, flags):
+    # Falas (personagem, texto) da conversa inteira, do início ao fim
+    story.start(characters, flags)
+    spoken = []
+    while not story.finished:
+        spoken.append((story.speaker(), story.text()))
+        story.next_scene()
+    return spoken
+
+
+def test_branches_follow_flags():
+    characters = {"sineiro": "SINEIRO", "protagonist": "JOGADOR"}
+    story = Story(load_fixture, "sineiro")
+    assert play(story, characters, {}) == [
+        ("SINEIRO", "Bom dia."), ("JOGADOR", "Bom dia. Ouviu o sino?"), ("SINEIRO", "Ainda não.")]
+
+    flags = {"ouviu_o_sino": True}
+    assert play(story, characters, flags) == [
+        ("SINEIRO", "O sino tocou."), ("JOGADOR", "Eu sei."), ("SINEIRO", "Até logo.")]
+    assert flags == {"ouviu_o_sino": False, "viu_o_sino": True}
+    # O fim é o índice len(graph), como o fim da lista de cenas antiga
+    assert story.current_scene == len(story.graph)
+
+
+def test_old_list_form_and_interned_speakers():
+    graph = compile_dialogue(["Olá!", {"character": "protagonist", "text": "Oi."}, "Tchau."], "ferreiro", measure=str.split)
+    assert graph.speakers == ["ferreiro", "protagonist"]
+    assert graph.node_speakers == [0, 1, 0]
+    assert graph.lines == [["Olá!"], ["Oi."], ["Tchau."]]
+    assert [graph.next(node, {}) for node in range(len(graph))] == [1, 2, 3]
+
+
+@pytest.mark.parametrize("script", [
+    {"nodes": []},
+    {"nodes": [{"text": "a", "next": "nenhum"}]},
+    {"nodes": [{"id": "a", "text": "a"}, {"id": "a", "text": "b"}]},
+    {"nodes": [{"id": "end", "text": "a"}]},
+    {"nodes": [{"speaker": "x"}]},
+    {"start": "nenhum", "nodes": [{"text": "a"}]},
+])
+def test_invalid_scripts(script):
+    with pytest.raises(DialogueScriptError):
+        compile_dialogue(script, "npc")
+
+
+def test_scripts_load_on_first_conversation(tmp_path):
+    manifest = {"start_map": "sala", "player": {},
+                "maps": {"sala": {"layout": "sala.map", "background": "sala.png", "pixel_width": 100, "pixel_height": 100}}}
+    manifest_path = tmp_path / "world.json"
+    manifest_path.write_text(json.dumps(manifest), encoding="utf-8")
+    world = WorldManifest(str(manifest_path))
+
+    # O arquivo ainda não existe: montar a Story não o lê
+    story = world.build_story("sineiro", "sineiro.json")
+    assert not story.loaded
+    with pytest.raises(WorldManifestError):
+        story.start({}, {})
+
+    (tmp_path / "sineiro.json").write_text(json.dumps(load_fixture()), encoding="utf-8")
+    story = world.build_story("sineiro", "sineiro.json")
+    story.start({"sineiro": "SINEIRO"}, {})
+    assert story.loaded and story.text() == "Bom dia."
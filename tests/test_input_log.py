@@ -0,0 +1,50 @@
+import os
+
+import pygame
+
+from conftest import SRC_DIR
+from game import Game
+from input_log import InputRecorder, key_state_from_scancodes, read_input_log, state_digest
+from replay import replay
+from save_state import SaveFile
+
+# Uma sessão gravada com --record e --save precisa ser reproduzida por replay.py (que roda sem slot de
+# salvamento) até o mesmo estado final, mesmo com F9 apertado no meio da gravação.
+
+WALK_FRAMES = 30
+
+
+def test_replay_matches_recording_with_save_loading_key(tmp_path, monkeypatch):
+    monkeypatch.chdir(os.path.dirname(SRC_DIR)) # Os caminhos do manifesto são relativos à raiz do projeto
+    game = Game()
+    game.finish_loading()
+    game.fps_cap = 0
+    save_file = SaveFile(str(tmp_path / "slot.vsav"), autosave_seconds=0)
+    save_file.attach(game, restore=False)
+    save_file.save(game) # Estado inicial no slot: um F9 que funcionasse levaria o jogador de volta a ele
+    start = (game.player.map_x, game.player.map_y)
+
+    frame_events = []
+    held = key_state_from_scancodes((pygame.KSCAN_LEFT,))
+    game.event_source = lambda: frame_events
+    game.key_state = lambda: held
+    log_path = str(tmp_path / "session.vinp")
+    recorder = InputRecorder(log_path)
+    recorder.attach(game)
+    for frame in range(WALK_FRAMES + 10):
+        if frame == WALK_FRAMES:
+            held = key_state_from_scancodes(())
+            frame_events = [pygame.event.Event(pygame.KEYDOWN, key=pygame.K_F9, mod=0)]
+        else:
+            frame_events = []
+        game.run_frame(game.timestep.step_seconds)
+    assert (game.player.map_x, game.player.map_y) != start
+    recorder.close(game)
+    recorded_digest = state_digest(game)
+    game.shutdown()
+
+    frames = read_input_log(log_path)[2]
+    assert [event[1] for event in frames[WALK_FRAMES].events] == [pygame.K_F9]
+    replay_input, replayed_game, _ = replay(log_path, draw=False)
+    assert replay_input.finished
+    assert state_digest(replayed_game) == recorded_digest == replay_input.expected_digest